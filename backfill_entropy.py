@@ -1,76 +1,148 @@
-import sqlite3
 import os
 import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import compressors
-from smartzip_catalog import calculate_entropy
+from smartzip_adaptive import stream_entropy
+from smartzip_blob import blob_path, iter_blob
+from smartzip_pool import reader, writer
 
 DB_FILE = "smartzip_catalog.db"
+COMPRESSED_DIR = "compressed"
 
-def backfill_entropy(recalc_all=False, check_only=False):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-
-    # Count total rows
-    c.execute("SELECT COUNT(*) FROM files")
-    total_rows = c.fetchone()[0]
-
-    if recalc_all:
-        c.execute("SELECT id, file_name, algo FROM files")
-        rows = c.fetchall()
-        print(f"🔄 Recalculating entropy for ALL {len(rows)} rows...")
-    else:
-        c.execute("SELECT id, file_name, algo FROM files WHERE entropy IS NULL")
-        rows = c.fetchall()
+
+# ----------------------------
+# Checkpoints
+# ----------------------------
+def load_checkpoint(conn, job):
+    row = conn.execute(
+        "SELECT last_id, updated, skipped FROM backfill_checkpoints WHERE job=?", (job,)
+    ).fetchone()
+    return row if row else (0, 0, 0)
+
+
+def save_checkpoint(conn, job, last_id, updated, skipped):
+    conn.execute("""
+        INSERT OR REPLACE INTO backfill_checkpoints (job, last_id, updated, skipped, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, (job, last_id, updated, skipped, time.time()))
+
+
+def clear_checkpoint(conn, job):
+    conn.execute("DELETE FROM backfill_checkpoints WHERE job=?", (job,))
+
+
+# ----------------------------
+# Worker
+# ----------------------------
+def entropy_for_row(row):
+    """Stream-decompress one blob and return (id, entropy, error)."""
+    file_id, file_name, algo, content_hash = row
+    try:
+        # Framed blob: codec comes from its header
+        if content_hash and os.path.exists(blob_path(content_hash)):
+            with open(blob_path(content_hash), "rb") as f:
+                return file_id, stream_entropy(iter_blob(f)), None
+        comp_file = os.path.join(COMPRESSED_DIR, f"{file_name}.{algo}")
+        if not os.path.exists(comp_file):
+            return file_id, None, f"no blob for hash {content_hash} or {comp_file}"
+        with open(comp_file, "rb") as f:
+            return file_id, stream_entropy(compressors.iter_decompress(algo, f)), None
+    except Exception as e:
+        return file_id, None, str(e)
+
+
+def iter_batches(conn, where, start_id, batch_size):
+    """Keyset-paginate `files` by id so no more than one batch is held in memory."""
+    last_id = start_id
+    while True:
+        rows = conn.execute(f"""
+            SELECT id, file_name, algo, file_hash FROM files
+            WHERE id > ? {where}
+            ORDER BY id LIMIT ?
+        """, (last_id, batch_size)).fetchall()
         if not rows:
-            print(f"✅ No missing entropy values. Catalog already clean ({total_rows} rows).")
-            conn.close()
             return
-        print(f"📊 Catalog rows: {total_rows}")
-        print(f"🔍 Found {len(rows)} rows with missing entropy.")
+        yield rows
+        last_id = rows[-1][0]
 
-    if check_only:
-        print("\n📋 Missing entropy rows:")
-        for row in rows:
-            print(f" - id={row[0]}, file={row[1]}, algo={row[2]}")
-        print("\nℹ️ Check-only mode: no changes made.")
-        conn.close()
-        return
 
-    updated = 0
-    skipped = 0
+# ----------------------------
+# Backfill
+# ----------------------------
+def backfill_entropy(recalc_all=False, check_only=False, workers=None,
+                     batch_size=1000, restart=False, verbose=False):
+    job = "recalc_all" if recalc_all else "missing"
+    where = "" if recalc_all else "AND entropy IS NULL"
 
-    for row in rows:
-        file_id, file_name, algo = row
-        comp_file = os.path.join("compressed", f"{file_name}.{algo}")
+    if restart:
+        with writer(DB_FILE) as conn:
+            clear_checkpoint(conn, job)
 
-        if not os.path.exists(comp_file):
-            print(f"⚠️ Skipping id={file_id} ({comp_file} not found)")
-            skipped += 1
-            continue
-
-        try:
-            # Decompress
-            decompressor = getattr(compressors, f"decompress_{algo}")
-            with open(comp_file, "rb") as f:
-                compressed_data = f.read()
-            data = decompressor(compressed_data)
-
-            # Calculate entropy
-            entropy = calculate_entropy(data)
-
-            # Update DB
-            c.execute("UPDATE files SET entropy=? WHERE id=?", (entropy, file_id))
-            if recalc_all:
-                print(f"🔄 Recalculated id={file_id} -> entropy={entropy:.3f}")
-            else:
-                print(f"✔️ Updated id={file_id} -> entropy={entropy:.3f}")
-            updated += 1
-        except Exception as e:
-            print(f"❌ Failed id={file_id}: {e}")
-            skipped += 1
-
-    conn.commit()
-    conn.close()
+    with reader(DB_FILE) as conn:
+        # Count total rows
+        total_rows = conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        start_id, updated, skipped = load_checkpoint(conn, job)
+        pending = conn.execute(f"SELECT COUNT(*) FROM files WHERE id > ? {where}", (start_id,)).fetchone()[0]
+
+        if recalc_all:
+            print(f"🔄 Recalculating entropy for ALL {pending} rows...")
+        else:
+            if not pending:
+                print(f"✅ No missing entropy values. Catalog already clean ({total_rows} rows).")
+                return
+            print(f"📊 Catalog rows: {total_rows}")
+            print(f"🔍 Found {pending} rows with missing entropy.")
+        if start_id:
+            print(f"⏩ Resuming after id={start_id} ({updated} updated, {skipped} skipped so far)")
+
+        if check_only:
+            print("\n📋 Missing entropy rows:")
+            for rows in iter_batches(conn, where, start_id, batch_size):
+                for row in rows:
+                    print(f" - id={row[0]}, file={row[1]}, algo={row[2]}")
+            print("\nℹ️ Check-only mode: no changes made.")
+            return
+
+        started = time.time()
+        done = 0
+
+        def commit_batch(rows, results):
+            # Results and the checkpoint land in one transaction, so a crash
+            # resumes from the last fully committed batch.
+            nonlocal updated, skipped, done
+            updates = []
+            for file_id, entropy, error in results:
+                if error is not None:
+                    print(f"⚠️ Skipping id={file_id} ({error})")
+                    skipped += 1
+                    continue
+                updates.append((entropy, file_id))
+                if verbose:
+                    print(f"✔️ Updated id={file_id} -> entropy={entropy:.3f}")
+            with writer(DB_FILE) as wconn:
+                wconn.executemany("UPDATE files SET entropy=? WHERE id=?", updates)
+                save_checkpoint(wconn, job, rows[-1][0], updated + len(updates), skipped)
+            updated += len(updates)
+            done += len(rows)
+            rate = done / max(time.time() - started, 1e-9)
+            print(f"💾 Checkpoint id={rows[-1][0]} ({done}/{pending}, {rate:.0f} rows/s)")
+
+        workers = workers or os.cpu_count() or 1
+        chunksize = max(1, batch_size // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = deque()
+            for rows in iter_batches(conn, where, start_id, batch_size):
+                # Keep the next batch decompressing while the previous one commits
+                in_flight.append((rows, pool.map(entropy_for_row, rows, chunksize=chunksize)))
+                if len(in_flight) > 1:
+                    commit_batch(*in_flight.popleft())
+            while in_flight:
+                commit_batch(*in_flight.popleft())
+
+    with writer(DB_FILE) as conn:
+        clear_checkpoint(conn, job)
 
     print("\n🎉 Backfill complete.")
     print(f"   ➕ Updated: {updated}")
@@ -78,7 +150,20 @@ def backfill_entropy(recalc_all=False, check_only=False):
     print(f"   📊 Total rows: {total_rows}")
 
 
+def _arg_value(flag, default):
+    if flag in sys.argv:
+        return int(sys.argv[sys.argv.index(flag) + 1])
+    return default
+
+
 if __name__ == "__main__":
     recalc_all = "--recalc-all" in sys.argv
     check_only = "--check-only" in sys.argv
-    backfill_entropy(recalc_all=recalc_all, check_only=check_only)
+    backfill_entropy(
+        recalc_all=recalc_all,
+        check_only=check_only,
+        workers=_arg_value("--workers", None),
+        batch_size=_arg_value("--batch-size", 1000),
+        restart="--restart" in sys.argv,
+        verbose="--verbose" in sys.argv,
+    )
@@ -4,9 +4,7 @@ import csv
 import mimetypes
 
 
-import gzip, bz2, lzma, brotli
-import lz4.frame
-import zstandard as zstd
+from compressors import available_codecs, get_codec
 
 # --- Shannon Entropy Function ---
 from collections import Counter
@@ -21,18 +19,8 @@ def shannon_entropy(data: bytes) -> float:
     entropy = -sum((count / total) * math.log2(count / total) for count in counts.values())
     return entropy
 
-# --- Compressor Wrappers ---
-compressors = {
-    "gzip":   (lambda d: gzip.compress(d),   lambda d: gzip.decompress(d)),
-    "bz2":    (lambda d: bz2.compress(d),    lambda d: bz2.decompress(d)),
-    "lzma":   (lambda d: lzma.compress(d),   lambda d: lzma.decompress(d)),
-    "lz4":    (lambda d: lz4.frame.compress(d), lambda d: lz4.frame.decompress(d)),
-    "zstd":   (
-        lambda d: zstd.ZstdCompressor().compress(d),
-        lambda d: zstd.ZstdDecompressor().decompress(d)
-    ),
-    "brotli": (lambda d: brotli.compress(d), lambda d: brotli.decompress(d)),
-}
+# --- Compressor Wrappers (from the codec registry, plugins included) ---
+compressors = {name: (get_codec(name).compress, get_codec(name).decompress) for name in available_codecs()}
 
 # --- Benchmark Function ---
 def benchmark_file(file_path, results):
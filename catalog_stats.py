@@ -1,15 +1,264 @@
-import sqlite3
-import statistics
+import sys
+from smartzip_pool import reader, writer
 
 DB_FILE = "smartzip_catalog.db"
 
-def catalog_stats():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+# Histogram bucket widths for the dashboard charts
+ENTROPY_BUCKET = 0.5
+RATIO_BUCKET = 0.05
 
-    # Count rows
-    c.execute("SELECT COUNT(*) FROM files")
-    total_rows = c.fetchone()[0]
+
+# ----------------------------
+# Summary Tables (optional)
+# ----------------------------
+# Counts and sums per algorithm and per histogram bucket, kept current by
+# triggers on `files`. Min/max come from the (algo, entropy) and
+# (algo, compression_ratio) indexes, so every stat is O(#algos) to read.
+SUMMARY_SCHEMA = f"""
+CREATE INDEX IF NOT EXISTS idx_files_algo_entropy ON files(algo, entropy);
+CREATE INDEX IF NOT EXISTS idx_files_algo_ratio ON files(algo, compression_ratio);
+CREATE INDEX IF NOT EXISTS idx_files_algo_id ON files(algo, id);
+
+CREATE TABLE IF NOT EXISTS algo_summary (
+    algo TEXT PRIMARY KEY,
+    files INTEGER NOT NULL DEFAULT 0,
+    entropy_count INTEGER NOT NULL DEFAULT 0,
+    entropy_sum REAL NOT NULL DEFAULT 0,
+    ratio_count INTEGER NOT NULL DEFAULT 0,
+    ratio_sum REAL NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS metric_histogram (
+    metric TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    files INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (metric, bucket)
+);
+
+CREATE TRIGGER IF NOT EXISTS files_summary_insert AFTER INSERT ON files BEGIN
+    INSERT OR IGNORE INTO algo_summary (algo) VALUES (COALESCE(NEW.algo, ''));
+    UPDATE algo_summary SET
+        files = files + 1,
+        entropy_count = entropy_count + (NEW.entropy IS NOT NULL),
+        entropy_sum = entropy_sum + COALESCE(NEW.entropy, 0),
+        ratio_count = ratio_count + (NEW.compression_ratio IS NOT NULL),
+        ratio_sum = ratio_sum + COALESCE(NEW.compression_ratio, 0)
+    WHERE algo = COALESCE(NEW.algo, '');
+    INSERT OR IGNORE INTO metric_histogram (metric, bucket)
+        SELECT 'entropy', CAST(NEW.entropy / {ENTROPY_BUCKET} AS INTEGER) WHERE NEW.entropy IS NOT NULL;
+    UPDATE metric_histogram SET files = files + 1
+        WHERE metric = 'entropy' AND bucket = CAST(NEW.entropy / {ENTROPY_BUCKET} AS INTEGER);
+    INSERT OR IGNORE INTO metric_histogram (metric, bucket)
+        SELECT 'ratio', CAST(NEW.compression_ratio / {RATIO_BUCKET} AS INTEGER) WHERE NEW.compression_ratio IS NOT NULL;
+    UPDATE metric_histogram SET files = files + 1
+        WHERE metric = 'ratio' AND bucket = CAST(NEW.compression_ratio / {RATIO_BUCKET} AS INTEGER);
+END;
+
+CREATE TRIGGER IF NOT EXISTS files_summary_delete AFTER DELETE ON files BEGIN
+    UPDATE algo_summary SET
+        files = files - 1,
+        entropy_count = entropy_count - (OLD.entropy IS NOT NULL),
+        entropy_sum = entropy_sum - COALESCE(OLD.entropy, 0),
+        ratio_count = ratio_count - (OLD.compression_ratio IS NOT NULL),
+        ratio_sum = ratio_sum - COALESCE(OLD.compression_ratio, 0)
+    WHERE algo = COALESCE(OLD.algo, '');
+    DELETE FROM algo_summary WHERE algo = COALESCE(OLD.algo, '') AND files <= 0;
+    UPDATE metric_histogram SET files = files - 1
+        WHERE metric = 'entropy' AND bucket = CAST(OLD.entropy / {ENTROPY_BUCKET} AS INTEGER);
+    UPDATE metric_histogram SET files = files - 1
+        WHERE metric = 'ratio' AND bucket = CAST(OLD.compression_ratio / {RATIO_BUCKET} AS INTEGER);
+END;
+
+CREATE TRIGGER IF NOT EXISTS files_summary_update
+AFTER UPDATE OF algo, entropy, compression_ratio ON files BEGIN
+    UPDATE algo_summary SET
+        files = files - 1,
+        entropy_count = entropy_count - (OLD.entropy IS NOT NULL),
+        entropy_sum = entropy_sum - COALESCE(OLD.entropy, 0),
+        ratio_count = ratio_count - (OLD.compression_ratio IS NOT NULL),
+        ratio_sum = ratio_sum - COALESCE(OLD.compression_ratio, 0)
+    WHERE algo = COALESCE(OLD.algo, '');
+    INSERT OR IGNORE INTO algo_summary (algo) VALUES (COALESCE(NEW.algo, ''));
+    UPDATE algo_summary SET
+        files = files + 1,
+        entropy_count = entropy_count + (NEW.entropy IS NOT NULL),
+        entropy_sum = entropy_sum + COALESCE(NEW.entropy, 0),
+        ratio_count = ratio_count + (NEW.compression_ratio IS NOT NULL),
+        ratio_sum = ratio_sum + COALESCE(NEW.compression_ratio, 0)
+    WHERE algo = COALESCE(NEW.algo, '');
+    DELETE FROM algo_summary WHERE algo = COALESCE(OLD.algo, '') AND files <= 0;
+    UPDATE metric_histogram SET files = files - 1
+        WHERE metric = 'entropy' AND bucket = CAST(OLD.entropy / {ENTROPY_BUCKET} AS INTEGER);
+    INSERT OR IGNORE INTO metric_histogram (metric, bucket)
+        SELECT 'entropy', CAST(NEW.entropy / {ENTROPY_BUCKET} AS INTEGER) WHERE NEW.entropy IS NOT NULL;
+    UPDATE metric_histogram SET files = files + 1
+        WHERE metric = 'entropy' AND bucket = CAST(NEW.entropy / {ENTROPY_BUCKET} AS INTEGER);
+    UPDATE metric_histogram SET files = files - 1
+        WHERE metric = 'ratio' AND bucket = CAST(OLD.compression_ratio / {RATIO_BUCKET} AS INTEGER);
+    INSERT OR IGNORE INTO metric_histogram (metric, bucket)
+        SELECT 'ratio', CAST(NEW.compression_ratio / {RATIO_BUCKET} AS INTEGER) WHERE NEW.compression_ratio IS NOT NULL;
+    UPDATE metric_histogram SET files = files + 1
+        WHERE metric = 'ratio' AND bucket = CAST(NEW.compression_ratio / {RATIO_BUCKET} AS INTEGER);
+END;
+"""
+
+
+def enable_summary_tables(conn):
+    """Create the summary tables + triggers and rebuild them from `files`."""
+    conn.executescript(SUMMARY_SCHEMA)
+    rebuild_summary_tables(conn)
+
+
+def rebuild_summary_tables(conn):
+    conn.execute("DELETE FROM algo_summary")
+    conn.execute("""
+        INSERT INTO algo_summary (algo, files, entropy_count, entropy_sum, ratio_count, ratio_sum)
+        SELECT COALESCE(algo, ''), COUNT(*),
+               COUNT(entropy), COALESCE(SUM(entropy), 0),
+               COUNT(compression_ratio), COALESCE(SUM(compression_ratio), 0)
+        FROM files GROUP BY COALESCE(algo, '')
+    """)
+    conn.execute("DELETE FROM metric_histogram")
+    conn.execute(f"""
+        INSERT INTO metric_histogram (metric, bucket, files)
+        SELECT 'entropy', CAST(entropy / {ENTROPY_BUCKET} AS INTEGER) AS b, COUNT(*)
+        FROM files WHERE entropy IS NOT NULL GROUP BY b
+    """)
+    conn.execute(f"""
+        INSERT INTO metric_histogram (metric, bucket, files)
+        SELECT 'ratio', CAST(compression_ratio / {RATIO_BUCKET} AS INTEGER) AS b, COUNT(*)
+        FROM files WHERE compression_ratio IS NOT NULL GROUP BY b
+    """)
+    conn.commit()
+
+
+def has_summary_tables(conn):
+    row = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type='trigger' AND name='files_summary_insert'"
+    ).fetchone()
+    return row[0] > 0
+
+
+# ----------------------------
+# Aggregation API
+# ----------------------------
+def _algo_min_max(conn, algo):
+    """Index-backed min/max for one algorithm (each subquery is a single seek)."""
+    return conn.execute("""
+        SELECT
+            (SELECT MIN(entropy) FROM files WHERE algo IS ? AND entropy IS NOT NULL),
+            (SELECT MAX(entropy) FROM files WHERE algo IS ?),
+            (SELECT MIN(compression_ratio) FROM files WHERE algo IS ? AND compression_ratio IS NOT NULL),
+            (SELECT MAX(compression_ratio) FROM files WHERE algo IS ?)
+    """, (algo, algo, algo, algo)).fetchone()
+
+
+def algo_stats(conn, use_summary=True):
+    """
+    Per-algorithm stats as a list of dicts:
+    algo, files, entropy_files, avg/min/max_entropy, avg/min/max_ratio.
+    """
+    stats = []
+    if use_summary and has_summary_tables(conn):
+        rows = conn.execute("""
+            SELECT algo, files, entropy_count, entropy_sum, ratio_count, ratio_sum
+            FROM algo_summary WHERE files > 0 ORDER BY algo
+        """).fetchall()
+        for algo, files, e_count, e_sum, r_count, r_sum in rows:
+            key = algo if algo != "" else None
+            e_min, e_max, r_min, r_max = _algo_min_max(conn, key)
+            stats.append({
+                "algo": key, "files": files, "entropy_files": e_count,
+                "avg_entropy": e_sum / e_count if e_count else None,
+                "min_entropy": e_min, "max_entropy": e_max,
+                "avg_ratio": r_sum / r_count if r_count else None,
+                "min_ratio": r_min, "max_ratio": r_max,
+            })
+        return stats
+
+    rows = conn.execute("""
+        SELECT algo, COUNT(*), COUNT(entropy),
+               AVG(entropy), MIN(entropy), MAX(entropy),
+               AVG(compression_ratio), MIN(compression_ratio), MAX(compression_ratio)
+        FROM files GROUP BY algo ORDER BY algo
+    """).fetchall()
+    for algo, files, e_count, e_avg, e_min, e_max, r_avg, r_min, r_max in rows:
+        stats.append({
+            "algo": algo, "files": files, "entropy_files": e_count,
+            "avg_entropy": e_avg, "min_entropy": e_min, "max_entropy": e_max,
+            "avg_ratio": r_avg, "min_ratio": r_min, "max_ratio": r_max,
+        })
+    return stats
+
+
+def catalog_summary(conn, use_summary=True):
+    """Global + per-algorithm stats, rolled up from algo_stats()."""
+    algos = algo_stats(conn, use_summary=use_summary)
+    entropy_files = sum(a["entropy_files"] for a in algos)
+    entropy_sum = sum(a["avg_entropy"] * a["entropy_files"] for a in algos if a["entropy_files"])
+    mins = [a["min_entropy"] for a in algos if a["min_entropy"] is not None]
+    maxs = [a["max_entropy"] for a in algos if a["max_entropy"] is not None]
+    return {
+        "total_rows": sum(a["files"] for a in algos),
+        "entropy_files": entropy_files,
+        "avg_entropy": entropy_sum / entropy_files if entropy_files else None,
+        "min_entropy": min(mins) if mins else None,
+        "max_entropy": max(maxs) if maxs else None,
+        "algos": algos,
+    }
+
+
+def histogram(conn, metric, use_summary=True):
+    """[(bucket_start, files)] for metric 'entropy' or 'ratio'."""
+    width = ENTROPY_BUCKET if metric == "entropy" else RATIO_BUCKET
+    column = "entropy" if metric == "entropy" else "compression_ratio"
+    if use_summary and has_summary_tables(conn):
+        rows = conn.execute("""
+            SELECT bucket, files FROM metric_histogram
+            WHERE metric = ? AND files > 0 ORDER BY bucket
+        """, (metric,)).fetchall()
+    else:
+        rows = conn.execute(f"""
+            SELECT CAST({column} / {width} AS INTEGER) AS b, COUNT(*)
+            FROM files WHERE {column} IS NOT NULL GROUP BY b ORDER BY b
+        """).fetchall()
+    return [(round(bucket * width, 4), files) for bucket, files in rows]
+
+
+FILE_COLUMNS = ["id", "file_name", "mime_type", "algo", "original_size",
+                "compressed_size", "compression_ratio", "entropy", "created_at"]
+
+
+def files_page(conn, before_id=None, page_size=100, algo=None):
+    """
+    One page of `files`, newest first, for drill-down views.
+
+    Keyset paging: pass the last id of the previous page as `before_id`, so
+    each page is an index seek on `id` (or (algo, id)) however deep it is.
+    """
+    sql = f"SELECT {', '.join(FILE_COLUMNS)} FROM files"
+    where, params = [], []
+    if algo is not None:
+        where.append("algo = ?")
+        params.append(algo)
+    if before_id is not None:
+        where.append("id < ?")
+        params.append(before_id)
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id DESC LIMIT ?"
+    params.append(page_size)
+    return conn.execute(sql, params).fetchall()
+
+
+# ----------------------------
+# CLI Report
+# ----------------------------
+def catalog_stats(use_summary=True):
+    with reader(DB_FILE) as conn:
+        summary = catalog_summary(conn, use_summary=use_summary)
+
+    total_rows = summary["total_rows"]
     print(f"📊 Catalog contains {total_rows} rows.")
 
     if total_rows == 0:
@@ -17,38 +266,31 @@ def catalog_stats():
         return
 
     # Global entropy stats
-    c.execute("SELECT entropy FROM files WHERE entropy IS NOT NULL")
-    entropies = [row[0] for row in c.fetchall()]
-    if entropies:
+    if summary["entropy_files"]:
         print("\n🌐 Global Entropy Stats")
-        print(f" - Avg entropy: {statistics.mean(entropies):.3f}")
-        print(f" - Min entropy: {min(entropies):.3f}")
-        print(f" - Max entropy: {max(entropies):.3f}")
+        print(f" - Avg entropy: {summary['avg_entropy']:.3f}")
+        print(f" - Min entropy: {summary['min_entropy']:.3f}")
+        print(f" - Max entropy: {summary['max_entropy']:.3f}")
 
     # Per-algorithm stats
-    c.execute("SELECT DISTINCT algo FROM files")
-    algos = [row[0] for row in c.fetchall()]
     print("\n⚙️ Per-Algorithm Stats")
-    for algo in algos:
-        c.execute("""
-            SELECT entropy, compression_ratio
-            FROM files WHERE algo=? AND entropy IS NOT NULL
-        """, (algo,))
-        rows = c.fetchall()
-        if not rows:
+    for a in summary["algos"]:
+        if not a["entropy_files"]:
             continue
-        entropies = [r[0] for r in rows]
-        ratios = [r[1] for r in rows]
-        print(f"\n🔹 {algo.upper()}")
-        print(f"   - Files: {len(rows)}")
-        print(f"   - Avg entropy: {statistics.mean(entropies):.3f}")
-        print(f"   - Min entropy: {min(entropies):.3f}")
-        print(f"   - Max entropy: {max(entropies):.3f}")
-        print(f"   - Avg ratio: {statistics.mean(ratios):.4f}")
-        print(f"   - Best ratio: {min(ratios):.4f}")
-        print(f"   - Worst ratio: {max(ratios):.4f}")
-
-    conn.close()
+        print(f"\n🔹 {str(a['algo']).upper()}")
+        print(f"   - Files: {a['entropy_files']}")  # rows with an entropy value, as before
+        print(f"   - Avg entropy: {a['avg_entropy']:.3f}")
+        print(f"   - Min entropy: {a['min_entropy']:.3f}")
+        print(f"   - Max entropy: {a['max_entropy']:.3f}")
+        if a["avg_ratio"] is not None:
+            print(f"   - Avg ratio: {a['avg_ratio']:.4f}")
+            print(f"   - Best ratio: {a['min_ratio']:.4f}")
+            print(f"   - Worst ratio: {a['max_ratio']:.4f}")
+
 
 if __name__ == "__main__":
-    catalog_stats()
+    if "--enable-summary" in sys.argv:
+        with writer(DB_FILE) as conn:
+            enable_summary_tables(conn)
+        print("✅ Summary tables enabled and rebuilt.")
+    catalog_stats(use_summary="--no-summary" not in sys.argv)
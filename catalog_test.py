@@ -1,5 +1,6 @@
 import sys
 from smartzip_catalog import store, get, query
+from smartzip_pack import flush_small_files
 
 def main():
     if len(sys.argv) < 2:
@@ -10,9 +11,10 @@ def main():
 
     # Store file and get entry
     entry, comp_file = store(filename)
+    flush_small_files()   # a small file waits for a shared pack block
     print(f"Stored: {entry}")
     print(f"👉 Algorithm chosen: {entry['algo']}")
-    print(f"Compressed file saved at: {comp_file}\n")
+    print(f"Compressed file saved at: {comp_file or entry.get('pack')}\n")
 
     # Query by algo
     print("Query results (algo=zstd):")
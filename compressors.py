@@ -5,51 +5,346 @@ import zstandard as zstd
 # -------------------------------
 # Compression / Decompression Wrappers
 # -------------------------------
+# Each compress_<algo> takes optional codec parameters; the defaults match
+# the libraries' own defaults, so compress_<algo>(data) is unchanged.
 
-def compress_gzip(data): 
-    return gzip.compress(data)
+def compress_gzip(data, level=9):
+    return gzip.compress(data, compresslevel=level)
 
 def decompress_gzip(data): 
     return gzip.decompress(data)
 
 
-def compress_bz2(data): 
-    return bz2.compress(data)
+def compress_bz2(data, level=9):
+    return bz2.compress(data, compresslevel=level)
 
 def decompress_bz2(data): 
     return bz2.decompress(data)
 
 
-def compress_lzma(data): 
-    return lzma.compress(data)
+def compress_lzma(data, preset=6, extreme=False, bcj=False):
+    preset = preset | (lzma.PRESET_EXTREME if extreme else 0)
+    if bcj:
+        # x86 branch converter ahead of LZMA2; the .xz stream records the
+        # filter chain, so decompress_lzma needs no parameters
+        return lzma.compress(data, format=lzma.FORMAT_XZ,
+                             filters=[{"id": lzma.FILTER_X86}, {"id": lzma.FILTER_LZMA2, "preset": preset}])
+    return lzma.compress(data, preset=preset)
 
 def decompress_lzma(data): 
     return lzma.decompress(data)
 
 
-def compress_lz4(data): 
-    return lz4.frame.compress(data)
+def compress_lz4(data, level=0):
+    # level 0-2: fast mode, 3-16: LZ4 high-compression (HC), <0: acceleration
+    return lz4.frame.compress(data, compression_level=level)
 
 def decompress_lz4(data): 
     return lz4.frame.decompress(data)
 
 
-def compress_zstd(data):
-    cctx = zstd.ZstdCompressor()
+# Allow frames written with large long-distance-matching windows
+ZSTD_MAX_WINDOW_SIZE = 1 << 31
+
+def compress_zstd(data, level=3, threads=0, enable_ldm=False, window_log=None):
+    """
+    threads: worker threads (-1 = one per core, 0 = single-threaded)
+    enable_ldm/window_log: long-distance matching over a 2**window_log window
+    """
+    if threads or enable_ldm or window_log:
+        params = zstd.ZstdCompressionParameters.from_level(
+            level,
+            threads=threads,
+            enable_ldm=enable_ldm,
+            window_log=window_log or 0,
+            write_content_size=True,
+        )
+        cctx = zstd.ZstdCompressor(compression_params=params)
+    else:
+        cctx = zstd.ZstdCompressor(level=level)
     return cctx.compress(data)
 
 def decompress_zstd(data):
-    dctx = zstd.ZstdDecompressor()
+    dctx = zstd.ZstdDecompressor(max_window_size=ZSTD_MAX_WINDOW_SIZE)
+    return dctx.decompress(data)
+
+
+# Deltas need a searching match finder: fast levels barely use the prefix
+ZSTD_DELTA_LEVEL = 9
+
+def _prefix(base):
+    return zstd.ZstdCompressionDict(base, dict_type=zstd.DICT_TYPE_RAWCONTENT)
+
+def compress_zstd_delta(data, base, level=ZSTD_DELTA_LEVEL):
+    """
+    Compress `data` against `base` as a raw-content prefix (zstd patch-from):
+    spans unchanged since `base` cost a few bytes each. The window covers
+    base + data so matches can reach back anywhere in the prefix.
+    """
+    window_log = min(31, max(10, (len(base) + len(data)).bit_length()))
+    params = zstd.ZstdCompressionParameters.from_level(
+        level, window_log=window_log, write_content_size=True)
+    return zstd.ZstdCompressor(dict_data=_prefix(base), compression_params=params).compress(data)
+
+def decompress_zstd_delta(data, base):
+    dctx = zstd.ZstdDecompressor(dict_data=_prefix(base), max_window_size=ZSTD_MAX_WINDOW_SIZE)
     return dctx.decompress(data)
 
 
-def compress_brotli(data): 
-    return brotli.compress(data)
+BROTLI_MODES = {"generic": brotli.MODE_GENERIC, "text": brotli.MODE_TEXT, "font": brotli.MODE_FONT}
+
+def compress_brotli(data, quality=11, mode="generic", lgwin=22):
+    return brotli.compress(data, quality=quality, mode=BROTLI_MODES[mode], lgwin=lgwin)
 
 def decompress_brotli(data): 
     return brotli.decompress(data)
 
 
+# -------------------------------
+# Streaming Decompression
+# -------------------------------
+STREAM_CHUNK_SIZE = 1 << 20
+
+
+def _iter_reader(reader, chunk_size):
+    with reader:
+        while chunk := reader.read(chunk_size):
+            yield chunk
+
+
+def _iter_brotli(fileobj, chunk_size):
+    dec = brotli.Decompressor()
+    while chunk := fileobj.read(chunk_size):
+        out = dec.process(chunk, output_buffer_limit=chunk_size)
+        if out:
+            yield out
+        # Drain buffered output before feeding more input
+        while not dec.can_accept_more_data():
+            out = dec.process(b"", output_buffer_limit=chunk_size)
+            if not out:
+                break
+            yield out
+    while not dec.is_finished():
+        out = dec.process(b"", output_buffer_limit=chunk_size)
+        if not out:
+            raise brotli.error("Truncated brotli stream")
+        yield out
+
+
+def _stream_gzip(fileobj, chunk_size):
+    return _iter_reader(gzip.GzipFile(fileobj=fileobj, mode="rb"), chunk_size)
+
+def _stream_bz2(fileobj, chunk_size):
+    return _iter_reader(bz2.BZ2File(fileobj, mode="rb"), chunk_size)
+
+def _stream_lzma(fileobj, chunk_size):
+    return _iter_reader(lzma.LZMAFile(fileobj, mode="rb"), chunk_size)
+
+def _stream_lz4(fileobj, chunk_size):
+    return _iter_reader(lz4.frame.LZ4FrameFile(fileobj, mode="rb"), chunk_size)
+
+def _stream_zstd(fileobj, chunk_size):
+    dctx = zstd.ZstdDecompressor(max_window_size=ZSTD_MAX_WINDOW_SIZE)
+    return _iter_reader(dctx.stream_reader(fileobj, read_across_frames=True), chunk_size)
+
+def stream_zstd_delta(fileobj, base, chunk_size=STREAM_CHUNK_SIZE):
+    dctx = zstd.ZstdDecompressor(dict_data=_prefix(base), max_window_size=ZSTD_MAX_WINDOW_SIZE)
+    return _iter_reader(dctx.stream_reader(fileobj), chunk_size)
+
+
+def _iter_whole(codec, fileobj, chunk_size):
+    # Fallback for codecs without a streaming decoder
+    data = codec.decompress(fileobj.read())
+    for i in range(0, len(data), chunk_size):
+        yield data[i:i + chunk_size]
+
+
+def iter_decompress(algo, fileobj, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield decompressed chunks of at most ~chunk_size bytes from a binary file
+    object, without materializing the whole output.
+    """
+    codec = get_codec(algo)
+    if codec.stream_decompress is None:
+        return _iter_whole(codec, fileobj, chunk_size)
+    return codec.stream_decompress(fileobj, chunk_size)
+
+
+# -------------------------------
+# Codec Registry
+# -------------------------------
+class CodecPlugin:
+    """
+    A codec known to SmartZip: compress/decompress callables plus the
+    capabilities the selector and tools rely on.
+
+      streaming    - stream_decompress(fileobj, chunk_size) yields chunks
+      parallel     - compress() can use several threads (a `threads` param)
+      dictionary   - supports trained dictionaries
+      releases_gil - compression runs without the GIL (thread pools scale)
+      speed        - {"compress_mbps", "decompress_mbps", "ratio"}, rough
+                     defaults until calibrate_codecs() measures them
+    """
+
+    def __init__(self, name, compress, decompress, stream_decompress=None,
+                 parallel=False, dictionary=False, releases_gil=False, speed=None):
+        self.name = name
+        self.compress = compress
+        self.decompress = decompress
+        self.stream_decompress = stream_decompress
+        self.parallel = parallel
+        self.dictionary = dictionary
+        self.releases_gil = releases_gil
+        self.speed = dict(speed or {})
+
+    @property
+    def streaming(self):
+        return self.stream_decompress is not None
+
+    def capabilities(self):
+        return {
+            "streaming": self.streaming,
+            "parallel": self.parallel,
+            "dictionary": self.dictionary,
+            "releases_gil": self.releases_gil,
+            "speed": dict(self.speed),
+        }
+
+    def __repr__(self):
+        return f"CodecPlugin({self.name!r})"
+
+
+CODECS = {}
+ENTRY_POINT_GROUP = "smartzip.codecs"
+_entry_points_loaded = False
+
+
+def register_codec(plugin, replace=False):
+    if plugin.name in CODECS and not replace:
+        raise ValueError(f"Codec already registered: {plugin.name}")
+    CODECS[plugin.name] = plugin
+    return plugin
+
+
+def load_entry_point_codecs(group=ENTRY_POINT_GROUP):
+    """
+    Register third-party codecs published under the `smartzip.codecs` entry
+    point group. An entry point may resolve to a CodecPlugin or to a
+    zero-argument callable returning one.
+    """
+    global _entry_points_loaded
+    _entry_points_loaded = True
+    from importlib.metadata import entry_points
+    loaded = []
+    for ep in entry_points(group=group):
+        try:
+            plugin = ep.load()
+            if not isinstance(plugin, CodecPlugin):
+                plugin = plugin()
+            if plugin.name not in CODECS:
+                register_codec(plugin)
+                loaded.append(plugin.name)
+        except Exception as e:
+            print(f"⚠️ Failed to load codec plugin {ep.name}: {e}")
+    return loaded
+
+
+def get_codec(name):
+    codec = CODECS.get(name)
+    if codec is None and not _entry_points_loaded:
+        load_entry_point_codecs()
+        codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"Unknown codec: {name}")
+    return codec
+
+
+def available_codecs(**required):
+    """Registered codec names, optionally filtered by capability, e.g. streaming=True."""
+    if not _entry_points_loaded:
+        load_entry_point_codecs()
+    return [name for name, codec in CODECS.items()
+            if all(codec.capabilities().get(key) == val for key, val in required.items())]
+
+
+CODEC_PROFILE_FILE = "smartzip_codec_profiles.json"
+
+
+def load_codec_profiles(file=CODEC_PROFILE_FILE):
+    """Apply speed profiles saved by calibrate_codecs(save=True)."""
+    import json, os
+    if not os.path.exists(file):
+        return {}
+    with open(file) as f:
+        profiles = json.load(f)
+    for name, speed in profiles.items():
+        if name in CODECS:
+            CODECS[name].speed = speed
+    return profiles
+
+
+def calibrate_codecs(sample=None, repeat=3, save=False, file=CODEC_PROFILE_FILE):
+    """
+    Measure each codec's MB/s and ratio on `sample` (default: 4 MB of mixed
+    text/binary) and store the result in its speed profile.
+    """
+    import json, os, time
+    if sample is None:
+        text = b"".join(b"%d SmartZip calibration line %d\n" % (i, i * 7) for i in range(60000))
+        sample = text[:3 * 1024 * 1024] + os.urandom(1024 * 1024)
+    mb = len(sample) / 1e6
+    profiles = {}
+    for name, codec in CODECS.items():
+        best_c = best_d = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            packed = codec.compress(sample)
+            best_c = min(best_c, time.perf_counter() - start)
+            start = time.perf_counter()
+            codec.decompress(packed)
+            best_d = min(best_d, time.perf_counter() - start)
+        codec.speed = {
+            "compress_mbps": round(mb / max(best_c, 1e-9), 1),
+            "decompress_mbps": round(mb / max(best_d, 1e-9), 1),
+            "ratio": round(len(packed) / len(sample), 4),
+        }
+        profiles[name] = codec.speed
+    if save:
+        with open(file, "w") as f:
+            json.dump(profiles, f, indent=2)
+    return profiles
+
+
+# Default-level speed profiles (MB/s), order-of-magnitude figures
+for _plugin in (
+    CodecPlugin("gzip", compress_gzip, decompress_gzip, _stream_gzip, releases_gil=True,
+                speed={"compress_mbps": 20, "decompress_mbps": 300, "ratio": 0.36}),
+    CodecPlugin("bz2", compress_bz2, decompress_bz2, _stream_bz2, releases_gil=True,
+                speed={"compress_mbps": 15, "decompress_mbps": 50, "ratio": 0.28}),
+    CodecPlugin("lzma", compress_lzma, decompress_lzma, _stream_lzma, releases_gil=True,
+                speed={"compress_mbps": 3, "decompress_mbps": 100, "ratio": 0.25}),
+    CodecPlugin("lz4", compress_lz4, decompress_lz4, _stream_lz4, releases_gil=True,
+                speed={"compress_mbps": 700, "decompress_mbps": 4000, "ratio": 0.48}),
+    CodecPlugin("zstd", compress_zstd, decompress_zstd, _stream_zstd,
+                parallel=True, dictionary=True, releases_gil=True,
+                speed={"compress_mbps": 400, "decompress_mbps": 1200, "ratio": 0.35}),
+    CodecPlugin("brotli", compress_brotli, decompress_brotli, _iter_brotli, releases_gil=True,
+                speed={"compress_mbps": 1, "decompress_mbps": 400, "ratio": 0.27}),
+):
+    register_codec(_plugin)
+
+# Structure-aware codec built on the ones above: registered here so any blob
+# naming it decodes without extra imports
+from smartzip_columnar import compress_columnar, decompress_columnar
+register_codec(CodecPlugin("columnar", compress_columnar, decompress_columnar,
+                           speed={"compress_mbps": 1, "decompress_mbps": 10, "ratio": 0.3}))
+
+try:
+    load_codec_profiles()
+except Exception as e:
+    print("⚠️ Could not load codec profiles:", e)
+
+
 # -------------------------------
 # Test Runner
 # -------------------------------
@@ -1,10 +1,10 @@
 import os
-import sqlite3
 import importlib.util
 import subprocess
 import sys
 import zstandard as zstd
 from datetime import datetime
+from smartzip_pool import get_pool, reader, writer
 
 DB_PATH = "smartzip_catalog.db"
 
@@ -36,31 +36,8 @@ def check_requirements(auto_fix=True):
     return missing
 
 def init_database():
-    """Ensure DB and tables exist."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS catalog (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            filename TEXT,
-            filehash TEXT,
-            algo TEXT,
-            original_size INTEGER,
-            compressed_size INTEGER,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS health_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME,
-            requirements_status TEXT,
-            database_status TEXT,
-            dashboard_status TEXT,
-            compression_status TEXT
-        );
-    """)
-    conn.commit()
-    conn.close()
+    """Ensure DB and tables exist (runs the catalog schema migrations)."""
+    get_pool(DB_PATH)
 
 def check_database(auto_fix=True):
     if not os.path.exists(DB_PATH):
@@ -74,9 +51,8 @@ def check_database(auto_fix=True):
         return False, "Database not found"
     else:
         try:
-            conn = sqlite3.connect(DB_PATH)
-            conn.execute("SELECT name FROM sqlite_master LIMIT 1;")
-            conn.close()
+            with reader(DB_PATH) as conn:
+                conn.execute("SELECT name FROM sqlite_master LIMIT 1;")
             return True, "Database OK"
         except Exception as e:
             return False, f"Database error: {e}"
@@ -100,13 +76,11 @@ def check_compression_roundtrip():
 
 def log_results(requirements_status, database_status, dashboard_status, compression_status):
     """Log health check results into DB."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("""
-        INSERT INTO health_logs (timestamp, requirements_status, database_status, dashboard_status, compression_status)
-        VALUES (?, ?, ?, ?, ?)
-    """, (datetime.now(), requirements_status, database_status, dashboard_status, compression_status))
-    conn.commit()
-    conn.close()
+    with writer(DB_PATH) as conn:
+        conn.execute("""
+            INSERT INTO health_logs (timestamp, requirements_status, database_status, dashboard_status, compression_status)
+            VALUES (?, ?, ?, ?, ?)
+        """, (datetime.now(), requirements_status, database_status, dashboard_status, compression_status))
 
 def run_health_check(auto_fix=True):
     print("🔍 Smartzip Health Check (with Auto-Fix + Logging)\n")
@@ -1,13 +1,19 @@
-import gzip, bz2, lzma, brotli
-import lz4.frame
-import zstandard as zstd
-import os, time, math, mimetypes, json
+import os, time, math, mimetypes, json, statistics, threading
+from collections import Counter
+import compressors
+import smartzip_columnar
+# Decisions are queued and written in batches by a background thread
+from smartzip_decisions import add_decision_to_catalog
+from smartzip_filters import is_x86_executable, split_params
+
+THRESHOLDS_FILE = "smartzip_thresholds.json"
+DEFAULT_THRESHOLDS = {"entropy_threshold": 3.5, "size_threshold": 5_000_000}
 
 # ----------------------
 # Threshold Loader & Saver
 # ----------------------
-def load_thresholds(file="smartzip_thresholds.json"):
-    defaults = {"entropy_threshold": 3.5, "size_threshold": 5_000_000}
+def load_thresholds(file=THRESHOLDS_FILE):
+    defaults = dict(DEFAULT_THRESHOLDS)
     if os.path.exists(file):
         try:
             with open(file) as f:
@@ -16,35 +22,153 @@ def load_thresholds(file="smartzip_thresholds.json"):
             return defaults
     return defaults
 
-def save_thresholds(thresholds, file="smartzip_thresholds.json"):
-    with open(file, "w") as f:
-        json.dump(thresholds, f, indent=2)
+def save_thresholds(thresholds, file=THRESHOLDS_FILE):
+    # Write to a temp file and rename so readers never see a half-written file
+    tmp_file = f"{file}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(dict(thresholds), f, indent=2)
+    os.replace(tmp_file, file)
+
+# ----------------------
+# Cached Threshold Provider
+# ----------------------
+class ThresholdProvider:
+    """
+    In-process cache of the thresholds file.
+
+    The parsed dict is reused until the file's mtime changes (checked at most
+    once every `check_interval` seconds) or `reload()` is called. Snapshots are
+    replaced, never mutated, so readers on other threads always see a complete
+    set of thresholds.
+    """
+
+    def __init__(self, file=THRESHOLDS_FILE, check_interval=1.0):
+        self.file = file
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._thresholds = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def get(self):
+        """Return the current thresholds snapshot (treat it as read-only)."""
+        snapshot = self._thresholds
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+        with self._lock:
+            self._refresh()
+            return self._thresholds
+
+    def reload(self):
+        """Force a re-read of the thresholds file."""
+        with self._lock:
+            self._mtime = None
+            self._refresh()
+            return self._thresholds
+
+    def swap(self, thresholds, persist=False):
+        """
+        Atomically publish new thresholds to every reader in this process.
+        With persist=True they are also written to the thresholds file.
+        """
+        snapshot = dict(DEFAULT_THRESHOLDS)
+        snapshot.update(thresholds)
+        with self._lock:
+            if persist:
+                save_thresholds(snapshot, self.file)
+                self._mtime = self._stat_mtime()
+            self._thresholds = snapshot
+            self._checked_at = time.monotonic()
+        return snapshot
+
+    def _stat_mtime(self):
+        try:
+            return os.stat(self.file).st_mtime_ns
+        except OSError:
+            return None
+
+    def _refresh(self):
+        self._checked_at = time.monotonic()
+        mtime = self._stat_mtime()
+        if self._thresholds is not None and mtime == self._mtime:
+            return
+        snapshot = dict(DEFAULT_THRESHOLDS)
+        if mtime is not None:
+            try:
+                with open(self.file) as f:
+                    snapshot.update(json.load(f))
+            except Exception:
+                # Keep the last good snapshot if the file is unreadable
+                if self._thresholds is not None:
+                    return
+        self._thresholds = snapshot
+        self._mtime = mtime
+
+THRESHOLD_PROVIDER = ThresholdProvider()
 
-THRESHOLDS = load_thresholds()
+def get_thresholds():
+    """Cached thresholds for the hot path (no disk read unless the file changed)."""
+    return THRESHOLD_PROVIDER.get()
+
+def reload_thresholds():
+    return THRESHOLD_PROVIDER.reload()
+
+def publish_thresholds(thresholds, persist=False):
+    return THRESHOLD_PROVIDER.swap(thresholds, persist=persist)
+
+THRESHOLDS = get_thresholds()
 
 # ----------------------
 # Helpers
 # ----------------------
+try:
+    import numpy as np
+except ImportError:  # optional: vectorized byte histograms
+    np = None
+
 def shannon_entropy(data: bytes) -> float:
     if not data:
         return 0
-    freq = [0] * 256
-    for b in data:
-        freq[b] += 1
-    entropy = 0
-    for f in freq:
-        if f > 0:
-            p = f / len(data)
+    return entropy_from_counts(byte_histogram(data))
+
+def byte_histogram(data, counts=None):
+    """Add the byte frequencies of `data` to `counts` (256 ints) and return it."""
+    if counts is None:
+        counts = [0] * 256
+    if np is not None:
+        hist = np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256)
+        for b, n in enumerate(hist.tolist()):
+            counts[b] += n
+    else:
+        for b, n in Counter(data).items():
+            counts[b] += n
+    return counts
+
+def entropy_from_counts(counts) -> float:
+    total = sum(counts)
+    if not total:
+        return 0.0
+    entropy = 0.0
+    for n in counts:
+        if n:
+            p = n / total
             entropy -= p * math.log2(p)
     return entropy
 
+def stream_entropy(chunks) -> float:
+    """Shannon entropy over an iterable of byte chunks, one chunk in memory at a time."""
+    counts = [0] * 256
+    for chunk in chunks:
+        byte_histogram(chunk, counts)
+    return entropy_from_counts(counts)
+
 def detect_file_type(file_path: str):
     mime_type, _ = mimetypes.guess_type(file_path)
     return mime_type or "application/octet-stream"
 
 def choose_algorithm(entropy: float, size: int, thresholds=None) -> str:
     if thresholds is None:
-        thresholds = THRESHOLDS
+        thresholds = get_thresholds()
 
     if entropy > thresholds["entropy_threshold"]:
         return "brotli"
@@ -52,16 +176,131 @@ def choose_algorithm(entropy: float, size: int, thresholds=None) -> str:
         return "lz4"
     return "zstd"
 
+# ----------------------
+# Codec Parameters
+# ----------------------
+CODEC_DEFAULTS = {
+    "gzip": {"level": 9},
+    "bz2": {"level": 9},
+    "lzma": {"preset": 6},
+    "lz4": {"level": 0},
+    "zstd": {"level": 3},
+    "brotli": {"quality": 11, "mode": "generic"},
+    "columnar": {"format": "ndjson"},
+}
+
+PARALLEL_MIN_SIZE = 16 * 1024 * 1024       # multithreaded compression above this
+ZSTD_LDM_MIN_SIZE = 64 * 1024 * 1024       # long-distance matching above this
+ZSTD_LDM_WINDOW_LOG = 27
+BROTLI_MAX_SIZE_Q11 = 1024 * 1024          # quality 11 is too slow beyond this
+TEXT_MIME_TYPES = ("application/json", "application/javascript", "application/xml")
+
+# Line-structured records the columnar codec shreds into per-field streams
+COLUMNAR_FORMATS = {"text/csv": "csv", "application/json": "ndjson", "application/x-ndjson": "ndjson"}
+COLUMNAR_EXTENSIONS = {".csv": "csv", ".json": "ndjson", ".jsonl": "ndjson", ".ndjson": "ndjson"}
+COLUMNAR_MIN_SIZE = 64 * 1024
+
+def columnar_format(file_info):
+    """
+    "csv" or "ndjson" when the file is worth shredding into columns, else
+    None. Needs many short lines: `file_info["lines"]` is the newline count.
+    """
+    size = file_info.get("size") or 0
+    lines = (file_info.get("lines") or 0) + 1
+    if (size < COLUMNAR_MIN_SIZE or lines < smartzip_columnar.MIN_LINES
+            or size > lines * smartzip_columnar.MAX_LINE_LENGTH):
+        return None
+    fmt = COLUMNAR_FORMATS.get(file_info.get("mime_type") or "")
+    if fmt is None:
+        fmt = COLUMNAR_EXTENSIONS.get(os.path.splitext(file_info.get("name") or "")[1].lower())
+    return fmt
+
+# Storage tiers: "hot" favours line-rate ingest, "cold" favours density for
+# entries the recompactor (smartzip_tiering) rewrites once they stop being read
+TIER_PARAMS = {
+    "hot": {"zstd": {"level": 1}},
+    "cold": {"zstd": {"level": 19}, "lzma": {"preset": 9}},
+}
+# Compression throughput floor (MB/s) per tier, see apply_codec_constraints();
+# a "min_compress_mbps" in the thresholds file applies to every tier
+TIER_MIN_COMPRESS_MBPS = {"hot": 100}
+
+# Untyped binary gets the per-block shuffle / delta pre-filter search
+# (smartzip_filters) ahead of these codecs; lz4 and columnar are left alone
+FILTER_CODECS = ("zstd", "lzma", "bz2", "brotli", "gzip")
+FILTER_MIN_SIZE = 64 * 1024
+
+def wants_filters(algo, file_info):
+    return (algo in FILTER_CODECS
+            and (file_info.get("mime_type") or "application/octet-stream") == "application/octet-stream"
+            and not file_info.get("x86")
+            and (file_info.get("size") or 0) >= FILTER_MIN_SIZE)
+
+def choose_params(algo, file_info, thresholds=None):
+    """
+    Codec parameters for a decision. Per-codec overrides can be set in the
+    thresholds file, e.g. {"codec_params": {"zstd": {"level": 9}}}.
+    """
+    params = dict(CODEC_DEFAULTS.get(algo, {}))
+    params.update(TIER_PARAMS.get(file_info.get("tier"), {}).get(algo, {}))
+    size = file_info.get("size") or 0
+    mime = file_info.get("mime_type") or ""
+    codec = compressors.get_codec(algo)
+
+    if algo == "columnar":
+        params["format"] = columnar_format(file_info) or params["format"]
+    if algo == "lzma" and file_info.get("x86"):
+        params["bcj"] = True
+    if wants_filters(algo, file_info):
+        params["filters"] = "auto"
+    if codec.parallel and size >= PARALLEL_MIN_SIZE:
+        params["threads"] = -1
+    if algo == "zstd":
+        if size >= ZSTD_LDM_MIN_SIZE:
+            params["enable_ldm"] = True
+            params["window_log"] = ZSTD_LDM_WINDOW_LOG
+    elif algo == "brotli":
+        if size > BROTLI_MAX_SIZE_Q11:
+            params["quality"] = 5
+        if mime.startswith("text/") or mime in TEXT_MIME_TYPES:
+            params["mode"] = "text"
+        elif mime.startswith("font/"):
+            params["mode"] = "font"
+
+    overrides = (thresholds or {}).get("codec_params", {}).get(algo)
+    if overrides:
+        params.update(overrides)
+    return params
+
+def apply_codec_constraints(algo, file_info):
+    """
+    Check the rule-picked codec against the registry. Unregistered codecs
+    fall back to zstd; if file_info sets "min_compress_mbps" (adaptive_decision
+    fills it from the thresholds file or the tier), a codec slower than that
+    is swapped for the best-ratio registered codec fast enough.
+    """
+    registered = compressors.available_codecs()
+    if algo not in registered:
+        algo = "zstd"
+    min_mbps = file_info.get("min_compress_mbps")
+    if min_mbps and compressors.get_codec(algo).speed.get("compress_mbps", 0) < min_mbps:
+        fast = [compressors.get_codec(name) for name in registered
+                if compressors.get_codec(name).speed.get("compress_mbps", 0) >= min_mbps]
+        if fast:
+            algo = min(fast, key=lambda c: c.speed.get("ratio", 1.0)).name
+    return algo
+
 # ----------------------
 # Adaptive Decision Logic
 # ----------------------
-def adaptive_decision(file_info, thresholds=None, auto_recalibrate_enabled=False, window=500):
+def adaptive_decision(file_info, thresholds=None, auto_recalibrate_enabled=False, window=500, log=True):
     """
-    Decide best algorithm based on entropy and size thresholds.
+    Decide best algorithm based on entropy and size thresholds. `log=False`
+    keeps the decision out of the decisions table (offline replay).
     """
-    # Load thresholds
+    # Load thresholds (cached; only re-read when the file changes)
     if thresholds is None:
-        thresholds = load_thresholds()
+        thresholds = get_thresholds()
 
     entropy_threshold = thresholds.get("entropy_threshold", 3.5)
     size_threshold = thresholds.get("size_threshold", 5_000_000)
@@ -72,6 +311,7 @@ def adaptive_decision(file_info, thresholds=None, auto_recalibrate_enabled=False
             from smartzip_dashboard import auto_recalibrate_from_log
             thresholds = auto_recalibrate_from_log(window=window)
             if thresholds:
+                publish_thresholds(thresholds)
                 entropy_threshold = thresholds["entropy_threshold"]
                 size_threshold = thresholds["size_threshold"]
         except Exception as e:
@@ -79,8 +319,28 @@ def adaptive_decision(file_info, thresholds=None, auto_recalibrate_enabled=False
 
     # --- Decision Logic ---
     algo = "zstd"   # default
+    tier = file_info.get("tier")
 
-    if file_info["entropy"] > entropy_threshold:
+    if tier == "hot":
+        # Cheapest codecs that keep up with ingest; incompressible data gets lz4
+        if file_info["entropy"] > entropy_threshold or file_info["size"] > size_threshold:
+            algo = "lz4"
+        else:
+            algo = "zstd"
+    elif columnar_format(file_info):
+        # Structured records: per-field columns beat any codec on the rows
+        algo = "columnar"
+    elif file_info.get("x86"):
+        # Machine code: lzma behind the x86 BCJ branch filter
+        algo = "lzma"
+    elif tier == "cold":
+        if file_info["entropy"] < 1.5:
+            algo = "lzma"
+        elif file_info["size"] > BROTLI_MAX_SIZE_Q11:
+            algo = "zstd"
+        else:
+            algo = "brotli"
+    elif file_info["entropy"] > entropy_threshold:
         algo = "brotli"
     elif file_info["size"] > size_threshold:
         algo = "lz4"
@@ -93,21 +353,24 @@ def adaptive_decision(file_info, thresholds=None, auto_recalibrate_enabled=False
     else:
         algo = "zstd"
 
+    min_mbps = (file_info.get("min_compress_mbps") or thresholds.get("min_compress_mbps")
+                or TIER_MIN_COMPRESS_MBPS.get(tier))
+    algo = apply_codec_constraints(algo, {**file_info, "min_compress_mbps": min_mbps})
+
     decision = {
         "algo": algo,
+        "params": choose_params(algo, file_info, thresholds),
         "entropy_threshold": entropy_threshold,
         "size_threshold": size_threshold,
         "file_entropy": file_info.get("entropy"),
         "file_size": file_info.get("size"),
+        "tier": tier,
         "timestamp": time.time()
     }
 
-    # Optional: log to catalog
-    try:
-        from smartzip_catalog import add_decision_to_catalog
+    # Optional: log to catalog (write-behind, does not touch the DB here)
+    if log:
         add_decision_to_catalog(file_info.get("name", "unknown"), decision)
-    except Exception as e:
-        print("⚠️ Catalog logging failed:", e)
 
     return decision
 
@@ -116,7 +379,7 @@ def adaptive_decision(file_info, thresholds=None, auto_recalibrate_enabled=False
 # ----------------------
 def adaptive_compress(file_path: str, thresholds=None, auto_recalibrate_enabled=False):
     if thresholds is None:
-        thresholds = load_thresholds()
+        thresholds = get_thresholds()
 
     with open(file_path, "rb") as f:
         data = f.read()
@@ -124,24 +387,15 @@ def adaptive_compress(file_path: str, thresholds=None, auto_recalibrate_enabled=
     entropy = shannon_entropy(data)
     size = len(data)
 
-    file_info = {"name": os.path.basename(file_path), "entropy": entropy, "size": size}
+    file_info = {"name": os.path.basename(file_path), "entropy": entropy, "size": size,
+                 "mime_type": detect_file_type(file_path), "x86": is_x86_executable(data),
+                 "lines": data.count(b"\n")}
     decision = adaptive_decision(file_info, thresholds, auto_recalibrate_enabled)
 
-    algo = decision["algo"]
-    compressed = None
-
-    if algo == "zstd":
-        compressed = zstd.ZstdCompressor().compress(data)
-    elif algo == "brotli":
-        compressed = brotli.compress(data)
-    elif algo == "lz4":
-        compressed = lz4.frame.compress(data)
-    elif algo == "gzip":
-        compressed = gzip.compress(data)
-    elif algo == "bz2":
-        compressed = bz2.compress(data)
-    elif algo == "lzma":
-        compressed = lzma.compress(data)
+    # Bare codec output has no header to record filters in
+    params, _ = split_params(decision["params"])
+    codec = compressors.get_codec(decision["algo"])
+    compressed = codec.compress(data, **params)
 
     return compressed, decision
 
@@ -164,6 +418,17 @@ def log_thresholds(entropy_threshold, size_threshold):
 # ----------------------
 # Auto Recalibration
 # ----------------------
+# Share of the observed medians blended into the thresholds per recalibration
+RECALIBRATION_WEIGHT = 0.3
+
+def smooth_thresholds(thresholds, entropies, sizes, weight=RECALIBRATION_WEIGHT):
+    """Move the entropy / size thresholds `weight` of the way to the medians of a window."""
+    thresholds = dict(thresholds)
+    thresholds["entropy_threshold"] = round(
+        thresholds["entropy_threshold"] * (1 - weight) + statistics.median(entropies) * weight, 3)
+    thresholds["size_threshold"] = int(thresholds["size_threshold"] * (1 - weight) + statistics.median(sizes) * weight)
+    return thresholds
+
 def auto_recalibrate(window=500, log_file="adaptive_log.jsonl"):
     """
     Wrapper to recalibrate thresholds from log or DB.
@@ -172,47 +437,10 @@ def auto_recalibrate(window=500, log_file="adaptive_log.jsonl"):
         from smartzip_dashboard import auto_recalibrate_from_log
         thresholds = auto_recalibrate_from_log(log_file=log_file, window=window)
         if thresholds:
-            return thresholds
+            return publish_thresholds(thresholds)
     except ImportError:
         print("⚠️ Dashboard recalibration not available")
     except Exception as e:
         print("⚠️ Auto-recalibration error:", e)
 
-    return load_thresholds()
-
-# ----------------------
-# Catalog Integration
-# ----------------------
-def add_decision_to_catalog(file_name, decision):
-    try:
-        import sqlite3
-        conn = sqlite3.connect("smartzip_catalog.db")
-        c = conn.cursor()
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS decisions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                file_name TEXT,
-                algo TEXT,
-                entropy REAL,
-                size INTEGER,
-                entropy_threshold REAL,
-                size_threshold INTEGER,
-                timestamp REAL
-            )
-        """)
-        c.execute("""
-            INSERT INTO decisions (file_name, algo, entropy, size, entropy_threshold, size_threshold, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            file_name,
-            decision.get("algo"),
-            decision.get("file_entropy"),
-            decision.get("file_size"),
-            decision.get("entropy_threshold"),
-            decision.get("size_threshold"),
-            decision.get("timestamp"),
-        ))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print("⚠️ Failed to log decision to catalog:", e)
+    return get_thresholds()
@@ -0,0 +1,230 @@
+import json
+import math
+import time
+from smartzip_pool import on_commit, reader, writer
+
+DB_FILE = "smartzip_catalog.db"
+
+# Same limits as smartzip_dashboard.check_anomalies()
+LOW_RATIO_LIMIT = 0.1
+SIZE_SLOPE_LIMIT = 5_000_000
+FLIP_RATE_LIMIT = 1 / 3
+
+
+# ----------------------------
+# Persistence
+# ----------------------------
+def load_state(conn, name="catalog"):
+    row = conn.execute("SELECT state FROM anomaly_state WHERE name=?", (name,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def save_state(conn, state, name="catalog"):
+    conn.execute("""
+        INSERT OR REPLACE INTO anomaly_state (name, state, updated_at)
+        VALUES (?, ?, ?)
+    """, (name, json.dumps(state), time.time()))
+
+
+def recent_events(conn, limit=50):
+    return conn.execute("""
+        SELECT id, timestamp, kind, message, file_id, value
+        FROM anomaly_events ORDER BY id DESC LIMIT ?
+    """, (limit,)).fetchall()
+
+
+# ----------------------------
+# Online Detector
+# ----------------------------
+# A warning stays up for this many inserts after its kind last alerted
+WARNING_WINDOW = 1000
+
+
+def new_state():
+    return {
+        "count": 0,
+        "entropy_mean": None,
+        "entropy_var": 0.0,
+        "flip_rate": 0.0,
+        "last_algo": None,
+        "last_size": None,
+        "low_ratio": 0,
+        "entropy_outliers": 0,
+        "size_jumps": 0,
+        "unstable": False,
+        "last_alert": {},   # alert kind -> count when it last fired
+    }
+
+
+class OnlineAnomalyDetector:
+    """
+    Incremental version of check_anomalies(): O(1) work per catalog insert.
+
+    Entropy drift uses an exponentially weighted mean/variance (smoothing
+    `alpha`), algorithm instability an EWMA of algorithm flips, and size
+    growth the jump from the previous file. Each anomaly is returned as an
+    event dict, written to `anomaly_events` and passed to subscribers.
+
+    The state lives in the catalog being written (one per shard with
+    ShardedSQLiteBackend): observe() reads it inside the insert's write
+    transaction, so every process folds its rows into the same state, and
+    `state` / subscribers only see it once that transaction commits.
+    """
+
+    def __init__(self, alpha=0.01, min_samples=30, name="catalog"):
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.name = name
+        self.state = new_state()   # last committed state seen by this process
+        self._listeners = []
+
+    def subscribe(self, callback):
+        """Register callback(event) for every raised alert."""
+        self._listeners.append(callback)
+
+    def load(self, conn):
+        return {**new_state(), **(load_state(conn, self.name) or {})}
+
+    def update(self, state, entry, file_id=None):
+        """Fold one catalog entry into `state` (in place) and return any alerts."""
+        s = state
+        alerts = []
+        entropy = entry.get("entropy")
+        ratio = entry.get("compression_ratio")
+        size = entry.get("original_size")
+        algo = entry.get("algo")
+        s["count"] += 1
+
+        # Compression Quality
+        if ratio is not None and ratio < LOW_RATIO_LIMIT:
+            s["low_ratio"] += 1
+            alerts.append(("low_ratio", f"⚠️ Very low compression ratio ({ratio:.4f} < {LOW_RATIO_LIMIT}).", ratio))
+
+        # Entropy Drift (beyond ±2 EWMA std dev, once warmed up)
+        if entropy is not None:
+            mean = s["entropy_mean"]
+            if mean is None:
+                s["entropy_mean"] = entropy
+            else:
+                std = math.sqrt(s["entropy_var"])
+                if s["count"] > self.min_samples and abs(entropy - mean) > 2 * std:
+                    s["entropy_outliers"] += 1
+                    alerts.append(("entropy_drift", f"⚠️ Entropy drift detected ({entropy:.3f} vs mean {mean:.3f} ± {2 * std:.3f}).", entropy))
+                # Plain running mean/var while warming up, then EWMA
+                alpha = max(self.alpha, 1 / s["count"])
+                diff = entropy - mean
+                incr = alpha * diff
+                s["entropy_mean"] = mean + incr
+                s["entropy_var"] = (1 - alpha) * (s["entropy_var"] + diff * incr)
+
+        # Algorithm Instability
+        if algo is not None:
+            if s["last_algo"] is not None:
+                flipped = 1.0 if algo != s["last_algo"] else 0.0
+                s["flip_rate"] += self.alpha * (flipped - s["flip_rate"])
+            s["last_algo"] = algo
+            unstable = s["count"] > self.min_samples and s["flip_rate"] > FLIP_RATE_LIMIT
+            if unstable and not s["unstable"]:
+                alerts.append(("algo_instability", f"⚠️ Algorithm switching too often (flip rate {s['flip_rate']:.2f}).", s["flip_rate"]))
+            s["unstable"] = unstable
+
+        # Size Growth
+        if size is not None:
+            if s["last_size"] is not None and size - s["last_size"] > SIZE_SLOPE_LIMIT:
+                s["size_jumps"] += 1
+                alerts.append(("size_jump", f"⚠️ Sudden file size growth detected ({s['last_size']} → {size} bytes).", size))
+            s["last_size"] = size
+
+        for kind, _, _ in alerts:
+            s["last_alert"][kind] = s["count"]
+        now = time.time()
+        return [{"timestamp": now, "kind": kind, "message": msg, "file_id": file_id, "value": value}
+                for kind, msg, value in alerts]
+
+    def observe(self, conn, entry, file_id=None):
+        """
+        Update from an inserted row, persisting state and alerts on `conn`
+        (inside the caller's transaction). Returns the alerts; `state` and
+        subscribers are updated after the transaction commits.
+        """
+        # The insert already holds the write lock: no other writer can
+        # change the stored state between this read and the commit
+        state = self.load(conn)
+        events = self.update(state, entry, file_id)
+        save_state(conn, state, self.name)
+        if events:
+            conn.executemany("""
+                INSERT INTO anomaly_events (timestamp, kind, message, file_id, value)
+                VALUES (:timestamp, :kind, :message, :file_id, :value)
+            """, events)
+        on_commit(conn, lambda: self._committed(state, events))
+        return events
+
+    def _committed(self, state, events):
+        self.state = state
+        for event in events:
+            for callback in self._listeners:
+                try:
+                    callback(event)
+                except Exception as e:
+                    print("⚠️ Anomaly listener failed:", e)
+
+
+DETECTOR = OnlineAnomalyDetector()
+
+
+def observe_entry(conn, entry, file_id=None):
+    return DETECTOR.observe(conn, entry, file_id)
+
+
+def current_warnings(state, window=WARNING_WINDOW):
+    """
+    check_anomalies()-style warnings from a persisted state dict, in O(1):
+    alerts from the last `window` inserts, and current instability.
+    """
+    if not state or state.get("count", 0) < 2:
+        return ["Not enough data for anomaly detection."]
+    last_alert = state.get("last_alert", {})
+
+    def recent(kind):
+        return kind in last_alert and state["count"] - last_alert[kind] < window
+
+    warnings = []
+    if recent("low_ratio"):
+        warnings.append("⚠️ Very low compression ratios detected (<0.1).")
+    if recent("entropy_drift"):
+        warnings.append("⚠️ Entropy drift detected (outliers).")
+    if state["unstable"]:
+        warnings.append("⚠️ Algorithm switching too often (unstable).")
+    if recent("size_jump"):
+        warnings.append("⚠️ Sudden file size growth detected.")
+    return warnings
+
+
+def rebuild_state(db_file=DB_FILE, batch_size=10_000, name="catalog"):
+    """Replay the whole files table through a fresh detector (one-off, e.g. after migration)."""
+    detector = OnlineAnomalyDetector(name=name)
+    state = new_state()
+    last_id = 0
+    with reader(db_file) as conn:
+        while True:
+            rows = conn.execute("""
+                SELECT id, algo, original_size, compression_ratio, entropy
+                FROM files WHERE id > ? ORDER BY id LIMIT ?
+            """, (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            for file_id, algo, size, ratio, entropy in rows:
+                detector.update(state, {"algo": algo, "original_size": size,
+                                 "compression_ratio": ratio, "entropy": entropy}, file_id)
+            last_id = rows[-1][0]
+    with writer(db_file) as conn:
+        save_state(conn, state, name)
+    return state
+
+
+if __name__ == "__main__":
+    state = rebuild_state()
+    print(f"✅ Anomaly state rebuilt from {state['count']} rows.")
+    for w in current_warnings(state):
+        print(" -", w)
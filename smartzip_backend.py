@@ -0,0 +1,537 @@
+import atexit
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from smartzip_anomaly import observe_entry
+from smartzip_pool import get_pool, reader, writer
+from smartzip_schema import DB_FILE
+
+SHARD_DIR = "catalog_shards"
+SHARD_META = "shards.json"
+DEFAULT_SHARDS = 16
+
+
+# ----------------------------
+# Shared SQL
+# ----------------------------
+# Module-level SQL text: identical strings hit the connection's statement cache
+INSERT_FILE_SQL = """
+    INSERT INTO files (
+        file_name, file_hash, mime_type, algo,
+        original_size, compressed_size, compression_ratio,
+        entropy, created_at, codec_params, tier, key_id, expires_at
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+TOUCH_SQL = "UPDATE files SET accessed_at=? WHERE id=?"
+# Rows sharing a content blob that was just re-encoded (e.g. encrypted on a
+# second store) take on the new blob's codec, params, size and key
+RESYNC_BLOB_SQL = """
+    UPDATE files SET algo=?, codec_params=?, compressed_size=?, key_id=?,
+        compression_ratio = CASE WHEN original_size > 0 THEN ROUND(CAST(? AS REAL) / original_size, 4) ELSE 0 END
+    WHERE file_hash=? AND id NOT IN (SELECT file_id FROM pack_members)
+"""
+
+LOOKUP_BY_ID_SQL = "SELECT id, file_name, algo, file_hash FROM files WHERE id=?"
+LOOKUP_BY_NAME_SQL = "SELECT id, file_name, algo, file_hash FROM files WHERE file_name=?"
+# Batch lookups; {marks} is one "?" per key, at most LOOKUP_BATCH of them
+LOOKUP_MANY_BY_ID_SQL = "SELECT id, file_name, algo, file_hash, original_size FROM files WHERE id IN ({marks})"
+LOOKUP_MANY_BY_NAME_SQL = """
+    SELECT id, file_name, algo, file_hash, original_size FROM files
+    WHERE file_name IN ({marks}) ORDER BY id
+"""
+LOOKUP_BATCH = 500
+
+QUERY_COLUMNS = [
+    "id", "file_name", "mime_type", "algo",
+    "original_size", "compressed_size", "compression_ratio",
+    "entropy", "created_at",
+]
+
+# filter key -> SQL condition (unknown keys are ignored)
+QUERY_FILTERS = {
+    "algo": "algo=?",
+    "mime_type": "mime_type=?",
+    "entropy<": "entropy < ?",
+    "ratio<": "compression_ratio < ?",
+    "key_id": "key_id=?",
+}
+
+# Per-algo partial aggregates; every column merges by sum, min or max
+AGGREGATE_SQL = """
+    SELECT algo, COUNT(*), SUM(original_size), SUM(compressed_size),
+           SUM(entropy), MIN(entropy), MAX(entropy), SUM(compression_ratio)
+    FROM files {where} GROUP BY algo
+"""
+
+
+def insert_entry(conn, entry):
+    """Insert one entry on an open connection (no commit) and return its row id."""
+    c = conn.cursor()
+    if entry.pop("rewrote_blob", False):
+        c.execute(RESYNC_BLOB_SQL, (entry["algo"], entry.get("codec_params"), entry["compressed_size"],
+                                    entry.get("key_id"), entry["compressed_size"], entry["file_hash"]))
+        if entry.get("key_id"):
+            # Filters of plaintext blocks must not outlive the plaintext
+            c.execute("DELETE FROM block_blooms WHERE file_hash=?", (entry["file_hash"],))
+    c.execute(INSERT_FILE_SQL, (
+        entry["file_name"], entry["file_hash"], entry["mime_type"], entry["algo"],
+        entry["original_size"], entry["compressed_size"], entry["compression_ratio"],
+        entry["entropy"], entry["created_at"], entry.get("codec_params"), entry.get("tier"),
+        entry.get("key_id"), entry.get("expires_at")
+    ))
+    row_id = c.lastrowid  # ✅ capture the auto-increment id
+    # Scan filters are per content, so rows sharing a blob share them
+    c.executemany("INSERT OR IGNORE INTO block_blooms (file_hash, block, bits) VALUES (?, ?, ?)",
+                  [(entry["file_hash"], block, bits) for block, bits in entry.pop("blooms", ())])
+
+    # Online anomaly detection: O(1) state update in the same transaction
+    try:
+        observe_entry(conn, entry, row_id)
+    except Exception as e:
+        print("⚠️ Anomaly detection failed:", e)
+    return row_id
+
+
+def build_query(filters=None, order_by=None, limit=None):
+    """SELECT over QUERY_COLUMNS for the query() filter dict; returns (sql, params)."""
+    where, params = _where(filters)
+    sql = f"SELECT {', '.join(QUERY_COLUMNS)} FROM files {where}"
+    if order_by:
+        sql += f" ORDER BY {_order_column(order_by)}, id"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return sql, params
+
+
+def _where(filters):
+    conditions, params = [], []
+    for key, val in (filters or {}).items():
+        if key in QUERY_FILTERS:
+            conditions.append(QUERY_FILTERS[key])
+            params.append(val)
+    return ("WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+
+def _order_column(order_by):
+    if order_by not in QUERY_COLUMNS:
+        raise ValueError(f"Cannot order catalog rows by {order_by!r}; choose from {QUERY_COLUMNS}")
+    return order_by
+
+
+def _is_id(key):
+    return isinstance(key, int) or (isinstance(key, str) and key.isdigit())
+
+
+def _lookup_rows(conn, sql, values):
+    """Run a LOOKUP_MANY_* statement over `values` in LOOKUP_BATCH chunks."""
+    rows = []
+    for start in range(0, len(values), LOOKUP_BATCH):
+        batch = values[start:start + LOOKUP_BATCH]
+        rows += conn.execute(sql.format(marks=",".join("?" * len(batch))), batch).fetchall()
+    return rows
+
+
+def _match_keys(keys, by_id, by_name):
+    """{key: row} for the keys found; a name maps to its lowest-id row, like lookup()."""
+    found = {}
+    for key in keys:
+        row = by_id.get(int(key)) if _is_id(key) else by_name.get(key)
+        if row:
+            found[key] = row
+    return found
+
+
+def merge_aggregates(partials):
+    """Fold per-shard aggregate rows into one summary per algo."""
+    totals = {}
+    for algo, files, original, compressed, entropy_sum, entropy_min, entropy_max, ratio_sum in partials:
+        t = totals.setdefault(algo, [0, 0, 0, 0.0, None, None, 0.0])
+        t[0] += files
+        t[1] += original or 0
+        t[2] += compressed or 0
+        t[3] += entropy_sum or 0
+        if entropy_min is not None:
+            t[4] = entropy_min if t[4] is None else min(t[4], entropy_min)
+            t[5] = entropy_max if t[5] is None else max(t[5], entropy_max)
+        t[6] += ratio_sum or 0
+    return {
+        algo: {
+            "files": files,
+            "original_bytes": original,
+            "compressed_bytes": compressed,
+            "avg_entropy": entropy_sum / files if files else None,
+            "min_entropy": entropy_min,
+            "max_entropy": entropy_max,
+            "avg_ratio": ratio_sum / files if files else None,
+        }
+        for algo, (files, original, compressed, entropy_sum, entropy_min, entropy_max, ratio_sum)
+        in sorted(totals.items(), key=lambda kv: str(kv[0]))
+    }
+
+
+# ----------------------------
+# Access Times
+# ----------------------------
+ACCESS_FLUSH_INTERVAL = 5.0
+ACCESS_BATCH_SIZE = 1000
+
+
+class AccessLog:
+    """
+    get() times buffered in memory and written to files.accessed_at in
+    batches, so a read does not cost a write transaction. Only the latest
+    time per id is kept; `write` receives {id: timestamp}.
+    """
+
+    def __init__(self, write, flush_interval=ACCESS_FLUSH_INTERVAL, batch_size=ACCESS_BATCH_SIZE):
+        self.write = write
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flushed_at = time.monotonic()
+
+    def record(self, file_id, when=None):
+        with self._lock:
+            self._pending[file_id] = when or time.time()
+            due = (len(self._pending) >= self.batch_size
+                   or time.monotonic() - self._flushed_at >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+        if batch:
+            try:
+                self.write(batch)
+            except Exception as e:
+                print("⚠️ Could not record catalog access times:", e)
+
+
+# ----------------------------
+# Backend Interface
+# ----------------------------
+class CatalogBackend:
+    """
+    Where `files` rows live. smartzip_catalog goes through the configured
+    backend for store/get/query; pack, ingest and maintenance tools keep
+    using the single-file catalog (`db_file`) directly.
+
+    Ids returned by insert() are the ids lookup() accepts. `packs` says
+    whether rows may also have pack_members in `db_file`.
+    """
+
+    name = "base"
+    packs = False
+    db_file = None
+
+    def __init__(self):
+        self.access = AccessLog(self.touch)
+
+    def insert(self, entry):
+        raise NotImplementedError
+
+    def insert_many(self, entries):
+        return [self.insert(entry) for entry in entries]
+
+    def lookup(self, key):
+        """(id, file_name, algo, file_hash) by numeric id or file name, or None."""
+        raise NotImplementedError
+
+    def lookup_many(self, keys):
+        """{key: (id, file_name, algo, file_hash, original_size)} for the keys found, in few queries."""
+        raise NotImplementedError
+
+    def query(self, filters=None, order_by=None, limit=None):
+        raise NotImplementedError
+
+    def aggregate(self, filters=None):
+        """Per-algo summary, see merge_aggregates()."""
+        raise NotImplementedError
+
+    def touch(self, accessed):
+        """Write {id: timestamp} to files.accessed_at (use access.record() on the read path)."""
+        raise NotImplementedError
+
+    def close(self):
+        self.access.flush()
+
+
+class SQLiteBackend(CatalogBackend):
+    """The single catalog DB behind the shared connection pool."""
+
+    name = "sqlite"
+    packs = True
+
+    def __init__(self, db_file=DB_FILE):
+        super().__init__()
+        self.db_file = db_file
+        get_pool(db_file)
+
+    def insert(self, entry):
+        with writer(self.db_file) as conn:
+            return insert_entry(conn, entry)
+
+    def insert_many(self, entries):
+        with writer(self.db_file) as conn:
+            return [insert_entry(conn, entry) for entry in entries]
+
+    def lookup(self, key):
+        with reader(self.db_file) as conn:
+            if _is_id(key):
+                return conn.execute(LOOKUP_BY_ID_SQL, (int(key),)).fetchone()
+            return conn.execute(LOOKUP_BY_NAME_SQL, (key,)).fetchone()
+
+    def lookup_many(self, keys):
+        with reader(self.db_file) as conn:
+            by_id = {row[0]: row for row in _lookup_rows(
+                conn, LOOKUP_MANY_BY_ID_SQL, sorted({int(k) for k in keys if _is_id(k)}))}
+            by_name = {}
+            for row in _lookup_rows(conn, LOOKUP_MANY_BY_NAME_SQL, sorted({k for k in keys if not _is_id(k)})):
+                by_name.setdefault(row[1], row)
+        return _match_keys(keys, by_id, by_name)
+
+    def query(self, filters=None, order_by=None, limit=None):
+        sql, params = build_query(filters, order_by, limit)
+        with reader(self.db_file) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def aggregate(self, filters=None):
+        where, params = _where(filters)
+        with reader(self.db_file) as conn:
+            return merge_aggregates(conn.execute(AGGREGATE_SQL.format(where=where), params).fetchall())
+
+    def touch(self, accessed):
+        with writer(self.db_file) as conn:
+            conn.executemany(TOUCH_SQL, [(when, file_id) for file_id, when in accessed.items()])
+
+
+class ShardedSQLiteBackend(CatalogBackend):
+    """
+    `files` spread over N SQLite databases in `shard_dir`, routed by the
+    leading hex digits of file_hash. Each shard has its own WAL writer, so
+    writes to different shards commit in parallel instead of queueing on
+    one database lock.
+
+    Global ids encode the shard: id = local_id * N + shard, so lookup by id
+    touches one shard. Lookups by name, query() and aggregate() fan out to
+    every shard on a thread pool and merge the partial results. N is
+    recorded in `shard_dir/shards.json` on first use and cannot change
+    afterwards (it is baked into every id).
+    """
+
+    name = "sharded"
+
+    def __init__(self, shard_dir=SHARD_DIR, shards=None, workers=None):
+        super().__init__()
+        self.shard_dir = shard_dir
+        self.shards = self._shard_count(shards)
+        self.paths = [os.path.join(shard_dir, f"catalog-{i:03d}.db") for i in range(self.shards)]
+        for path in self.paths:
+            get_pool(path)
+        self._executor = ThreadPoolExecutor(max_workers=workers or min(32, self.shards),
+                                            thread_name_prefix="catalog-shard")
+
+    def _shard_count(self, shards):
+        os.makedirs(self.shard_dir, exist_ok=True)
+        meta_file = os.path.join(self.shard_dir, SHARD_META)
+        if os.path.exists(meta_file):
+            with open(meta_file) as f:
+                existing = json.load(f)["shards"]
+            if shards is not None and shards != existing:
+                raise ValueError(f"{self.shard_dir} holds {existing} shards, not {shards}; "
+                                 "re-sharding would change every file id")
+            return existing
+        shards = shards or DEFAULT_SHARDS
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        with open(meta_file, "w") as f:
+            json.dump({"shards": shards}, f)
+        return shards
+
+    # -------- routing --------
+    def shard_for(self, file_hash):
+        """Shard index for a SHA-256 hex digest (its first 8 hex digits mod N)."""
+        return int(file_hash[:8], 16) % self.shards
+
+    def global_id(self, shard, local_id):
+        return local_id * self.shards + shard
+
+    def split_id(self, file_id):
+        """(shard, local id) for a global id."""
+        local_id, shard = divmod(int(file_id), self.shards)
+        return shard, local_id
+
+    def _to_global(self, shard, row):
+        return (self.global_id(shard, row[0]),) + tuple(row[1:])
+
+    def _fan_out(self, fn):
+        """Run fn(shard) on every shard in parallel; results in shard order."""
+        return list(self._executor.map(fn, range(self.shards)))
+
+    # -------- writes --------
+    def insert(self, entry):
+        shard = self.shard_for(entry["file_hash"])
+        with writer(self.paths[shard]) as conn:
+            return self.global_id(shard, insert_entry(conn, entry))
+
+    def insert_many(self, entries):
+        """One transaction per touched shard, committed in parallel; ids in input order."""
+        groups = {}
+        for i, entry in enumerate(entries):
+            groups.setdefault(self.shard_for(entry["file_hash"]), []).append(i)
+
+        def write(shard):
+            with writer(self.paths[shard]) as conn:
+                return [(i, self.global_id(shard, insert_entry(conn, entries[i]))) for i in groups[shard]]
+
+        ids = [None] * len(entries)
+        for written in self._executor.map(write, list(groups)):
+            for i, file_id in written:
+                ids[i] = file_id
+        return ids
+
+    # -------- reads --------
+    def lookup(self, key):
+        if _is_id(key):
+            shard, local_id = self.split_id(key)
+            with reader(self.paths[shard]) as conn:
+                row = conn.execute(LOOKUP_BY_ID_SQL, (local_id,)).fetchone()
+            return self._to_global(shard, row) if row else None
+
+        def find(shard):
+            with reader(self.paths[shard]) as conn:
+                row = conn.execute(LOOKUP_BY_NAME_SQL, (key,)).fetchone()
+            return self._to_global(shard, row) if row else None
+
+        found = [row for row in self._fan_out(find) if row]
+        return min(found) if found else None
+
+    def lookup_many(self, keys):
+        """One IN query per shard for the ids routed to it and for every name."""
+        local_ids = {}
+        for key in keys:
+            if _is_id(key):
+                shard, local_id = self.split_id(key)
+                local_ids.setdefault(shard, set()).add(local_id)
+        names = sorted({k for k in keys if not _is_id(k)})
+
+        def find(shard):
+            with reader(self.paths[shard]) as conn:
+                rows = _lookup_rows(conn, LOOKUP_MANY_BY_ID_SQL, sorted(local_ids.get(shard, ())))
+                if names:
+                    rows += _lookup_rows(conn, LOOKUP_MANY_BY_NAME_SQL, names)
+            return [self._to_global(shard, row) for row in rows]
+
+        rows = sorted(row for part in self._fan_out(find) for row in part)
+        by_name = {}
+        for row in rows:
+            by_name.setdefault(row[1], row)
+        return _match_keys(keys, {row[0]: row for row in rows}, by_name)
+
+    def query(self, filters=None, order_by=None, limit=None):
+        """
+        Each shard returns at most `limit` rows already sorted by `order_by`;
+        a k-way merge keeps the global order and stops at `limit`.
+        """
+        sql, params = build_query(filters, order_by, limit)
+
+        def run(shard):
+            with reader(self.paths[shard]) as conn:
+                return [self._to_global(shard, row) for row in conn.execute(sql, params)]
+
+        parts = self._fan_out(run)
+        if order_by:
+            k = QUERY_COLUMNS.index(order_by)
+            # Same order as SQLite: NULLs first, ties by id
+            rows = heapq.merge(*parts, key=lambda row: (0, 0, row[0]) if row[k] is None else (1, row[k], row[0]))
+        else:
+            rows = (row for part in parts for row in part)
+        return list(islice(rows, limit)) if limit is not None else list(rows)
+
+    def aggregate(self, filters=None):
+        where, params = _where(filters)
+        sql = AGGREGATE_SQL.format(where=where)
+
+        def run(shard):
+            with reader(self.paths[shard]) as conn:
+                return conn.execute(sql, params).fetchall()
+
+        return merge_aggregates(row for part in self._fan_out(run) for row in part)
+
+    def touch(self, accessed):
+        groups = {}
+        for file_id, when in accessed.items():
+            shard, local_id = self.split_id(file_id)
+            groups.setdefault(shard, []).append((when, local_id))
+        for shard, rows in groups.items():
+            with writer(self.paths[shard]) as conn:
+                conn.executemany(TOUCH_SQL, rows)
+
+    def close(self):
+        super().close()
+        self._executor.shutdown(wait=True)
+
+
+# ----------------------------
+# Configured Backend
+# ----------------------------
+BACKENDS = {
+    "sqlite": SQLiteBackend,
+    "sharded": ShardedSQLiteBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def configure_backend(kind="sqlite", **options):
+    """Select the catalog backend for this process (e.g. kind="sharded", shards=8)."""
+    global _backend
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown catalog backend {kind!r}; choose from {sorted(BACKENDS)}")
+    backend = BACKENDS[kind](**options)
+    with _backend_lock:
+        old, _backend = _backend, backend
+    if old:
+        old.close()
+    return backend
+
+
+def get_backend():
+    """The configured backend, defaulting to the single-file SQLite catalog."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = SQLiteBackend()
+    return _backend
+
+
+def _flush_access():
+    # Registered after smartzip_pool's close_pools, so it runs before it
+    if _backend is not None:
+        _backend.access.flush()
+
+
+atexit.register(_flush_access)
+
+
+if __name__ == "__main__":
+    # python smartzip_backend.py [shard_dir] → per-algo summary across shards
+    shard_dir = sys.argv[1] if len(sys.argv) > 1 else SHARD_DIR
+    backend = ShardedSQLiteBackend(shard_dir) if os.path.isdir(shard_dir) else SQLiteBackend()
+    for algo, summary in backend.aggregate().items():
+        print(f"📦 {algo}: {summary['files']} files, "
+              f"{summary['original_bytes'] / 1e6:.1f} MB → {summary['compressed_bytes'] / 1e6:.1f} MB, "
+              f"avg ratio {summary['avg_ratio']:.3f}")
+    backend.close()
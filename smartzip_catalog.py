@@ -1,13 +1,24 @@
 import os
-import sqlite3
+import json
 import hashlib
 import mimetypes
 import time
 import compressors
 import math
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from smartzip_adaptive import shannon_entropy
-from smartzip_adaptive import adaptive_decision
-from compressors import compress_data
+from smartzip_adaptive import adaptive_decision, get_thresholds
+from smartzip_backend import get_backend, insert_entry
+from smartzip_blob import (BLOCK_SIZE, BlobFormatError, blob_path, compress_blob, encryption_key_id,
+                           is_delta, is_encrypted, parse_header, read_header, read_range, restore_blob,
+                           write_blob)
+from smartzip_filters import is_x86_executable, split_params
+from smartzip_pool import get_pool, reader
+from smartzip_scan import block_blooms
 
 # directory for saving compressed files
 COMPRESSED_DIR = "compressed"
@@ -48,100 +59,324 @@ DB_FILE = "smartzip_catalog.db"
 # DB Setup
 # ----------------------------
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-
-    # Drop old table if exists (optional cleanup)
-    c.execute("DROP TABLE IF EXISTS files")
-
-    # Recreate with clean schema
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS files (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        file_name TEXT,
-        file_hash TEXT,
-        mime_type TEXT,
-        algo TEXT,
-        original_size INTEGER,
-        compressed_size INTEGER,
-        compression_ratio REAL,
-        entropy REAL,
-        created_at REAL
-    )
-    """)
-    conn.commit()
-    conn.close()
-
-
-def init_catalog_db():
-    conn = sqlite3.connect(DB_FILE)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS catalog (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            filename TEXT,
-            filetype TEXT,
-            algorithm TEXT,
-            entropy REAL,
-            original_size INTEGER,
-            compressed_size INTEGER,
-            compression_ratio REAL,
-            entropy_threshold REAL,
-            size_threshold REAL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    conn.commit()
-    conn.close()
-
-def add_decision_to_catalog(file_info, decision):
+    """Bring the catalog to the current schema version (never drops data)."""
+    get_pool(DB_FILE)
+
+
+# Adaptive decisions live in the `decisions` table and are written
+# behind the hot path by smartzip_decisions.
+from smartzip_decisions import add_decision_to_catalog
+
+# ----------------------------
+# Get File (decompress)
+# ----------------------------
+def get(file_id, out_path, verify_hash=False):
     """
-    Store adaptive decision into catalog table.
-    file_info: dict with file metadata (file, type, size, entropy)
-    decision: dict returned by adaptive_decision()
+    Restore a file by id, name or content hash. Framed blobs are checked
+    block by block against their fast checksums while they are written;
+    `verify_hash` also recomputes the (slow) SHA-256 content identity.
     """
-    decision_algo = decision.get("algo") or decision.get("algorithm")
-
-    conn = sqlite3.connect(DB_FILE)
-    conn.execute("""
-        INSERT INTO catalog (filename, filetype, algorithm, entropy, original_size,
-                             compressed_size, compression_ratio,
-                             entropy_threshold, size_threshold, timestamp)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        file_info.get("file"),
-        file_info.get("type"),
-        decision_algo,
-        file_info.get("entropy"),
-        file_info.get("size"),
-        decision.get("compressed_size", None),
-        decision.get("compression_ratio", None),
-        decision.get("entropy_threshold"),
-        decision.get("size_threshold"),
-        decision["timestamp"]
-    ))
-    conn.commit()
-    conn.close()
+    restored = _restore(file_id, out_path)
+    if verify_hash:
+        expected = file_id if _is_content_hash(file_id) else _lookup(file_id)[3]
+        if file_hash(out_path) != expected:
+            raise ValueError(f"Restored file {out_path} does not match its catalog SHA-256")
+    return restored
+
 
 # ----------------------------
-# Get File (decompress)
+# Batch Get
 # ----------------------------
-def get(file_id, out_path):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+# Decoded bytes get_many() lets its workers hold at once
+GET_MANY_MEMORY = 256 * 1024 * 1024
+# Restores queued per worker; also how far readahead runs ahead of them
+GET_MANY_IN_FLIGHT = 4
+# A framed blob is restored as a stream of checked blocks
+STREAM_RESIDENT = 2 * BLOCK_SIZE
 
-    # Allow lookup by numeric id or by file_name
-    if isinstance(file_id, int) or (isinstance(file_id, str) and file_id.isdigit()):
-        c.execute("SELECT file_name, algo FROM files WHERE id=?", (int(file_id),))
-    else:
-        c.execute("SELECT file_name, algo FROM files WHERE file_name=?", (file_id,))
 
-    row = c.fetchone()
-    conn.close()
+class _MemoryBudget:
+    """acquire() waits until `size` more bytes fit under the cap (an oversized job runs alone)."""
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, size):
+        with self._cond:
+            self._cond.wait_for(lambda: self.used == 0 or self.used + size <= self.cap)
+            self.used += size
+
+    def release(self, size):
+        with self._cond:
+            self.used -= size
+            self._cond.notify_all()
+
+
+def _readahead(path, offset=0, length=0):
+    """Start reading a byte range into the page cache (no-op without posix_fadvise)."""
+    if hasattr(os, "posix_fadvise"):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+
+def _disk_order(path, offset=0):
+    # Inode numbers roughly follow allocation order on disk
+    st = os.stat(path)
+    return st.st_dev, st.st_ino, offset
+
+
+def _out_path(dest_dir, file_name, taken, row_id):
+    """dest_dir/file_name kept inside dest_dir; a name seen before gets a .<id> suffix."""
+    rel = os.path.normpath(file_name).lstrip(os.sep)
+    if rel == os.curdir or rel.split(os.sep)[0] == os.pardir:
+        rel = os.path.basename(rel) or str(row_id)
+    if rel in taken:
+        rel = f"{rel}.{row_id}"
+    taken.add(rel)
+    return os.path.join(dest_dir, rel)
+
+
+def _verify_outputs(checks):
+    """Compare (out path, expected SHA-256 or None) pairs."""
+    for out, expected in checks:
+        if expected and file_hash(out) != expected:
+            raise ValueError(f"Restored file {out} does not match its catalog SHA-256")
+
+
+def _decoded_whole(path):
+    """Bytes read_blob(path) holds at its peak: the frame, its data and a delta's base."""
+    with open(path, "rb") as f:
+        header = read_header(f)
+    resident = os.path.getsize(path) + header["original_size"]
+    if is_delta(header):
+        resident += _decoded_whole(blob_path(header["params"]["base"]))
+    return resident
+
+
+def _blob_resident(path):
+    """Bytes restoring a blob holds at once (see smartzip_blob.iter_blob)."""
+    try:
+        with open(path, "rb") as f:
+            header = read_header(f)
+        if is_delta(header):
+            # The base is decoded whole before the delta streams against it
+            return STREAM_RESIDENT + _decoded_whole(blob_path(header["params"]["base"]))
+        if is_encrypted(header):
+            # Sealed and opened blocks of one window (a block per CPU)
+            window = (os.cpu_count() or 1) * header["params"]["encryption"]["block"]
+            return 2 * min(header["original_size"], window) + STREAM_RESIDENT
+        if compressors.get_codec(header["codec"]).stream_decompress is None:
+            return header["payload_size"] + header["original_size"]
+    except (OSError, ValueError, KeyError):
+        pass  # the restore itself reports a broken blob, base or codec
+    return STREAM_RESIDENT
+
+
+def _run_blob(path, checks):
+    restore_blob(path, checks[0][0])
+    for out, _ in checks[1:]:  # rows sharing the content
+        shutil.copyfile(checks[0][0], out)
+    _verify_outputs(checks)
+
+
+def _run_pack(block, members):
+    from smartzip_pack import read_packed_block
+    raw = read_packed_block(*block)
+    for member_offset, member_length, (out, _) in members:
+        with open(out, "wb") as f:
+            f.write(raw[member_offset:member_offset + member_length])
+    _verify_outputs([check for _, _, check in members])
+
+
+def _run_legacy(comp_file, algo, check):
+    with open(comp_file, "rb") as f:
+        data = compressors.get_codec(algo).decompress(f.read())
+    with open(check[0], "wb") as f:
+        f.write(data)
+    _verify_outputs([check])
+
+
+def _restore_jobs(rows, hashes, locations, dest_dir, verify_hash):
+    """
+    Group the restores so shared data is decoded once (a blob for every row
+    with its hash, a pack block for all its members) and return (key_out,
+    jobs); each job is (disk order, resident bytes, readahead range, run).
+    """
+    taken, key_out = set(), {}
+    blobs, packs, legacy = {}, {}, []
+    for key in hashes:
+        key_out[key] = _out_path(dest_dir, key, taken, key)
+        blobs.setdefault(key, []).append((key_out[key], key if verify_hash else None))
+    for key, (row_id, file_name, algo, content_hash, original_size) in rows.items():
+        out = key_out[key] = _out_path(dest_dir, file_name or str(row_id), taken, row_id)
+        check = (out, content_hash if verify_hash else None)
+        if row_id in locations:
+            path, block_offset, block_length, block_algo, member_offset, member_length = locations[row_id]
+            packs.setdefault((path, block_offset, block_length, block_algo), []).append(
+                (member_offset, member_length, check))
+        elif content_hash and os.path.exists(blob_path(content_hash)):
+            blobs.setdefault(content_hash, []).append(check)
+        else:
+            comp_file = os.path.join(COMPRESSED_DIR, f"{file_name}.{algo}")
+            if not os.path.exists(comp_file):
+                raise FileNotFoundError(f"Compressed file missing: {comp_file}")
+            legacy.append((comp_file, algo, original_size or 0, check))
+
+    jobs = []
+    for content_hash, checks in blobs.items():
+        path = blob_path(content_hash)
+        jobs.append((_disk_order(path), _blob_resident(path), (path, 0, 0), partial(_run_blob, path, checks)))
+    for block, members in packs.items():
+        path, block_offset, block_length, _ = block
+        # Compressed block plus (at least) the decoded bytes up to the last member
+        resident = block_length + max(offset + length for offset, length, _ in members)
+        jobs.append((_disk_order(path, block_offset), resident, (path, block_offset, block_length),
+                     partial(_run_pack, block, members)))
+    for comp_file, algo, original_size, check in legacy:
+        resident = os.path.getsize(comp_file) + original_size
+        jobs.append((_disk_order(comp_file), resident, (comp_file, 0, 0),
+                     partial(_run_legacy, comp_file, algo, check)))
+    jobs.sort(key=lambda job: job[0])
+    return key_out, jobs
+
+
+def get_many(ids, dest_dir, workers=None, memory_cap=GET_MANY_MEMORY, verify_hash=False):
+    """
+    Restore many files (ids, names or content hashes) into `dest_dir`
+    under their catalog file names and return {key: out path}.
+
+    All rows and pack locations are resolved up front in a few queries.
+    Reads are issued in on-disk order (inode, then offset in a pack) with
+    kernel readahead just ahead of the `workers` threads that decompress
+    and write; a pack block is decoded once for all its members. At most
+    about `memory_cap` bytes of decoded data are held at once.
+    """
+    keys = list(dict.fromkeys(ids))
+    backend = get_backend()
+    hashes = [key for key in keys if _is_content_hash(key)]
+    rows = backend.lookup_many([key for key in keys if not _is_content_hash(key)])
+    missing = [key for key in keys if key not in rows and key not in hashes]
+    if missing:
+        raise ValueError(f"No file found with id or name={missing[0]}"
+                         + (f" (and {len(missing) - 1} more)" if len(missing) > 1 else ""))
+    locations = {}
+    if backend.packs:
+        from smartzip_pack import packed_locations
+        with reader(backend.db_file) as conn:
+            locations = packed_locations(conn, [row[0] for row in rows.values()])
+
+    key_out, jobs = _restore_jobs(rows, hashes, locations, dest_dir, verify_hash)
+    for out in key_out.values():
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    for row in rows.values():
+        backend.access.record(row[0])
+
+    workers = workers or os.cpu_count() or 1
+    budget = _MemoryBudget(memory_cap)
+    slots = threading.Semaphore(workers * GET_MANY_IN_FLIGHT)
+
+    def done(resident, _):
+        budget.release(resident)
+        slots.release()
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="smartzip-get") as pool:
+        for _, resident, (path, offset, length), run in jobs:
+            slots.acquire()
+            budget.acquire(resident)
+            _readahead(path, offset, length)
+            future = pool.submit(run)
+            future.add_done_callback(partial(done, resident))
+            futures.append(future)
+    for future in futures:
+        future.result()
+    return key_out
+
+
+def get_fields(file_id, fields):
+    """
+    Values of the named fields (JSON keys or CSV header names) for every
+    line of a file stored with the columnar codec, decoding only those
+    columns: {field: [raw value text or None per line]}.
+    """
+    from smartzip_columnar import read_blob_fields
+    content_hash = file_id if _is_content_hash(file_id) else _lookup(file_id)[3]
+    return read_blob_fields(blob_path(content_hash), fields)
+
+
+def delete(file_id):
+    """
+    Delete catalog rows by id, or every row of a file name. Blob, pack and
+    legacy space is reclaimed by the next smartzip_gc pass. Returns the
+    number of rows deleted.
+    """
+    from smartzip_gc import delete_files
+    backend = get_backend()
+    if not backend.packs:
+        raise ValueError(f"delete() needs the single-file catalog, not the {backend.name} backend")
+    return delete_files([file_id], backend.db_file)
+
+
+def get_range(file_id, offset, length):
+    """
+    `length` bytes of a stored file from `offset`. Encrypted blobs decrypt
+    and decompress only the blocks covering the range; packed and legacy
+    files are restored in full first.
+    """
+    content_hash = file_id if _is_content_hash(file_id) else _lookup(file_id)[3]
+    if content_hash and os.path.exists(blob_path(content_hash)):
+        return read_range(blob_path(content_hash), offset, length)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        out_path = _restore(file_id, os.path.join(tmp_dir, "restored"))
+        with open(out_path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+
+def _is_content_hash(file_id):
+    return isinstance(file_id, str) and len(file_id) == 64 and os.path.exists(blob_path(file_id))
+
 
+def _lookup(file_id):
+    # Allow lookup by numeric id or by file_name
+    row = get_backend().lookup(file_id)
     if not row:
         raise ValueError(f"No file found with id or name={file_id}")
+    return row
+
+
+def _restore(file_id, out_path):
+    # A content hash names the blob directly: no catalog lookup needed
+    if _is_content_hash(file_id):
+        return restore_blob(blob_path(file_id), out_path)
+
+    row_id, file_name, algo, content_hash = _lookup(file_id)
+    backend = get_backend()
+    # Last read time drives cold-tier recompaction (buffered, not a write per get)
+    backend.access.record(row_id)
+
+    # Small files live inside a shared pack block
+    if backend.packs:
+        from smartzip_pack import packed_location, read_packed_member
+        with reader(backend.db_file) as conn:
+            location = packed_location(conn, row_id)
+    else:
+        location = None
+    if location:
+        with open(out_path, "wb") as f:
+            f.write(read_packed_member(location))
+        return out_path
 
-    file_name, algo = row
+    # Framed blob: the header names the codec and carries the checksums
+    if content_hash and os.path.exists(blob_path(content_hash)):
+        return restore_blob(blob_path(content_hash), out_path)
+
+    # Legacy unframed blob keyed by file name
     comp_file = os.path.join(COMPRESSED_DIR, f"{file_name}.{algo}")
     if not os.path.exists(comp_file):
         raise FileNotFoundError(f"Compressed file missing: {comp_file}")
@@ -151,11 +386,7 @@ def get(file_id, out_path):
         compressed_data = f.read()
 
     # Decompress using the appropriate algorithm
-    decompressor = getattr(compressors, f"decompress_{algo}", None)
-    if not decompressor:
-        raise ValueError(f"No decompressor found for algorithm: {algo}")
-
-    data = decompressor(compressed_data)
+    data = compressors.get_codec(algo).decompress(compressed_data)
 
     # Write restored file
     with open(out_path, "wb") as f:
@@ -164,59 +395,148 @@ def get(file_id, out_path):
     return out_path
 
 
-
-
 def file_hash(path):
+    """SHA-256 content identity (slow; integrity checks use the blob checksums)."""
     h = hashlib.sha256()
     with open(path, "rb") as f:
-        while chunk := f.read(8192):
+        while chunk := f.read(1024 * 1024):
             h.update(chunk)
     return h.hexdigest()
 
 # ----------------------------
 # Store File (compress + log)
 # ----------------------------
-def compress_data(data, algo):
-    """Compress data using the specified algorithm from the compressors module."""
-    compressor = getattr(compressors, f"compress_{algo}", None)
-    if not compressor:
-        raise ValueError(f"Compression algorithm '{algo}' not found in compressors module.")
-    return compressor(data)
+def compress_data(data, algo, params=None):
+    """Compress data using the specified algorithm (and codec params) from the codec registry."""
+    # Pre-filters need a blob header to be undone, so bare output skips them
+    params, _ = split_params(params)
+    return compressors.get_codec(algo).compress(data, **params)
+
+
+def encode_params(params):
+    """Canonical JSON for the files.codec_params column."""
+    return json.dumps(params or {}, sort_keys=True)
 
 def log_to_catalog(entry):
-    """Insert file metadata into the files table and return row id."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
-        INSERT INTO files (
-            file_name, file_hash, mime_type, algo,
-            original_size, compressed_size, compression_ratio,
-            entropy, created_at
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        entry["file_name"], entry["file_hash"], entry["mime_type"], entry["algo"],
-        entry["original_size"], entry["compressed_size"], entry["compression_ratio"],
-        entry["entropy"], entry["created_at"]
-    ))
-    row_id = c.lastrowid  # ✅ capture the auto-increment id
-    conn.commit()
-    conn.close()
-    return row_id
-
-
-# build entry dict
+    """Insert file metadata through the catalog backend and return its id."""
+    return get_backend().insert(entry)
+
+
+def compress_file(file_path, file_name=None, tier=None, key_id=None):
+    """
+    Compress one file into a framed, hash-keyed blob and build its catalog
+    entry (without writing it to the DB). Safe to call from worker threads.
+
+    `tier="hot"` picks a line-rate codec (lz4 / zstd-1) and leaves density to
+    the background recompactor; it defaults to the thresholds file's
+    "ingest_tier" (unset = full adaptive choice).
+
+    `key_id` (default: the thresholds file's "encrypt_key") names a master
+    key in the smartzip_crypto keyring and stores the blob encrypted per
+    block; the catalog row stays plaintext and records the key id. Content
+    that is encrypted once stays encrypted for every row sharing its blob.
+
+    When the content already has a blob, the row describes that blob (its
+    codec, params and size) and nothing is compressed again. When it is
+    re-encoded instead, inserting the entry updates the rows sharing it.
+    """
+    file_name = file_name or os.path.basename(file_path)
+    with open(file_path, "rb") as f:
+        data = f.read()
+
+    entropy_val = shannon_entropy(data)
+    mime_type = detect_file_type(file_path)
+    tier = tier or get_thresholds().get("ingest_tier")
+    key_id = key_id or get_thresholds().get("encrypt_key")
+
+    # Blobs are keyed by content hash, so files sharing a name never collide
+    content_hash = hashlib.sha256(data).hexdigest()
+    comp_file = blob_path(content_hash)
+    header = _reusable_header(comp_file, key_id)
+    rewrote = header is None
+    if rewrote:
+        decision = adaptive_decision({"name": file_name, "entropy": entropy_val, "size": len(data),
+                                      "mime_type": mime_type, "tier": tier, "x86": is_x86_executable(data),
+                                      "lines": data.count(b"\n")})
+        header_bytes, payload = compress_blob(data, decision["algo"], decision["params"], key_id=key_id)
+        # An encrypted store replaces a plaintext copy of the same content
+        write_blob(comp_file, header_bytes, payload, replace=True)
+        header = parse_header(header_bytes)
+    algo = header["codec"]
+    compressed_size = header["header_size"] + header["payload_size"]
+    stored_key = encryption_key_id(header)
+    params = dict(header["params"])
+    params.pop("encryption", None)  # wrapped key and block sizes live in the blob header
+
+    # build entry dict
     entry = {
-        "file_name": os.path.basename(file_path),
-        "file_hash": file_hash_val,
+        "file_name": file_name,
+        "file_hash": content_hash,
         "mime_type": mime_type,
         "algo": algo,
         "original_size": len(data),
-        "compressed_size": len(compressed),
-        "compression_ratio": round(len(compressed) / len(data), 4) if len(data) else 0,
+        "compressed_size": compressed_size,
+        "compression_ratio": round(compressed_size / len(data), 4) if len(data) else 0,
         "entropy": entropy_val,
         "created_at": time.time(),
+        "codec_params": encode_params(params),
+        "tier": tier,
+        "key_id": stored_key,
+        # Written to block_blooms (not a files column) by insert_entry
+        "blooms": [] if stored_key else block_blooms(data, entropy_val),
+        # insert_entry brings rows already sharing the blob up to date with it
+        "rewrote_blob": rewrote,
     }
+    return entry, comp_file
+
+
+def _reusable_header(path, key_id):
+    """
+    Header of the blob already stored at `path`, or None when there is none
+    or it must be re-encoded (a plaintext blob stored again with a key). A
+    reused blob's mtime is refreshed so smartzip_gc leaves it alone while
+    its new row is written.
+    """
+    try:
+        with open(path, "rb") as f:
+            header = read_header(f)
+        if header is None or (key_id and not is_encrypted(header)):
+            return None
+        os.utime(path)
+        return header
+    except (FileNotFoundError, BlobFormatError):
+        return None
+
+
+def store(file_path, versioned=False, key_id=None, ttl=None):
+    """
+    Compress and catalog one file. With `versioned`, a file whose name is
+    already in the catalog is stored as a delta of its previous version
+    (see smartzip_versions). `key_id` stores it encrypted (see compress_file).
+    `ttl` (seconds) sets the row's expiry; smartzip_gc deletes expired rows.
+    Plaintext files under smartzip_pack.SMALL_FILE_SIZE are queued to share
+    a pack block instead of getting a blob of their own: their entry gets
+    its "id" (and "pack" path) once the block is written, at the latest on
+    smartzip_pack.flush_small_files() or exit, and the second element is
+    the pack's path or None until then.
+    """
+    if versioned and key_id:
+        raise ValueError("Versioned deltas are not encrypted; store without key_id")
+    backend = get_backend()
+    if versioned:
+        if not backend.packs:
+            raise ValueError(f"Versioned store needs the single-file catalog, not the {backend.name} backend")
+        from smartzip_versions import store_version
+        return store_version(file_path, db_file=backend.db_file, ttl=ttl)
+
+    from smartzip_pack import SMALL_FILE_SIZE, store_small_file
+    key_id = key_id or get_thresholds().get("encrypt_key")
+    if backend.packs and not key_id and os.path.getsize(file_path) < SMALL_FILE_SIZE:
+        return store_small_file(file_path, db_file=backend.db_file, ttl=ttl)
+
+    entry, comp_file = compress_file(file_path, key_id=key_id)
+    if ttl is not None:
+        entry["expires_at"] = entry["created_at"] + ttl
 
     # log to catalog and capture DB id
     entry_id = log_to_catalog(entry)
@@ -225,69 +545,15 @@ def log_to_catalog(entry):
     return entry, comp_file
 
 
-# ----------------------------
-# Get File (decompress)
-# ----------------------------
-def get(file_id, out_path):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT file_name, algo FROM files WHERE id=?", (file_id,))
-    row = c.fetchone()
-    conn.close()
-
-    if not row:
-        raise ValueError(f"No file found with id={file_id}")
-
-    file_name, algo = row
-    comp_file = os.path.join("compressed", f"{file_name}.{algo}")
-    if not os.path.exists(comp_file):
-        raise FileNotFoundError(f"Compressed file missing: {comp_file}")
-
-    with open(comp_file, "rb") as f:
-        compressed_data = f.read()
-
-    decompressor = getattr(compressors, f"decompress_{algo}")
-    data = decompressor(compressed_data)
-
-    with open(out_path, "wb") as f:
-        f.write(data)
-
-    return out_path
-
 # ----------------------------
 # Query Catalog
 # ----------------------------
-def query(filters=None):
-    filters = filters or {}
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-
-    base = """
-    SELECT id, file_name, mime_type, algo,
-           original_size, compressed_size, compression_ratio,
-           entropy, created_at
-    FROM files WHERE 1=1
+def query(filters=None, order_by=None, limit=None):
+    """
+    Catalog rows matching `filters` ({"algo": ..., "mime_type": ...,
+    "entropy<": ..., "ratio<": ..., "key_id": ...}), optionally sorted and limited.
     """
-    params = []
-
-    for key, val in filters.items():
-        if key == "algo":
-            base += " AND algo=?"
-            params.append(val)
-        elif key == "mime_type":
-            base += " AND mime_type=?"
-            params.append(val)
-        elif key == "entropy<":
-            base += " AND entropy < ?"
-            params.append(val)
-        elif key == "ratio<":
-            base += " AND compression_ratio < ?"
-            params.append(val)
-
-    c.execute(base, params)
-    rows = c.fetchall()
-    conn.close()
-    return rows
+    return get_backend().query(filters, order_by=order_by, limit=limit)
 
 # ----------------------------
 # Init DB at import
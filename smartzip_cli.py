@@ -0,0 +1,315 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from smartzip_adaptive import adaptive_decision, shannon_entropy
+from smartzip_blob import check_data, compress_blob, decompress_payload, read_header
+
+# Input is cut into blocks of this size; each becomes one framed blob, so a
+# stream is a concatenation of self-describing frames (like a pack file)
+STREAM_BLOCK_SIZE = 4 * 1024 * 1024
+# Blocks in flight per worker thread; bounds memory to about
+# threads * IN_FLIGHT * block size whatever the stream length
+IN_FLIGHT = 2
+COPY_BUFFER = 1024 * 1024
+
+
+# ----------------------------
+# Streaming Compress / Decompress
+# ----------------------------
+def _blocks(src, block_size):
+    while block := src.read(block_size):
+        yield block
+
+
+def _ordered_map(func, items, threads):
+    """pool.map with at most threads * IN_FLIGHT items pending, results in input order."""
+    if threads <= 1:
+        yield from map(func, items)
+        return
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for item in items:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= threads * IN_FLIGHT:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _block_codec(block, algo, params, key_id):
+    if algo == "auto":
+        # The block itself is the lookahead window the codec is chosen on;
+        # a pipeline leaves no decision rows (or catalog) behind
+        decision = adaptive_decision({"name": "<stream>", "entropy": shannon_entropy(block),
+                                      "size": len(block), "mime_type": "application/octet-stream"},
+                                     log=False)
+        algo, params = decision["algo"], decision["params"]
+    # Parallelism comes from compressing blocks side by side
+    params = {k: v for k, v in params.items() if k != "threads"}
+    return compress_blob(block, algo, params, key_id=key_id)
+
+
+def compress_stream(src, dst, algo="auto", params=None, threads=1,
+                    block_size=STREAM_BLOCK_SIZE, key_id=None):
+    """
+    Compress a byte stream into a sequence of framed blobs. With
+    algo="auto" each block gets its own adaptive decision. Returns
+    (bytes in, bytes out).
+    """
+    size_in = size_out = 0
+
+    def work(block):
+        return len(block), _block_codec(block, algo, params or {}, key_id)
+
+    for n, (header, payload) in _ordered_map(work, _blocks(src, block_size), threads):
+        dst.write(header)
+        dst.write(payload)
+        size_in += n
+        size_out += len(header) + len(payload)
+    return size_in, size_out
+
+
+def _frames(src):
+    while (header := read_header(src)) is not None:
+        yield header, src.read(header["payload_size"])
+
+
+def _decode_frame(frame):
+    header, payload = frame
+    data = decompress_payload(header, payload)
+    check_data(header, data)
+    return header["header_size"] + len(payload), data
+
+
+def decompress_stream(src, dst, threads=1):
+    """Decode a sequence of framed blobs (a stream, a .szb blob or a pack); returns (bytes in, bytes out)."""
+    size_in = size_out = 0
+    for n, data in _ordered_map(_decode_frame, _frames(src), threads):
+        dst.write(data)
+        size_in += n
+        size_out += len(data)
+    return size_in, size_out
+
+
+def _report(verb, size_in, size_out, started):
+    seconds = max(time.perf_counter() - started, 1e-9)
+    ratio = size_out / size_in if size_in else 0
+    print(f"📈 {verb} {size_in / 1e6:.2f} MB → {size_out / 1e6:.2f} MB ({ratio:.3f}) "
+          f"in {seconds:.2f} s, {size_in / seconds / 1e6:.1f} MB/s", file=sys.stderr)
+
+
+def _open_in(path):
+    # stdin is left open for the rest of the process
+    return nullcontext(sys.stdin.buffer) if path == "-" else open(path, "rb")
+
+
+@contextmanager
+def _open_out(path):
+    if path != "-":
+        with open(path, "wb") as f:
+            yield f
+        return
+    # stdout is flushed, not closed: other threads (e.g. the decision
+    # logger) may still write to it
+    try:
+        yield sys.stdout.buffer
+    finally:
+        sys.stdout.buffer.flush()
+
+
+def _codec_params(args):
+    params = {}
+    if args.level is not None:
+        # Each codec names its level knob differently
+        params[{"lzma": "preset", "brotli": "quality"}.get(args.algo, "level")] = args.level
+    return params
+
+
+def cmd_compress(args):
+    started = time.perf_counter()
+    algo = "auto" if args.adaptive or args.algo is None else args.algo
+    if algo == "auto" and args.level is not None:
+        raise SystemExit("smartzip: --level needs a fixed codec (-a)")
+    with _open_in(args.input) as src, _open_out(args.output) as dst:
+        size_in, size_out = compress_stream(src, dst, algo, _codec_params(args), args.threads,
+                                            args.block_size, args.key_id)
+    if args.verbose:
+        _report("compressed", size_in, size_out, started)
+
+
+def cmd_decompress(args):
+    started = time.perf_counter()
+    with _open_in(args.input) as src, _open_out(args.output) as dst:
+        size_in, size_out = decompress_stream(src, dst, args.threads)
+    if args.verbose:
+        _report("decompressed", size_in, size_out, started)
+
+
+# ----------------------------
+# Catalog Commands
+# ----------------------------
+def cmd_store(args):
+    from smartzip_catalog import store
+    from smartzip_pack import flush_small_files
+    stored = [store(path, versioned=args.versioned, key_id=args.key_id, ttl=args.ttl) for path in args.paths]
+    # Small files share pack blocks, written once all of them are queued
+    flush_small_files()
+    for entry, comp_file in stored:
+        print(f"✅ id={entry['id']} {entry['file_name']} {entry['algo']} "
+              f"{entry['original_size']} → {entry['compressed_size']} bytes → {comp_file or entry['pack']}")
+
+
+def cmd_get(args):
+    from smartzip_catalog import get
+    file_id = int(args.id) if args.id.isdigit() else args.id
+    if args.output != "-":
+        get(file_id, args.output, verify_hash=args.verify_hash)
+        return
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        out_path = get(file_id, os.path.join(tmp_dir, "restored"), verify_hash=args.verify_hash)
+        with open(out_path, "rb") as f:
+            shutil.copyfileobj(f, sys.stdout.buffer, COPY_BUFFER)
+
+
+def cmd_get_many(args):
+    from smartzip_catalog import get_many
+    keys = [int(key) if key.isdigit() else key for key in args.ids]
+    restored = get_many(keys, args.dest, workers=args.threads, verify_hash=args.verify_hash)
+    print(f"✅ {len(restored)} files restored to {args.dest}")
+
+
+def cmd_delete(args):
+    from smartzip_catalog import delete
+    deleted = sum(delete(key) for key in args.ids)
+    print(f"🗑️ {deleted} rows deleted (space is reclaimed by smartzip_gc)")
+
+
+def cmd_query(args):
+    from smartzip_backend import QUERY_COLUMNS
+    from smartzip_catalog import query
+    filters = {key: value for key, value in [
+        ("algo", args.algo), ("mime_type", args.mime_type), ("entropy<", args.entropy_lt),
+        ("ratio<", args.ratio_lt), ("key_id", args.key_id)] if value is not None}
+    print("\t".join(QUERY_COLUMNS))
+    for row in query(filters, order_by=args.order_by, limit=args.limit):
+        print("\t".join("" if v is None else str(v) for v in row))
+
+
+def cmd_scan(args):
+    import re
+    from smartzip_scan import scan
+    filters = {key: value for key, value in [
+        ("algo", args.algo), ("mime_type", args.mime_type), ("key_id", args.key_id)] if value is not None}
+    matches = scan(args.pattern, filters, flags=re.IGNORECASE if args.ignore_case else 0, workers=args.threads)
+    for file_id, offset in matches:
+        print(f"{file_id}\t{offset}")
+    return 0 if matches else 1
+
+
+def cmd_verify(args):
+    if args.paths:
+        from smartzip_blob import verify_paths
+        report = verify_paths(args.paths, deep=args.deep, workers=args.threads)
+    else:
+        from smartzip_verify import verify
+        report = verify(deep=args.deep, identity=args.identity, workers=args.threads)
+    for error in report["errors"]:
+        print("❌", error)
+    print(f"{'✅' if not report['errors'] else '⚠️'} {len(report['errors'])} errors")
+    return 1 if report["errors"] else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="smartzip", description="SmartZip adaptive compression")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("compress", help="compress a stream (stdin → stdout by default)")
+    p.add_argument("input", nargs="?", default="-")
+    p.add_argument("-o", "--output", default="-")
+    p.add_argument("-a", "--algo", help="codec name (default: adaptive per block)")
+    p.add_argument("--adaptive", action="store_true", help="pick the codec per block (default)")
+    p.add_argument("-l", "--level", type=int, help="codec level / preset / quality")
+    p.add_argument("-B", "--block-size", type=int, default=STREAM_BLOCK_SIZE)
+    p.add_argument("--key-id", help="encrypt with this master key (see smartzip_crypto)")
+    p.set_defaults(func=cmd_compress)
+
+    p = sub.add_parser("decompress", help="decompress a stream, blob or pack (stdin → stdout by default)")
+    p.add_argument("input", nargs="?", default="-")
+    p.add_argument("-o", "--output", default="-")
+    p.set_defaults(func=cmd_decompress)
+
+    for p in (sub.choices["compress"], sub.choices["decompress"]):
+        p.add_argument("-T", "--threads", type=int, default=1, help="blocks processed in parallel")
+        p.add_argument("-v", "--verbose", action="store_true", help="report throughput on stderr")
+
+    p = sub.add_parser("store", help="compress files into the catalog")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--versioned", action="store_true")
+    p.add_argument("--key-id")
+    p.add_argument("--ttl", type=float, help="seconds until the row expires")
+    p.set_defaults(func=cmd_store)
+
+    p = sub.add_parser("get", help="restore a file by id, name or content hash")
+    p.add_argument("id")
+    p.add_argument("-o", "--output", default="-")
+    p.add_argument("--verify-hash", action="store_true")
+    p.set_defaults(func=cmd_get)
+
+    p = sub.add_parser("get-many", help="restore many files into a directory in one batch")
+    p.add_argument("ids", nargs="+")
+    p.add_argument("-d", "--dest", required=True)
+    p.add_argument("-T", "--threads", type=int)
+    p.add_argument("--verify-hash", action="store_true")
+    p.set_defaults(func=cmd_get_many)
+
+    p = sub.add_parser("delete", help="delete catalog rows by id or file name")
+    p.add_argument("ids", nargs="+")
+    p.set_defaults(func=cmd_delete)
+
+    p = sub.add_parser("query", help="list catalog rows (tab-separated)")
+    p.add_argument("--algo")
+    p.add_argument("--mime-type")
+    p.add_argument("--entropy-lt", type=float)
+    p.add_argument("--ratio-lt", type=float)
+    p.add_argument("--key-id")
+    p.add_argument("--order-by")
+    p.add_argument("--limit", type=int)
+    p.set_defaults(func=cmd_query)
+
+    p = sub.add_parser("scan", help="regex-search stored files; prints file id and match offset")
+    p.add_argument("pattern")
+    p.add_argument("-i", "--ignore-case", action="store_true")
+    p.add_argument("--algo")
+    p.add_argument("--mime-type")
+    p.add_argument("--key-id")
+    p.add_argument("-T", "--threads", type=int)
+    p.set_defaults(func=cmd_scan)
+
+    p = sub.add_parser("verify", help="check blob checksums (catalog blobs, or the given files)")
+    p.add_argument("paths", nargs="*")
+    p.add_argument("--deep", action="store_true")
+    p.add_argument("--identity", action="store_true")
+    p.add_argument("-T", "--threads", type=int)
+    p.set_defaults(func=cmd_verify)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args) or 0
+    except BrokenPipeError:
+        # Downstream closed the pipe (e.g. `| head`): not an error
+        sys.stderr.close()
+        return 0
+
+
+if __name__ == "__main__":
+    # python smartzip_cli.py compress|decompress|store|get|get-many|delete|query|scan|verify ...
+    sys.exit(main())
@@ -0,0 +1,357 @@
+import json
+import re
+import struct
+import sys
+
+# ----------------------------
+# Columnar Codec
+# ----------------------------
+# Line-oriented records (NDJSON logs, CSV) are split into a per-line
+# skeleton (keys, quotes, delimiters, whitespace) and the values in it.
+# Lines with the same skeleton form a shape; each (shape, slot) becomes a
+# column stream encoded by kind and compressed with the codec that suits
+# it. Every byte outside a value stays in the skeleton, so decoding
+# rebuilds the input exactly, whatever its formatting.
+#
+# Container: MAGIC, mode byte, u32 directory length, zstd-compressed JSON
+# directory, then the compressed streams back to back.
+MAGIC = b"SZCL"
+MODE_RAW, MODE_LINES = 0, 1
+SLOT = "\x00"
+
+FORMATS = ("ndjson", "csv")
+
+# Give up (store the input whole) when lines rarely share a shape, when
+# there are too few lines to form columns (a single-line JSON array), or
+# when values don't line up into columns (more columns than lines)
+MAX_SHAPES = 4096
+MAX_SHAPE_RATIO = 0.05
+MIN_LINES = 256
+MAX_LINE_LENGTH = 4096   # mean bytes per line
+MAX_SLOTS = 1024         # values per shape
+
+# JSON values: strings, numbers and literals; a string followed by ":" is a key
+JSON_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null')
+JSON_KEY_AFTER = re.compile(r"\s*:")
+# CSV fields: quoted (with "" escapes) or bare, separated by commas
+CSV_LINE = re.compile(r'(?:"(?:[^"]|"")*"|[^,"]*)(?:,(?:"(?:[^"]|"")*"|[^,"]*))*')
+CSV_FIELD = re.compile(r'"(?:[^"]|"")*"|[^,"]*')
+# Integers whose text int() reproduces exactly (no leading zeros, no "-0")
+INT_TEXT = re.compile(r"-?[1-9][0-9]*|0")
+
+# kind -> (codec, params) for the column streams
+COLUMN_CODECS = {
+    "shape": ("zstd", {"level": 19}),
+    "int": ("lzma", {"preset": 9}),
+    "dict": ("zstd", {"level": 19}),
+    "text": ("zstd", {"level": 19}),
+}
+# Text columns also try brotli on a sample and keep whichever is smaller
+TEXT_SAMPLE = 64 * 1024
+RAW_CODEC = ("zstd", {"level": 19})
+
+
+def _split_json(line):
+    """(skeleton, values) with every JSON value replaced by SLOT."""
+    parts, values, pos = [], [], 0
+    for m in JSON_TOKEN.finditer(line):
+        if m.group().startswith('"') and JSON_KEY_AFTER.match(line, m.end()):
+            continue
+        parts.append(line[pos:m.start()])
+        values.append(m.group())
+        pos = m.end()
+    parts.append(line[pos:])
+    return SLOT.join(parts), values
+
+
+def _split_csv(line):
+    if not CSV_LINE.fullmatch(line):
+        return SLOT, [line]   # e.g. a quoted field spanning lines: keep it whole
+    values = _csv_fields(line)
+    return ",".join([SLOT] * len(values)), values
+
+
+def _csv_fields(line):
+    fields, pos = [], 0
+    while True:
+        m = CSV_FIELD.match(line, pos)
+        fields.append(m.group())
+        pos = m.end()
+        if pos >= len(line):
+            return fields
+        pos += 1  # the comma
+
+
+SPLITTERS = {"ndjson": _split_json, "csv": _split_csv}
+
+
+# ----------------------------
+# Varints
+# ----------------------------
+def _put_varint(out, n):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _iter_varints(buf):
+    n = shift = 0
+    for b in buf:
+        n |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+        else:
+            yield n
+            n = shift = 0
+
+
+# ----------------------------
+# Column Encodings
+# ----------------------------
+def _encode_column(values):
+    """(kind, raw stream, extra directory fields) for one column of strings."""
+    if all(INT_TEXT.fullmatch(v) for v in values):
+        # Delta + zigzag varints: sorted ids and timestamps shrink to a byte or two
+        out, prev = bytearray(), 0
+        for v in values:
+            n = int(v)
+            d, prev = n - prev, n
+            _put_varint(out, d * 2 if d >= 0 else -d * 2 - 1)
+        return "int", bytes(out), {}
+    distinct = {}
+    for v in values:
+        if v not in distinct:
+            distinct[v] = len(distinct)
+            if len(distinct) > max(256, len(values) // 4):
+                break
+    else:
+        width = 1 if len(distinct) <= 0x100 else 2 if len(distinct) <= 0x10000 else 4
+        index = struct.pack(f"<{len(values)}{'BHI'[width.bit_length() - 1]}", *(distinct[v] for v in values))
+        words = "\n".join(distinct).encode()
+        return "dict", words + index, {"words": len(words), "width": width, "size": len(distinct)}
+    return "text", "\n".join(values).encode(), {}
+
+
+def _decode_column(kind, raw, count, meta):
+    if kind == "int":
+        values, prev = [], 0
+        for z in _iter_varints(raw):
+            prev += -((z + 1) >> 1) if z & 1 else z >> 1
+            values.append(str(prev))
+        return values
+    if kind == "dict":
+        words = raw[:meta["words"]].decode().split("\n") if meta["size"] else []
+        code = "BHI"[meta["width"].bit_length() - 1]
+        return [words[i] for i in struct.unpack(f"<{count}{code}", raw[meta["words"]:])]
+    return raw.decode().split("\n") if count else []
+
+
+def _compress_stream(kind, raw):
+    import compressors
+    algo, params = COLUMN_CODECS[kind]
+    if kind == "text" and len(raw) > 256:
+        sample = raw[:TEXT_SAMPLE]
+        if len(compressors.compress_brotli(sample, quality=9)) < len(compressors.get_codec(algo).compress(sample, **params)):
+            algo, params = "brotli", {"quality": 9}
+    return algo, compressors.get_codec(algo).compress(raw, **params)
+
+
+def _decompress_stream(algo, payload):
+    import compressors
+    return compressors.get_codec(algo).decompress(payload)
+
+
+# ----------------------------
+# Container
+# ----------------------------
+def _shred(text, fmt):
+    """Skeletons, per-line shape ids and {(shape, slot): values}, or None if shapes don't repeat."""
+    split = SPLITTERS[fmt]
+    shapes, shape_ids, columns = {}, [], {}
+    lines = text.split("\n")
+    limit = min(MAX_SHAPES, max(16, int(len(lines) * MAX_SHAPE_RATIO)))
+    for line in lines:
+        skeleton, values = split(line)
+        shape = shapes.get(skeleton)
+        if shape is None:
+            if len(shapes) >= limit or len(values) > MAX_SLOTS:
+                return None
+            shape = shapes[skeleton] = len(shapes)
+        shape_ids.append(shape)
+        for slot, v in enumerate(values):
+            columns.setdefault((shape, slot), []).append(v)
+    if len(columns) > len(lines):
+        return None
+    return list(shapes), shape_ids, columns
+
+
+def _column_names(skeletons, fmt, first_line_values):
+    """Field name per (shape, slot): the JSON key before the slot, or the CSV header."""
+    names = {}
+    for shape, skeleton in enumerate(skeletons):
+        parts = skeleton.split(SLOT)
+        for slot in range(len(parts) - 1):
+            if fmt == "csv":
+                if first_line_values and slot < len(first_line_values):
+                    names[(shape, slot)] = first_line_values[slot].strip('"')
+            else:
+                keys = re.findall(r'"((?:[^"\\]|\\.)*)"\s*:\s*$', parts[slot])
+                if keys:
+                    names[(shape, slot)] = keys[-1]
+    return names
+
+
+def _raw_container(data):
+    import compressors
+    algo, params = RAW_CODEC
+    return MAGIC + bytes([MODE_RAW]) + compressors.get_codec(algo).compress(data, **params)
+
+
+def compress_columnar(data, format="ndjson"):
+    """
+    Columnar container for NDJSON (`format="ndjson"`, also pretty JSON) or
+    CSV text. Input that is not UTF-8 or whose lines don't repeat a shape is
+    stored whole with zstd-19, so any bytes round-trip.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown columnar format {format!r}; choose from {FORMATS}")
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        return _raw_container(data)
+    lines = text.count("\n") + 1
+    if SLOT in text or lines < MIN_LINES or len(data) > lines * MAX_LINE_LENGTH:
+        return _raw_container(data)
+    shredded = _shred(text, format)
+    if shredded is None:
+        return _raw_container(data)
+    skeletons, shape_ids, columns = shredded
+
+    import compressors
+    # Not worth it unless it beats plain (default-level) zstd: stop as soon
+    # as the streams so far already don't
+    budget = len(compressors.compress_zstd(data))
+
+    names = _column_names(skeletons, format, SPLITTERS[format](text.split("\n", 1)[0])[1])
+    streams, directory = [], {"format": format, "lines": len(shape_ids), "skeletons": skeletons, "columns": []}
+
+    shape_raw = struct.pack(f"<{len(shape_ids)}H", *shape_ids)
+    algo, payload = _compress_stream("shape", shape_raw)
+    directory["shape"] = {"codec": algo, "length": len(payload)}
+    streams.append(payload)
+    total = len(payload)
+
+    for (shape, slot), values in columns.items():
+        kind, raw, meta = _encode_column(values)
+        algo, payload = _compress_stream(kind, raw)
+        directory["columns"].append({"shape": shape, "slot": slot, "name": names.get((shape, slot)),
+                                     "kind": kind, "count": len(values), "codec": algo,
+                                     "length": len(payload), **meta})
+        streams.append(payload)
+        total += len(payload)
+        if total >= budget:
+            return _raw_container(data)
+
+    dir_bytes = compressors.compress_zstd(json.dumps(directory, separators=(",", ":")).encode(), level=19)
+    container = b"".join([MAGIC, bytes([MODE_LINES]), struct.pack("<I", len(dir_bytes)), dir_bytes, *streams])
+    # Never lossy
+    if len(container) >= budget or decompress_columnar(container) != data:
+        return _raw_container(data)
+    return container
+
+
+def _open(container):
+    if container[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a columnar container")
+    mode = container[len(MAGIC)]
+    if mode == MODE_RAW:
+        return None, None
+    pos = len(MAGIC) + 1
+    (dir_len,) = struct.unpack_from("<I", container, pos)
+    pos += 4
+    directory = json.loads(_decompress_stream("zstd", container[pos:pos + dir_len]))
+    pos += dir_len
+    offsets = []
+    for entry in [directory["shape"]] + directory["columns"]:
+        offsets.append((pos, pos + entry["length"]))
+        pos += entry["length"]
+    return directory, offsets
+
+
+def _shape_ids(container, directory, offsets):
+    start, end = offsets[0]
+    raw = _decompress_stream(directory["shape"]["codec"], container[start:end])
+    return struct.unpack(f"<{directory['lines']}H", raw)
+
+
+def _column_values(container, column, span):
+    raw = _decompress_stream(column["codec"], container[span[0]:span[1]])
+    return _decode_column(column["kind"], raw, column["count"], column)
+
+
+def decompress_columnar(container):
+    directory, offsets = _open(container)
+    if directory is None:
+        return _decompress_stream(RAW_CODEC[0], container[len(MAGIC) + 1:])
+    shape_parts = [s.split(SLOT) for s in directory["skeletons"]]
+    slots = {}
+    for column, span in zip(directory["columns"], offsets[1:]):
+        slots[(column["shape"], column["slot"])] = iter(_column_values(container, column, span))
+
+    lines = []
+    for shape in _shape_ids(container, directory, offsets):
+        parts = shape_parts[shape]
+        pieces = [parts[0]]
+        for slot in range(1, len(parts)):
+            pieces.append(next(slots[(shape, slot - 1)]))
+            pieces.append(parts[slot])
+        lines.append("".join(pieces))
+    return "\n".join(lines).encode("utf-8")
+
+
+def read_fields(container, fields):
+    """
+    {field: [raw value text or None per line]} decoding only the named
+    columns (plus the shape stream), not the whole container.
+    """
+    directory, offsets = _open(container)
+    if directory is None:
+        raise ValueError("container holds unshredded data; decode it whole")
+    shape_ids = _shape_ids(container, directory, offsets)
+    result = {}
+    for field in fields:
+        by_shape = {}
+        for column, span in zip(directory["columns"], offsets[1:]):
+            if column["name"] == field and column["shape"] not in by_shape:
+                by_shape[column["shape"]] = iter(_column_values(container, column, span))
+        # Each shape's slots are consumed in line order
+        result[field] = [next(by_shape[s]) if s in by_shape else None for s in shape_ids]
+    return result
+
+
+def read_blob_fields(path, fields):
+    """read_fields() on a framed blob file stored with the columnar codec."""
+    from smartzip_blob import check_payload, parse_header
+    with open(path, "rb") as f:
+        buf = f.read()
+    header = parse_header(buf)
+    if header["codec"] != "columnar":
+        raise ValueError(f"{path} is stored with {header['codec']}, not columnar")
+    payload = buf[header["header_size"]:header["header_size"] + header["payload_size"]]
+    check_payload(header, payload)
+    return read_fields(payload, fields)
+
+
+if __name__ == "__main__":
+    # python smartzip_columnar.py <file> [ndjson|csv] → size comparison and round-trip check
+    import compressors
+    path = sys.argv[1]
+    fmt = sys.argv[2] if len(sys.argv) > 2 else ("csv" if path.endswith(".csv") else "ndjson")
+    with open(path, "rb") as f:
+        data = f.read()
+    packed = compress_columnar(data, fmt)
+    assert decompress_columnar(packed) == data
+    print(f"✅ {path}: {len(data)} bytes → columnar {len(packed)}, "
+          f"zstd-19 {len(compressors.compress_zstd(data, level=19))}, "
+          f"mode {'raw' if packed[len(MAGIC)] == MODE_RAW else 'columns'}")
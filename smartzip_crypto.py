@@ -0,0 +1,226 @@
+import base64
+import hashlib
+import json
+import os
+import struct
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+except ImportError:  # optional: privacy mode (encrypted blobs)
+    AESGCM = ChaCha20Poly1305 = None
+
+# Master keys (key-encryption keys) by id: {"active": id, "keys": {id: base64}}
+KEYRING_FILE = "smartzip_keys.json"
+KEYRING_ENV = "SMARTZIP_KEYRING"
+DEFAULT_ALG = "aes-256-gcm"
+NONCE_SIZE = 12
+KEY_SIZE = 32
+# Unwrapped data keys kept in memory (most recently used)
+DATA_KEY_CACHE_SIZE = 256
+
+
+def _ciphers():
+    if AESGCM is None:
+        raise RuntimeError("Encrypted blobs need the 'cryptography' package")
+    return {"aes-256-gcm": AESGCM, "chacha20-poly1305": ChaCha20Poly1305}
+
+
+def _aead(alg, key):
+    ciphers = _ciphers()
+    if alg not in ciphers:
+        raise ValueError(f"Unknown AEAD algorithm {alg!r}")
+    return ciphers[alg](key)
+
+
+# ----------------------------
+# Keyring
+# ----------------------------
+# Keys live outside the catalog and the blob store: the catalog only holds
+# key ids, each blob header a data key wrapped by one of these.
+_keyring_lock = threading.Lock()
+
+
+def keyring_file():
+    return os.environ.get(KEYRING_ENV, KEYRING_FILE)
+
+
+def load_keyring(file=None):
+    file = file or keyring_file()
+    if not os.path.exists(file):
+        return {"active": None, "keys": {}}
+    with open(file) as f:
+        return json.load(f)
+
+
+def create_key(key_id=None, activate=True, file=None):
+    """Generate a master key, save it to the keyring (mode 0600) and return its id."""
+    file = file or keyring_file()
+    with _keyring_lock:
+        keyring = load_keyring(file)
+        key_id = key_id or f"k{len(keyring['keys']) + 1}"
+        if key_id in keyring["keys"]:
+            raise ValueError(f"Key {key_id} already exists")
+        keyring["keys"][key_id] = base64.b64encode(os.urandom(KEY_SIZE)).decode()
+        if activate or not keyring["active"]:
+            keyring["active"] = key_id
+        tmp_file = f"{file}.tmp"
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(keyring, f, indent=2)
+        os.replace(tmp_file, file)
+    if activate:
+        clear_data_keys()  # rotation: keys unwrapped so far leave memory
+    return key_id
+
+
+def active_key_id(file=None):
+    return load_keyring(file)["active"]
+
+
+def master_key(key_id, file=None):
+    key = load_keyring(file)["keys"].get(key_id)
+    if key is None:
+        raise KeyError(f"Master key {key_id!r} is not in the keyring")
+    return base64.b64decode(key)
+
+
+# ----------------------------
+# Envelopes
+# ----------------------------
+# Every encrypted blob gets its own random data key, stored in its header
+# wrapped (AES-GCM) by the master key named "kek". Unwrapped keys are
+# cached (LRU, DATA_KEY_CACHE_SIZE entries) and dropped on key rotation.
+_data_keys = OrderedDict()
+_data_keys_lock = threading.Lock()
+
+
+def _cache_data_key(wrapped, dek):
+    with _data_keys_lock:
+        _data_keys[wrapped] = dek
+        _data_keys.move_to_end(wrapped)
+        while len(_data_keys) > DATA_KEY_CACHE_SIZE:
+            _data_keys.popitem(last=False)
+
+
+def _cached_data_key(wrapped):
+    with _data_keys_lock:
+        dek = _data_keys.get(wrapped)
+        if dek is not None:
+            _data_keys.move_to_end(wrapped)
+        return dek
+
+
+def clear_data_keys():
+    """Forget every unwrapped data key."""
+    with _data_keys_lock:
+        _data_keys.clear()
+
+
+def _wrap_aad(key_id, alg):
+    return f"smartzip-dek:{key_id}:{alg}".encode()
+
+
+def new_envelope(key_id, alg=DEFAULT_ALG):
+    """Envelope (for the blob header) around a fresh data key wrapped by master key `key_id`."""
+    _aead(alg, bytes(KEY_SIZE))  # fail early on a missing package or bad alg
+    dek = os.urandom(KEY_SIZE)
+    nonce = os.urandom(NONCE_SIZE)
+    wrapped = base64.b64encode(nonce + AESGCM(master_key(key_id)).encrypt(nonce, dek, _wrap_aad(key_id, alg))).decode()
+    _cache_data_key(wrapped, dek)
+    return {"alg": alg, "kek": key_id, "dek": wrapped}
+
+
+def open_envelope(envelope):
+    """Unwrap an envelope's data key (cached per wrapped key)."""
+    dek = _cached_data_key(envelope["dek"])
+    if dek is None:
+        _ciphers()
+        wrapped = base64.b64decode(envelope["dek"])
+        dek = AESGCM(master_key(envelope["kek"])).decrypt(
+            wrapped[:NONCE_SIZE], wrapped[NONCE_SIZE:], _wrap_aad(envelope["kek"], envelope["alg"]))
+        _cache_data_key(envelope["dek"], dek)
+    return dek
+
+
+def keyed_digest(envelope, size):
+    """
+    Digest function (BLAKE2b, `size` bytes) keyed by a subkey of the
+    envelope's data key, for the original-data blocks of its blob.
+    """
+    key = hashlib.blake2b(open_envelope(envelope), digest_size=32, person=b"smartzip-digest").digest()
+    return lambda buf: hashlib.blake2b(buf, key=key, digest_size=size).digest()
+
+
+# ----------------------------
+# Sealed Blocks
+# ----------------------------
+# Each block is nonce || AEAD(block) with its index and a last-block flag as
+# associated data, so blocks cannot be reordered, dropped or truncated
+# without failing authentication.
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def worker_pool():
+    """Process-wide pool shared by every encrypting / decrypting caller."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1,
+                                           thread_name_prefix="smartzip-aead")
+    return _pool
+
+
+def _aad(index, last):
+    return struct.pack(">Q?", index, last)
+
+
+def seal_blocks(blocks, envelope, transform=None):
+    """
+    Transform (e.g. compress) and encrypt every block on the worker pool;
+    returns the sealed blocks in order. AES-GCM / ChaCha20 and the codecs
+    release the GIL, so blocks proceed in parallel.
+    """
+    aead = _aead(envelope["alg"], open_envelope(envelope))
+    count = len(blocks)
+
+    def seal(item):
+        index, block = item
+        nonce = os.urandom(NONCE_SIZE)
+        plain = transform(block) if transform else block
+        return nonce + aead.encrypt(nonce, plain, _aad(index, index == count - 1))
+
+    return list(worker_pool().map(seal, enumerate(blocks)))
+
+
+def open_blocks(envelope, sealed, indices, count, transform=None):
+    """
+    Decrypt (and transform, e.g. decompress) the sealed blocks at `indices`
+    of a `count`-block payload on the worker pool, in order.
+    """
+    aead = _aead(envelope["alg"], open_envelope(envelope))
+
+    def open_one(item):
+        index, block = item
+        plain = aead.decrypt(block[:NONCE_SIZE], block[NONCE_SIZE:], _aad(index, index == count - 1))
+        return transform(plain) if transform else plain
+
+    return list(worker_pool().map(open_one, zip(indices, sealed)))
+
+
+if __name__ == "__main__":
+    # python smartzip_crypto.py new-key [key_id]   |   python smartzip_crypto.py keys
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "new-key":
+        print(f"🔑 Created master key {create_key(*sys.argv[2:3])} in {keyring_file()}")
+    elif command == "keys":
+        keyring = load_keyring()
+        for key_id in keyring["keys"]:
+            print(f"{'*' if key_id == keyring['active'] else ' '} {key_id}")
+    else:
+        print("Usage: python smartzip_crypto.py new-key [key_id] | keys")
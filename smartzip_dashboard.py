@@ -3,10 +3,12 @@ import pandas as pd
 import json
 import os
 import time
-import sqlite3
 import statistics
 import matplotlib.pyplot as plt
-from smartzip_catalog import DB_FILE
+from catalog_stats import catalog_summary, histogram, files_page, FILE_COLUMNS
+from smartzip_parquet import PARQUET_DIR, anomaly_summary
+from smartzip_anomaly import load_state, recent_events, current_warnings
+from smartzip_pool import reader
 import subprocess
 import sys
 from datetime import datetime
@@ -44,6 +46,23 @@ def check_anomalies(catalog_df, entropy_slope_limit=1.0, size_slope_limit=5_000_
     return warnings
 
 
+def check_anomaly_summary(summary, size_slope_limit=5_000_000):
+    """check_anomalies() over smartzip_parquet.anomaly_summary() figures instead of rows."""
+    if summary["rows"] < 2:
+        return ["Not enough data for anomaly detection."]
+    warnings = []
+    if summary["min_ratio"] is not None and summary["min_ratio"] < 0.1:
+        warnings.append("⚠️ Very low compression ratios detected (<0.1).")
+    mean, std = summary["entropy_mean"], summary["entropy_std"]
+    if std is not None and (summary["entropy_min"] < mean - 2*std or summary["entropy_max"] > mean + 2*std):
+        warnings.append("⚠️ Entropy drift detected (outliers).")
+    if summary["algo_flips"] > summary["rows"] // 3:
+        warnings.append("⚠️ Algorithm switching too often (unstable).")
+    if summary["max_size_step"] is not None and summary["max_size_step"] > size_slope_limit:
+        warnings.append("⚠️ Sudden file size growth detected.")
+    return warnings
+
+
 # ----------------------------
 # Threshold Recalibration
 # ----------------------------
@@ -51,7 +70,7 @@ def auto_recalibrate_from_log(log_file="smartzip/adaptive_log.jsonl", threshold_
     """
     Recalibrate Smartzip thresholds (entropy, size) based on historical log data or DB fallback.
     """
-    import json, os, sqlite3, statistics
+    import json, os
 
     # --- 1. Try log file ---
     logs = []
@@ -66,13 +85,10 @@ def auto_recalibrate_from_log(log_file="smartzip/adaptive_log.jsonl", threshold_
     # --- 2. Fallback to catalog DB if no logs ---
     if not logs:
         try:
-            conn = sqlite3.connect("smartzip_catalog.db")
-            c = conn.cursor()
-            c.execute("SELECT entropy, original_size FROM files WHERE entropy IS NOT NULL LIMIT ?", (window,))
-            rows = c.fetchall()
+            with reader("smartzip_catalog.db") as conn:
+                rows = conn.execute("SELECT entropy, original_size FROM files WHERE entropy IS NOT NULL LIMIT ?", (window,)).fetchall()
             for r in rows:
                 logs.append({"entropy": r[0], "size": r[1]})
-            conn.close()
         except Exception as e:
             print("⚠️ DB fallback failed:", e)
 
@@ -88,9 +104,6 @@ def auto_recalibrate_from_log(log_file="smartzip/adaptive_log.jsonl", threshold_
         print("⚠️ Missing entropy/size data in logs.")
         return None
 
-    candidate_entropy = statistics.median(entropies)
-    candidate_size = statistics.median(sizes)
-
     # --- 4. Load old thresholds ---
     thresholds = {"entropy_threshold": 3.5, "size_threshold": 5_000_000}
     if os.path.exists(threshold_file):
@@ -100,12 +113,9 @@ def auto_recalibrate_from_log(log_file="smartzip/adaptive_log.jsonl", threshold_
         except Exception:
             pass
 
-    # --- 5. Smooth update ---
-    new_entropy = thresholds["entropy_threshold"] * 0.7 + candidate_entropy * 0.3
-    new_size = thresholds["size_threshold"] * 0.7 + candidate_size * 0.3
-
-    thresholds["entropy_threshold"] = round(new_entropy, 3)
-    thresholds["size_threshold"] = int(new_size)
+    # --- 5. Smooth update (toward the medians, see smartzip_replay to compare weights) ---
+    from smartzip_adaptive import smooth_thresholds
+    thresholds = smooth_thresholds(thresholds, entropies, sizes)
 
     # --- 6. Save back ---
     with open(threshold_file, "w", encoding="utf-8") as f:
@@ -179,9 +189,14 @@ def threshold_dashboard():
         st.success("Thresholds saved successfully!")
 
 
-import os
+def load_recent_files(conn, limit=1000):
+    """Most recent catalog rows (oldest first), for window-based anomaly checks."""
+    rows = files_page(conn, page_size=limit)
+    df = pd.DataFrame(rows[::-1], columns=FILE_COLUMNS)
+    return df.rename(columns={"algo": "algorithm"})
+
 
-def health_dashboard():
+def health_dashboard(page_size=100, anomaly_window=1000):
     st.title("📦 Smartzip Dashboard")
     st.header("Smartzip Health Dashboard")
     st.write("System health and anomaly detection.")
@@ -190,47 +205,85 @@ def health_dashboard():
     db_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "smartzip_catalog.db"))
     st.write(f"📂 Using database at: {db_path}")
 
+    # Aggregates come from grouped SQL / summary tables, never a full table load
     try:
-        conn = sqlite3.connect(db_path, check_same_thread=False)
-        df = pd.read_sql_query("SELECT * FROM files", conn)
-        df = df.rename(columns={"algo": "algorithm"})
-        conn.close()
+        with reader(db_path) as conn:
+            summary = catalog_summary(conn)
+            entropy_hist = histogram(conn, "entropy")
+            ratio_hist = histogram(conn, "ratio")
+            anomaly_state = load_state(conn)
+            events = recent_events(conn)
+            recent_df = load_recent_files(conn, anomaly_window) if not anomaly_state else None
     except Exception as e:
         st.error(f"Failed to load catalog: {e}")
         return
 
-    if df.empty:
-        st.warning("No data in catalog yet.")
-        return
-
-    st.write("### Catalog Data")
-    st.dataframe(df)
-
-
-
-    if df.empty:
+    if summary["total_rows"] == 0:
         st.warning("No data in catalog yet.")
         return
 
-    # Show raw table
-    st.write("### Catalog Data")
-    st.dataframe(df)
-
-    # Check anomalies
-    warnings = check_anomalies(df)
+    st.write("### Catalog Summary")
+    cols = st.columns(4)
+    cols[0].metric("Files", summary["total_rows"])
+    cols[1].metric("Avg entropy", fmt(summary["avg_entropy"]))
+    cols[2].metric("Min entropy", fmt(summary["min_entropy"]))
+    cols[3].metric("Max entropy", fmt(summary["max_entropy"]))
+    st.dataframe(pd.DataFrame(summary["algos"]))
+
+    # Anomalies: online detector state (O(1)), else a window / Parquet scan
+    if anomaly_state:
+        warnings, scope = current_warnings(anomaly_state), f"online detector, {anomaly_state['count']} files"
+    else:
+        warnings, scope = None, "Parquet mirror"
+        if os.path.isdir(PARQUET_DIR) and st.checkbox("Analyze full history from Parquet mirror"):
+            try:
+                warnings = check_anomaly_summary(anomaly_summary())
+            except Exception as e:
+                st.warning(f"Parquet mirror unavailable: {e}")
+        if warnings is None:
+            warnings, scope = check_anomalies(recent_df), f"last {len(recent_df)} files"
     if warnings:
-        st.error("Anomalies detected:")
+        st.error(f"Anomalies detected ({scope}):")
         for w in warnings:
             st.write("- " + w)
     else:
         st.success("✅ No anomalies detected.")
+    if events:
+        st.write("### Recent Alerts")
+        st.dataframe(pd.DataFrame(events, columns=["id", "timestamp", "kind", "message", "file_id", "value"]))
 
     # Basic plots
     st.write("### Entropy Distribution")
-    st.bar_chart(df["entropy"])
+    st.bar_chart(pd.DataFrame(entropy_hist, columns=["entropy", "files"]).set_index("entropy"))
 
     st.write("### Compression Ratios")
-    st.bar_chart(df["compression_ratio"])
+    st.bar_chart(pd.DataFrame(ratio_hist, columns=["compression_ratio", "files"]).set_index("compression_ratio"))
+
+    # Paginated drill-down
+    st.write("### Catalog Data")
+    algo_options = ["(all)"] + [a["algo"] for a in summary["algos"]]
+    algo_choice = st.selectbox("Algorithm", algo_options)
+    algo_filter = None if algo_choice == "(all)" else algo_choice
+    total = summary["total_rows"] if algo_filter is None else next(
+        a["files"] for a in summary["algos"] if a["algo"] == algo_filter)
+    pages = max(1, (total + page_size - 1) // page_size)
+    # Keyset cursors: the last id of every page before the current one
+    if st.session_state.get("files_algo") != algo_filter:
+        st.session_state["files_algo"] = algo_filter
+        st.session_state["files_cursors"] = []
+    cursors = st.session_state.setdefault("files_cursors", [])
+    before_id = cursors[-1] if cursors else None
+    with reader(db_path) as conn:
+        rows = files_page(conn, before_id=before_id, page_size=page_size, algo=algo_filter)
+    prev_col, next_col = st.columns(2)
+    if prev_col.button("⬅️ Newer", disabled=not cursors):
+        cursors.pop()
+        st.rerun()
+    if next_col.button("Older ➡️", disabled=len(rows) < page_size):
+        cursors.append(rows[-1][0])
+        st.rerun()
+    st.caption(f"Page {len(cursors) + 1} of {pages} ({total} rows)")
+    st.dataframe(pd.DataFrame(rows, columns=FILE_COLUMNS))
 
 
 # ----------------------------
@@ -0,0 +1,216 @@
+import atexit
+import threading
+import time
+from collections import deque
+from smartzip_pool import writer
+
+DB_FILE = "smartzip_catalog.db"
+
+
+# ----------------------------
+# Decisions Table
+# ----------------------------
+def decision_row(file_name, decision):
+    return (
+        file_name,
+        decision.get("algo") or decision.get("algorithm"),
+        decision.get("file_entropy"),
+        decision.get("file_size"),
+        decision.get("entropy_threshold"),
+        decision.get("size_threshold"),
+        decision.get("timestamp"),
+    )
+
+
+INSERT_DECISION_SQL = """
+    INSERT INTO decisions (file_name, algo, entropy, size, entropy_threshold, size_threshold, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def write_decisions(rows, db_file=DB_FILE):
+    """Insert a batch of decision rows in a single transaction."""
+    with writer(db_file) as conn:
+        conn.executemany(INSERT_DECISION_SQL, rows)
+
+
+# ----------------------------
+# Write-Behind Logger
+# ----------------------------
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+
+class DecisionLogger:
+    """
+    Write-behind queue for adaptive decisions.
+
+    `log()` only appends to an in-memory queue; a background thread writes
+    queued rows in batches of `batch_size` (or every `flush_interval` seconds).
+    At most `max_queue` decisions are held in memory, which also bounds how many
+    can be lost if the process dies. When the queue is full, `overflow` decides
+    what happens:
+
+      - "drop_oldest": discard the oldest queued decision (default)
+      - "drop_newest": discard the incoming decision
+      - "block": wait for the writer to make room (no loss, adds latency)
+
+    With flush_on_exit=True the queue is drained from an atexit hook.
+    """
+
+    def __init__(self, db_file=DB_FILE, batch_size=500, flush_interval=1.0,
+                 max_queue=100_000, overflow="drop_oldest", flush_on_exit=True):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.dropped = 0
+        self.written = 0
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._flushing = 0   # flush() callers waiting: the writer must not idle
+        self._closed = False
+        self._thread = None
+        if flush_on_exit:
+            atexit.register(self.close)
+
+    def log(self, file_name, decision):
+        row = decision_row(file_name, decision)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("DecisionLogger is closed")
+            if self._thread is None:
+                self._start()
+            if len(self._queue) >= self.max_queue:
+                if self.overflow == "drop_newest":
+                    self.dropped += 1
+                    return
+                if self.overflow == "drop_oldest":
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    while len(self._queue) >= self.max_queue and not self._closed:
+                        self._cond.notify_all()
+                        self._cond.wait()
+                    # Closed while waiting for room: the writer is gone
+                    if self._closed:
+                        raise RuntimeError("DecisionLogger is closed")
+            self._queue.append(row)
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been written."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                while self._queue or self._in_flight:
+                    if self._thread is None or not self._thread.is_alive():
+                        break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                else:
+                    return True
+            finally:
+                self._flushing -= 1
+        # No live writer (never started or already stopped): write inline.
+        # Wait for a stopping writer first so only one thread takes batches.
+        if self._thread is not None:
+            self._thread.join()
+        self._drain()
+        return True
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        # A replaced logger must not be kept alive (or closed again) by atexit
+        atexit.unregister(self.close)
+        if self._thread is not None:
+            self._thread.join()
+        self._drain()
+
+    def pending(self):
+        return len(self._queue)
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="smartzip-decision-writer", daemon=True)
+        self._thread.start()
+
+    def _take_batch(self):
+        batch = []
+        while self._queue and len(batch) < self.batch_size:
+            batch.append(self._queue.popleft())
+        self._in_flight = len(batch)
+        return batch
+
+    def _write(self, batch):
+        try:
+            write_decisions(batch, self.db_file)
+            self.written += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            print("⚠️ Failed to log decisions to catalog:", e)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._queue and not self._closed:
+                    self._cond.wait(self.flush_interval)
+                elif len(self._queue) < self.batch_size and not self._closed and not self._flushing:
+                    self._cond.wait(self.flush_interval)
+                if self._closed and not self._queue:
+                    return
+                batch = self._take_batch()
+                # Wake producers blocked on a full queue
+                self._cond.notify_all()
+            if batch:
+                self._write(batch)
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+
+    def _drain(self):
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+            if not batch:
+                break
+            self._write(batch)
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+
+
+DECISION_LOGGER = DecisionLogger()
+
+
+def configure_decision_logger(**options):
+    """Replace the default logger (flushing the old one), e.g. to change the loss policy."""
+    global DECISION_LOGGER
+    old = DECISION_LOGGER
+    DECISION_LOGGER = DecisionLogger(**options)
+    old.close()
+    return DECISION_LOGGER
+
+
+def add_decision_to_catalog(file_name, decision):
+    """Queue an adaptive decision for the catalog's decisions table."""
+    try:
+        DECISION_LOGGER.log(file_name, decision)
+    except Exception as e:
+        print("⚠️ Failed to log decision to catalog:", e)
+
+
+def flush_decisions(timeout=None):
+    return DECISION_LOGGER.flush(timeout)
@@ -0,0 +1,263 @@
+import operator
+import sys
+from array import array
+from itertools import accumulate
+
+try:
+    import numpy as np
+except ImportError:  # optional: vectorized filters (bitshuffle needs it)
+    np = None
+
+# ----------------------------
+# Pre-compression Filters
+# ----------------------------
+# Reversible, size-preserving byte transforms run ahead of the codec.
+# Structured binary (float arrays, sensor samples, int tables) hides its
+# redundancy in per-element byte positions: shuffling groups the bytes of
+# equal significance, and delta / XOR-delta turn slowly changing values
+# into runs of small numbers. A chain like ["delta:4", "shuffle:4"] is
+# applied left to right and undone right to left. Trailing bytes that do
+# not fill a whole element pass through unchanged.
+
+# Filter choice is made per block of this many bytes
+FILTER_BLOCK_SIZE = 1024 * 1024
+# Bytes of each block trial-compressed to rank the candidate chains
+SAMPLE_SIZE = 64 * 1024
+# A chain must beat no filter by this share to be used
+MIN_GAIN = 0.03
+
+ARRAY_CODES = {1: "B", 2: "H", 4: "I", 8: "Q"}
+NUMPY_TYPES = {1: "<u1", 2: "<u2", 4: "<u4", 8: "<u8"}
+
+
+def _elements(buf, typesize):
+    """Split into (whole elements, tail)."""
+    n = len(buf) - len(buf) % typesize
+    return buf[:n], buf[n:]
+
+
+def _ints(buf, typesize):
+    a = array(ARRAY_CODES[typesize], bytes(buf))
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a
+
+
+def _int_bytes(values, typesize):
+    a = array(ARRAY_CODES[typesize], values)
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a.tobytes()
+
+
+# -------- byte shuffle --------
+def shuffle(buf, typesize):
+    body, tail = _elements(buf, typesize)
+    if np is not None:
+        out = np.frombuffer(body, np.uint8).reshape(-1, typesize).T.tobytes()
+    else:
+        out = b"".join(body[i::typesize] for i in range(typesize))
+    return out + tail
+
+
+def unshuffle(buf, typesize):
+    body, tail = _elements(buf, typesize)
+    if np is not None:
+        return np.frombuffer(body, np.uint8).reshape(typesize, -1).T.tobytes() + tail
+    out = bytearray(len(body))
+    count = len(body) // typesize
+    for i in range(typesize):
+        out[i::typesize] = body[i * count:(i + 1) * count]
+    return bytes(out) + tail
+
+
+# -------- bit shuffle (NumPy only) --------
+def bitshuffle(buf, typesize):
+    if np is None:
+        raise RuntimeError("bitshuffle needs numpy")
+    # Whole groups of 8 elements, so each bit plane packs into whole bytes
+    n = len(buf) - len(buf) % (typesize * 8)
+    bits = np.unpackbits(np.frombuffer(buf[:n], np.uint8).reshape(-1, typesize), axis=1)
+    return np.packbits(bits.T, axis=1).tobytes() + buf[n:]
+
+
+def unbitshuffle(buf, typesize):
+    if np is None:
+        raise RuntimeError("bitshuffle needs numpy")
+    n = len(buf) - len(buf) % (typesize * 8)
+    count = n // typesize
+    planes = np.unpackbits(np.frombuffer(buf[:n], np.uint8).reshape(typesize * 8, count // 8), axis=1)
+    return np.packbits(planes.T, axis=1).tobytes() + buf[n:]
+
+
+# -------- delta (integers, wrapping) --------
+def delta(buf, typesize):
+    body, tail = _elements(buf, typesize)
+    if not body:
+        return bytes(buf)
+    if np is not None:
+        a = np.frombuffer(body, NUMPY_TYPES[typesize])
+        return np.diff(a, prepend=a.dtype.type(0)).tobytes() + tail
+    a = _ints(body, typesize)
+    mask = (1 << (8 * typesize)) - 1
+    return _int_bytes([(x - p) & mask for x, p in zip(a, [0] + a[:-1].tolist())], typesize) + tail
+
+
+def undelta(buf, typesize):
+    body, tail = _elements(buf, typesize)
+    if not body:
+        return bytes(buf)
+    if np is not None:
+        a = np.frombuffer(body, NUMPY_TYPES[typesize])
+        return np.cumsum(a, dtype=a.dtype).tobytes() + tail
+    mask = (1 << (8 * typesize)) - 1
+    return _int_bytes(list(accumulate(_ints(body, typesize), lambda p, d: (p + d) & mask)), typesize) + tail
+
+
+# -------- XOR-delta (floats) --------
+def xor_delta(buf, typesize):
+    body, tail = _elements(buf, typesize)
+    if not body:
+        return bytes(buf)
+    if np is not None:
+        a = np.frombuffer(body, NUMPY_TYPES[typesize])
+        return (a ^ np.concatenate((a[:1] ^ a[:1], a[:-1]))).tobytes() + tail
+    a = _ints(body, typesize)
+    return _int_bytes([x ^ p for x, p in zip(a, [0] + a[:-1].tolist())], typesize) + tail
+
+
+def unxor_delta(buf, typesize):
+    body, tail = _elements(buf, typesize)
+    if not body:
+        return bytes(buf)
+    if np is not None:
+        return np.bitwise_xor.accumulate(np.frombuffer(body, NUMPY_TYPES[typesize])).tobytes() + tail
+    return _int_bytes(list(accumulate(_ints(body, typesize), operator.xor)), typesize) + tail
+
+
+# name -> (forward, inverse)
+FILTERS = {
+    "shuffle": (shuffle, unshuffle),
+    "bitshuffle": (bitshuffle, unbitshuffle),
+    "delta": (delta, undelta),
+    "xor": (xor_delta, unxor_delta),
+}
+
+
+def _parse(step):
+    name, _, typesize = step.partition(":")
+    if name not in FILTERS or int(typesize or 0) not in ARRAY_CODES:
+        raise ValueError(f"Unknown filter {step!r}")
+    return FILTERS[name], int(typesize)
+
+
+def run_chain(buf, chain):
+    for step in chain:
+        (forward, _), typesize = _parse(step)
+        buf = forward(buf, typesize)
+    return bytes(buf)
+
+
+def undo_chain(buf, chain):
+    for step in reversed(chain):
+        (_, inverse), typesize = _parse(step)
+        buf = inverse(buf, typesize)
+    return bytes(buf)
+
+
+# ----------------------------
+# Per-block Selection
+# ----------------------------
+CANDIDATE_CHAINS = [
+    ["shuffle:2"], ["shuffle:4"], ["shuffle:8"],
+    ["delta:2", "shuffle:2"], ["delta:4", "shuffle:4"], ["delta:8", "shuffle:8"],
+    ["xor:4", "shuffle:4"], ["xor:8", "shuffle:8"],
+]
+NUMPY_CHAINS = [["bitshuffle:4"], ["bitshuffle:8"]]
+
+
+def candidate_chains():
+    return CANDIDATE_CHAINS + (NUMPY_CHAINS if np is not None else [])
+
+
+def select_chain(block):
+    """
+    The chain that makes a sample of `block` compress smallest under fast
+    zstd, or [] when none beats the unfiltered bytes by MIN_GAIN.
+    """
+    import compressors
+    sample = block[:SAMPLE_SIZE]
+    best, best_size = [], len(compressors.compress_zstd(sample, level=1)) * (1 - MIN_GAIN)
+    for chain in candidate_chains():
+        size = len(compressors.compress_zstd(run_chain(sample, chain), level=1))
+        if size < best_size:
+            best, best_size = chain, size
+    return best
+
+
+def apply_filters(data, filters="auto", block_size=FILTER_BLOCK_SIZE):
+    """
+    Filter `data` block by block and return (filtered bytes, spec). `filters`
+    is "auto" (select per block) or one chain for every block. spec is None
+    when no block is filtered, else {"block": size, "chains": [...],
+    "use": [chain index per block]} for the blob header.
+    """
+    chains, use, out = [], [], []
+    for start in range(0, len(data), block_size):
+        block = data[start:start + block_size]
+        chain = select_chain(block) if filters == "auto" else list(filters)
+        if chain not in chains:
+            chains.append(chain)
+        use.append(chains.index(chain))
+        out.append(run_chain(block, chain) if chain else block)
+    if not any(chains):
+        return data, None
+    return b"".join(out), {"block": block_size, "chains": chains, "use": use}
+
+
+def undo_filters(data, spec):
+    size = spec["block"]
+    return b"".join(undo_chain(data[i * size:(i + 1) * size], spec["chains"][c])
+                    for i, c in enumerate(spec["use"]))
+
+
+def unfilter_stream(chunks, spec):
+    """Undo filters over a decompressed chunk stream, one filter block at a time."""
+    size, buf, index = spec["block"], bytearray(), 0
+    for chunk in chunks:
+        buf += chunk
+        while len(buf) >= size:
+            yield undo_chain(bytes(buf[:size]), spec["chains"][spec["use"][index]])
+            del buf[:size]
+            index += 1
+    if buf:
+        yield undo_chain(bytes(buf), spec["chains"][spec["use"][index]])
+
+
+def split_params(params):
+    """(codec params, filters) from a decision's params; filters are not codec kwargs."""
+    params = dict(params or {})
+    return params, params.pop("filters", None)
+
+
+# ----------------------------
+# Executable Detection (BCJ)
+# ----------------------------
+# Leading bytes is_x86_executable() needs (the PE header sits past the DOS stub)
+EXECUTABLE_HEAD_SIZE = 4096
+
+
+def is_x86_executable(data):
+    """ELF, PE or Mach-O header for x86 / x86-64 code (lzma's BCJ filter helps these)."""
+    head = bytes(data[:64])
+    if head[:4] == b"\x7fELF" and len(head) >= 20:
+        machine = int.from_bytes(head[18:20], "little" if head[5] == 1 else "big")
+        return machine in (0x03, 0x3E)
+    if head[:2] == b"MZ" and len(head) >= 64:
+        # e_lfanew points at the "PE\0\0" signature; Machine follows it
+        pe = int.from_bytes(head[60:64], "little")
+        header = bytes(data[pe:pe + 6])
+        return header[:4] == b"PE\0\0" and int.from_bytes(header[4:6], "little") in (0x14C, 0x8664)
+    if head[:4] in (b"\xce\xfa\xed\xfe", b"\xcf\xfa\xed\xfe") and len(head) >= 8:
+        return int.from_bytes(head[4:8], "little") in (7, 0x01000007)
+    return False
@@ -0,0 +1,408 @@
+import os
+import sys
+import time
+from smartzip_adaptive import get_thresholds
+from smartzip_backend import SHARD_DIR, SHARD_META
+from smartzip_blob import (BLOB_DIR, BLOB_EXT, BlobFormatError, blob_path, compress_blob,
+                           decode_blob, is_blob, is_delta, parse_header, read_header)
+from smartzip_catalog import COMPRESSED_DIR, DB_FILE
+from smartzip_pack import PACK_DIR
+from smartzip_pool import reader, writer
+
+# Unreferenced files younger than this are left alone: a store writes its
+# blob before its catalog row, and reusing a blob refreshes its mtime
+GRACE = 3600
+# Packs modified more recently than this may still be appended to
+MIN_PACK_AGE = 3600
+# Compact a pack once its live members fill less than this share of it;
+# rebuild a block once its live members fill less than this share of it
+SPARSE_RATIO = 0.5
+# Bytes per second compaction may read plus write
+IO_RATE = 32 * 1024 * 1024
+# Seconds a replaced pack file is kept for readers that looked it up before the switch
+UNLINK_DELAY = 10.0
+DELETE_BATCH = 500
+
+
+# ----------------------------
+# Delete
+# ----------------------------
+def delete_rows(conn, ids):
+    """
+    Delete `files` rows on an open write connection. pack_members,
+    tree_files and file_versions rows go with them (ON DELETE CASCADE);
+    versions that used a deleted row as their delta base keep their blob
+    chain, only the base_id link is cleared. Scan filters of content no
+    row shares any more are dropped. Returns the rows deleted.
+    """
+    ids = list(ids)
+    deleted = 0
+    for start in range(0, len(ids), DELETE_BATCH):
+        batch = ids[start:start + DELETE_BATCH]
+        marks = ",".join("?" * len(batch))
+        hashes = [row[0] for row in conn.execute(
+            f"SELECT DISTINCT file_hash FROM files WHERE id IN ({marks}) AND file_hash IS NOT NULL", batch)]
+        conn.execute(f"UPDATE file_versions SET base_id=NULL WHERE base_id IN ({marks})", batch)
+        deleted += conn.execute(f"DELETE FROM files WHERE id IN ({marks})", batch).rowcount
+        conn.executemany("""
+            DELETE FROM block_blooms WHERE file_hash=?
+              AND NOT EXISTS (SELECT 1 FROM files WHERE file_hash=block_blooms.file_hash)
+        """, [(h,) for h in hashes])
+    return deleted
+
+
+def delete_files(keys, db_file=DB_FILE):
+    """Delete rows by numeric id, or all rows of a file name."""
+    ids = []
+    with reader(db_file) as conn:
+        for key in keys:
+            if isinstance(key, int) or str(key).isdigit():
+                ids.append(int(key))
+            else:
+                ids += [row[0] for row in conn.execute("SELECT id FROM files WHERE file_name=?", (key,))]
+    with writer(db_file) as conn:
+        return delete_rows(conn, ids)
+
+
+# ----------------------------
+# TTL Policies
+# ----------------------------
+# Rows expire at files.expires_at (store(ttl=...)) or by a policy from the
+# thresholds file, e.g. {"ttl_policies": [{"name": "*.log", "ttl_days": 30},
+# {"mime_type": "image/*", "tier": "cold", "ttl_days": 365}]}. "name" and
+# "mime_type" are GLOB patterns; a policy matches rows older than ttl_days.
+POLICY_COLUMNS = {"name": "file_name GLOB ?", "mime_type": "mime_type GLOB ?", "tier": "tier = ?"}
+
+
+def expired_ids(conn, now=None, policies=None):
+    now = time.time() if now is None else now
+    policies = get_thresholds().get("ttl_policies", []) if policies is None else policies
+    ids = {row[0] for row in conn.execute(
+        "SELECT id FROM files WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))}
+    for policy in policies:
+        conditions, params = ["created_at < ?"], [now - policy["ttl_days"] * 86400]
+        for key, condition in POLICY_COLUMNS.items():
+            if key in policy:
+                conditions.append(condition)
+                params.append(policy[key])
+        ids.update(row[0] for row in conn.execute(
+            f"SELECT id FROM files WHERE {' AND '.join(conditions)}", params))
+    return sorted(ids)
+
+
+# ----------------------------
+# Catalog ↔ Disk Cross-reference
+# ----------------------------
+def _older(path, cutoff):
+    try:
+        return os.path.getmtime(path) < cutoff
+    except FileNotFoundError:
+        return False
+
+
+def dangling_rows(conn):
+    """Rows whose data is nowhere on disk: no pack member, blob or legacy file."""
+    from smartzip_verify import iter_catalog_blobs
+    return [(file_id, file_name) for file_id, file_name, _, kind, _ in iter_catalog_blobs(conn)
+            if kind == "missing"]
+
+
+def _delta_base(path):
+    try:
+        with open(path, "rb") as f:
+            header = read_header(f)
+    except (OSError, BlobFormatError):
+        return None
+    return header["params"]["base"] if header and is_delta(header) else None
+
+
+def orphan_blobs(conn, root=BLOB_DIR, grace=GRACE):
+    """
+    (orphan blob paths, pinned base count). A blob is live while a row has
+    its content hash, or while a live delta blob needs it as a base (at
+    any depth of the chain). Orphans and stray .tmp files count only once
+    they are older than `grace`.
+    """
+    live = {h for (h,) in conn.execute("SELECT DISTINCT file_hash FROM files WHERE file_hash IS NOT NULL")}
+    cutoff = time.time() - grace
+    candidates, bases = [], []
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            if name.endswith(".tmp"):
+                if _older(path, cutoff):
+                    candidates.append((None, path))
+                continue
+            if not name.endswith(BLOB_EXT):
+                continue
+            content_hash = name[:-len(BLOB_EXT)]
+            if content_hash not in live:
+                candidates.append((content_hash, path))
+            elif base := _delta_base(path):
+                bases.append(base)
+
+    pinned = set()
+    while bases:
+        base = bases.pop()
+        if base in live or base in pinned:
+            continue
+        pinned.add(base)
+        if next_base := _delta_base(blob_path(base, root)):
+            bases.append(next_base)
+    orphans = [path for content_hash, path in candidates
+               if content_hash not in pinned and _older(path, cutoff)]
+    return orphans, len(pinned)
+
+
+def orphan_legacy(conn, root=COMPRESSED_DIR, grace=GRACE):
+    """Unframed <file_name>.<algo> files no row refers to."""
+    used = {f"{name}.{algo}" for name, algo in conn.execute("SELECT DISTINCT file_name, algo FROM files")}
+    cutoff = time.time() - grace
+    return [os.path.join(root, name) for name in sorted(os.listdir(root))
+            if os.path.isfile(os.path.join(root, name)) and name not in used
+            and _older(os.path.join(root, name), cutoff)]
+
+
+def orphan_packs(conn, root=PACK_DIR, grace=GRACE):
+    """Pack files with no packs row, and pack rows with no members left: (paths, pack ids)."""
+    cutoff = time.time() - grace
+    known = {path for (path,) in conn.execute("SELECT path FROM packs")}
+    paths = [os.path.join(root, name) for name in sorted(os.listdir(root))] if os.path.isdir(root) else []
+    paths = [p for p in paths if p not in known and _older(p, cutoff)]
+    empty = conn.execute("""
+        SELECT p.id, p.path FROM packs p
+        WHERE NOT EXISTS (SELECT 1 FROM pack_members m WHERE m.pack_id = p.id)
+    """).fetchall()
+    empty = [(pack_id, path) for pack_id, path in empty if not os.path.exists(path) or _older(path, cutoff)]
+    return paths, empty
+
+
+def _remove(paths, cutoff=None):
+    """Unlink `paths` (only those still older than `cutoff`, if given); returns bytes freed."""
+    freed = 0
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            if cutoff is not None and stat.st_mtime >= cutoff:
+                continue  # reused since the scan
+            os.unlink(path)
+            freed += stat.st_size
+        except FileNotFoundError:
+            pass
+    return freed
+
+
+# ----------------------------
+# Pack Compaction
+# ----------------------------
+class RateLimiter:
+    """Sleep so that consume()d bytes stay under `rate` bytes per second."""
+
+    def __init__(self, rate=IO_RATE):
+        self.rate = rate
+        self.started = time.monotonic()
+        self.total = 0
+
+    def consume(self, n):
+        self.total += n
+        if self.rate:
+            ahead = self.total / self.rate - (time.monotonic() - self.started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+
+# Live bytes per pack: members carry a pro-rata share of their block's size
+PACK_USAGE_SQL = """
+    SELECT p.id, p.path, COALESCE(SUM(f.compressed_size), 0)
+    FROM packs p
+    LEFT JOIN pack_members m ON m.pack_id = p.id
+    LEFT JOIN files f ON f.id = m.file_id
+    GROUP BY p.id
+"""
+
+
+def sparse_packs(conn, ratio=SPARSE_RATIO, min_age=MIN_PACK_AGE):
+    """(pack id, path, file size, live bytes) of settled packs worth compacting."""
+    cutoff = time.time() - min_age
+    out = []
+    for pack_id, path, live in conn.execute(PACK_USAGE_SQL):
+        if os.path.exists(path) and _older(path, cutoff):
+            size = os.path.getsize(path)
+            if 0 < live < size * ratio:
+                out.append((pack_id, path, size, live))
+    return out
+
+
+def _rebuild_block(block, members):
+    """Re-encode a framed block with only its live members; returns (block, {file_id: member offset})."""
+    header, raw = decode_blob(block)
+    parts, offsets, pos = [], {}, 0
+    for file_id, member_offset, member_length in members:
+        parts.append(raw[member_offset:member_offset + member_length])
+        offsets[file_id] = pos
+        pos += member_length
+    params = {k: v for k, v in header["params"].items() if k not in ("filters", "encryption")}
+    if "filters" in header["params"]:
+        params["filters"] = "auto"
+    new_header, payload = compress_blob(b"".join(parts), header["codec"], params)
+    return new_header + payload, offsets
+
+
+def compact_pack(pack_id, path, db_file=DB_FILE, limiter=None, pack_dir=PACK_DIR, ratio=SPARSE_RATIO):
+    """
+    Copy a pack's live blocks into a new pack file and repoint its members
+    in one transaction. Blocks whose live members fill less than `ratio`
+    of them are rebuilt from those members; dead blocks are dropped.
+    Readers keep working throughout: a lookup returns either the old
+    location (the old file stays until the caller removes it) or the new
+    one. Returns (new pack path or None, old size, new size).
+    """
+    limiter = limiter or RateLimiter()
+    with reader(db_file) as conn:
+        rows = conn.execute("""
+            SELECT file_id, block_offset, block_length, member_offset, member_length
+            FROM pack_members WHERE pack_id=? ORDER BY block_offset, member_offset
+        """, (pack_id,)).fetchall()
+    blocks = {}
+    for file_id, block_offset, block_length, member_offset, member_length in rows:
+        blocks.setdefault((block_offset, block_length), []).append((file_id, member_offset, member_length))
+
+    with writer(db_file) as conn:
+        new_id = conn.execute("INSERT INTO packs (path, created_at) VALUES (?, ?)", ("", time.time())).lastrowid
+        new_path = os.path.join(pack_dir, f"pack-{new_id}.szp")
+        conn.execute("UPDATE packs SET path=? WHERE id=?", (new_path, new_id))
+
+    moves, offset = [], 0
+    with open(path, "rb") as src, open(new_path, "wb") as dst:
+        for (block_offset, block_length), members in blocks.items():
+            src.seek(block_offset)
+            block = src.read(block_length)
+            limiter.consume(len(block))
+            offsets = {file_id: member_offset for file_id, member_offset, _ in members}
+            if is_blob(block):
+                live = sum(m[2] for m in members)
+                if live < parse_header(block)["original_size"] * ratio:
+                    block, offsets = _rebuild_block(block, members)
+            dst.write(block)
+            limiter.consume(len(block))
+            moves += [(new_id, offset, len(block), offsets[file_id], file_id, pack_id) for file_id in offsets]
+            offset += len(block)
+
+    with writer(db_file) as conn:
+        conn.executemany("""
+            UPDATE pack_members SET pack_id=?, block_offset=?, block_length=?, member_offset=?
+            WHERE file_id=? AND pack_id=?
+        """, moves)
+        conn.execute("UPDATE packs SET size=?, blocks=? WHERE id=?", (offset, len(blocks), new_id))
+        # Rows added to the old pack meanwhile keep it alive
+        if conn.execute("SELECT 1 FROM pack_members WHERE pack_id=? LIMIT 1", (pack_id,)).fetchone():
+            return None, os.path.getsize(path), offset
+        conn.execute("DELETE FROM packs WHERE id=?", (pack_id,))
+    return new_path, os.path.getsize(path), offset
+
+
+# ----------------------------
+# Collector
+# ----------------------------
+def collect(db_file=DB_FILE, apply=False, grace=GRACE, io_rate=IO_RATE, ttl=True,
+            prune_dangling=False, compact=True, min_pack_age=MIN_PACK_AGE, verbose=False):
+    """
+    One garbage-collection pass over the catalog and compressed/:
+
+      1. delete rows past their expiry or a TTL policy (`ttl`)
+      2. find dangling rows (no data on disk) and, with `prune_dangling`,
+         delete them
+      3. remove blobs, legacy files and pack files no row needs
+      4. compact sparse pack files untouched for `min_pack_age` seconds,
+         at `io_rate` bytes per second
+
+    Without `apply` nothing is changed and the report lists what would be.
+    Returns a report dict.
+    """
+    if os.path.exists(os.path.join(SHARD_DIR, SHARD_META)):
+        # Rows in shard DBs are invisible here: every blob would look orphaned
+        raise ValueError(f"Catalog shards found in {SHARD_DIR}; GC only supports the single-file catalog")
+    started = time.time()
+    report = {"expired": 0, "dangling": 0, "deleted_rows": 0, "orphan_files": 0, "pinned_bases": 0,
+              "freed_bytes": 0, "packs_compacted": 0, "pack_bytes_before": 0, "pack_bytes_after": 0}
+
+    with reader(db_file) as conn:
+        expired = expired_ids(conn) if ttl else []
+        dangling = dangling_rows(conn)
+    report["expired"], report["dangling"] = len(expired), len(dangling)
+    doomed = expired + ([file_id for file_id, _ in dangling] if prune_dangling else [])
+    if apply and doomed:
+        with writer(db_file) as conn:
+            report["deleted_rows"] = delete_rows(conn, sorted(set(doomed)))
+    if verbose:
+        for file_id, file_name in dangling:
+            print(f"🔗 dangling row id={file_id} {file_name}")
+
+    with reader(db_file) as conn:
+        blobs, report["pinned_bases"] = orphan_blobs(conn, grace=grace)
+        legacy = orphan_legacy(conn, grace=grace)
+        pack_files, empty_packs = orphan_packs(conn, grace=grace)
+        sparse = sparse_packs(conn, min_age=min_pack_age) if compact else []
+    orphans = blobs + legacy + pack_files + [path for _, path in empty_packs if os.path.exists(path)]
+    report["orphan_files"] = len(orphans)
+    if verbose:
+        for path in orphans:
+            print(f"🗑️ orphan {path}")
+    if not apply:
+        report["freed_bytes"] = sum(os.path.getsize(p) for p in orphans if os.path.exists(p))
+        report["packs_compacted"] = len(sparse)
+        report["pack_bytes_before"] = sum(size for _, _, size, _ in sparse)
+        report["pack_bytes_after"] = sum(live for _, _, _, live in sparse)
+        report["seconds"] = round(time.time() - started, 3)
+        return report
+
+    report["freed_bytes"] += _remove(orphans, cutoff=time.time() - grace)
+    if empty_packs:
+        with writer(db_file) as conn:
+            conn.executemany("DELETE FROM packs WHERE id=?", [(pack_id,) for pack_id, _ in empty_packs])
+
+    limiter, replaced = RateLimiter(io_rate), []
+    for pack_id, path, _, _ in sparse:
+        new_path, before, after = compact_pack(pack_id, path, db_file, limiter)
+        if new_path is None:
+            continue
+        replaced.append(path)
+        report["packs_compacted"] += 1
+        report["pack_bytes_before"] += before
+        report["pack_bytes_after"] += after
+        if verbose:
+            print(f"📦 {path} → {new_path}: {before} → {after} bytes")
+    if replaced:
+        time.sleep(UNLINK_DELAY)
+        report["freed_bytes"] += _remove(replaced)
+    report["seconds"] = round(time.time() - started, 3)
+    return report
+
+
+def _arg_value(flag, default, cast=float):
+    if flag in sys.argv:
+        return cast(sys.argv[sys.argv.index(flag) + 1])
+    return default
+
+
+if __name__ == "__main__":
+    # python smartzip_gc.py [--apply] [--prune-dangling] [--no-ttl] [--no-compact]
+    #                       [--grace SECONDS] [--io-rate MB_PER_S] [--verbose]
+    apply = "--apply" in sys.argv
+    report = collect(
+        apply=apply,
+        grace=_arg_value("--grace", GRACE),
+        io_rate=_arg_value("--io-rate", IO_RATE / 1024 / 1024) * 1024 * 1024,
+        ttl="--no-ttl" not in sys.argv,
+        prune_dangling="--prune-dangling" in sys.argv,
+        compact="--no-compact" not in sys.argv,
+        verbose="--verbose" in sys.argv,
+    )
+    verb = "freed" if apply else "would free"
+    print(f"{'✅' if apply else 'ℹ️'} {report['expired']} expired, {report['dangling']} dangling rows "
+          f"({report['deleted_rows']} deleted); {report['orphan_files']} orphan files, "
+          f"{report['pinned_bases']} delta bases kept; {report['packs_compacted']} sparse packs "
+          f"({report['pack_bytes_before']} → {report['pack_bytes_after']} bytes); "
+          f"{verb} {report['freed_bytes'] / 1e6:.2f} MB")
+    if not apply:
+        print("ℹ️ Dry run: pass --apply to delete")
@@ -0,0 +1,203 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from smartzip_catalog import DB_FILE, compress_file, insert_entry
+from smartzip_pack import Packer, SMALL_FILE_SIZE, encode_block
+from smartzip_pool import reader, writer
+
+MANIFEST_DIR = "manifests"
+
+# Files at or above this size go to a separate lane so they can't starve small ones
+LARGE_FILE_SIZE = 64 * 1024 * 1024
+
+
+# ----------------------------
+# Parallel Directory Walker
+# ----------------------------
+def _scan_dir(root, rel_dir):
+    """List one directory: (rel_dir, [(name, size, mtime_ns)], [sub rel_dirs])."""
+    files, subdirs = [], []
+    try:
+        with os.scandir(os.path.join(root, rel_dir)) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(os.path.join(rel_dir, entry.name) if rel_dir else entry.name)
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        files.append((entry.name, st.st_size, st.st_mtime_ns))
+                except OSError as e:
+                    print(f"⚠️ Skipping {entry.path}: {e}")
+    except OSError as e:
+        print(f"⚠️ Cannot scan {os.path.join(root, rel_dir)}: {e}")
+    return rel_dir, files, subdirs
+
+
+def walk_tree(root, workers=8):
+    """Yield (rel_dir, files) for every directory under root, scanning directories in parallel."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_scan_dir, root, "")}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                rel_dir, files, subdirs = fut.result()
+                for sub in subdirs:
+                    pending.add(pool.submit(_scan_dir, root, sub))
+                yield rel_dir, files
+
+
+# ----------------------------
+# Tree Ingest
+# ----------------------------
+def _ingest_one(root, prefix, rel_dir, name):
+    rel_path = os.path.join(rel_dir, name)
+    entry, _ = compress_file(os.path.join(root, rel_path), file_name=os.path.join(prefix, rel_path))
+    return entry
+
+
+def store_tree(root, workers=None, large_workers=None, batch_size=500,
+               large_file_size=LARGE_FILE_SIZE, small_file_size=SMALL_FILE_SIZE,
+               pack_group_by="dir", manifest_dir=MANIFEST_DIR, db_file=DB_FILE):
+    """
+    Compress and catalog every file under `root`.
+
+    Files whose size and mtime match the catalog's tree index from a
+    previous run are skipped. Small and large files run on separate thread
+    pools (codecs release the GIL), files under `small_file_size` are packed
+    into shared solid blocks grouped by `pack_group_by` ("dir" or "mime";
+    None disables packing) that are read and compressed on the small-file
+    pool too. Catalog rows and pack appends are written in batches through
+    the pool's writer, and the run writes a JSONL manifest of every file
+    with its status and catalog id. Returns the ingest_runs summary dict.
+    """
+    root = os.path.abspath(root)
+    prefix = os.path.basename(root.rstrip(os.sep))
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    large_workers = large_workers or max(1, workers // 4)
+
+    started = time.time()
+    with writer(db_file) as conn:
+        run_id = conn.execute(
+            "INSERT INTO ingest_runs (root, started_at) VALUES (?, ?)", (root, started)
+        ).lastrowid
+
+    os.makedirs(manifest_dir, exist_ok=True)
+    manifest_path = os.path.join(manifest_dir, f"run-{run_id}.jsonl")
+    counts = {"scanned": 0, "stored": 0, "unchanged": 0, "failed": 0}
+    pending_rows = []
+    pending_blocks = []
+    in_flight = {}   # future -> ("file", meta) or ("block", members)
+    max_in_flight = 4 * (workers + large_workers)
+    packer = Packer(db_file, group_by=pack_group_by) if pack_group_by else None
+
+    with open(manifest_path, "w") as manifest, \
+            ThreadPoolExecutor(max_workers=workers) as small_pool, \
+            ThreadPoolExecutor(max_workers=large_workers) as large_pool:
+
+        def record(rel_dir, name, size, mtime_ns, status, file_id=None, error=None):
+            line = {"path": os.path.join(rel_dir, name), "size": size, "mtime_ns": mtime_ns,
+                    "status": status, "file_id": file_id}
+            if error:
+                line["error"] = error
+            manifest.write(json.dumps(line) + "\n")
+            counts[status] += 1
+
+        def index(conn, meta, file_id):
+            rel_dir, name, size, mtime_ns = meta
+            conn.execute("""
+                INSERT OR REPLACE INTO tree_files (root, dir, name, size, mtime_ns, file_id, run_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (root, rel_dir, name, size, mtime_ns, file_id, run_id))
+            record(rel_dir, name, size, mtime_ns, "stored", file_id)
+
+        def flush():
+            # The writer is held only for inserts and pack appends
+            with writer(db_file) as conn:
+                for entry, meta in pending_rows:
+                    index(conn, meta, insert_entry(conn, entry))
+                for packed in pending_blocks:
+                    for entry, meta in packer.write_block(conn, packed):
+                        index(conn, meta, entry["id"])
+            pending_rows.clear()
+            pending_blocks.clear()
+
+        def submit_blocks(groups):
+            for members in groups:
+                in_flight[small_pool.submit(encode_block, members)] = ("block", members)
+
+        def collect(block):
+            if not in_flight:
+                return
+            done, _ = wait(list(in_flight), timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for fut in done:
+                kind, item = in_flight.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    for meta in [item] if kind == "file" else [member[2] for member in item]:
+                        print(f"❌ Failed {os.path.join(meta[0], meta[1])}: {e}")
+                        record(*meta, "failed", error=str(e))
+                    continue
+                if kind == "file":
+                    pending_rows.append((result, item))
+                else:
+                    pending_blocks.append(result)
+            if len(pending_rows) + sum(len(b["entries"]) for b in pending_blocks) >= batch_size:
+                flush()
+
+        for rel_dir, files in walk_tree(root, workers=min(workers, 8)):
+            # One indexed lookup per directory for the change check
+            with reader(db_file) as conn:
+                known = {
+                    name: (size, mtime_ns, file_id)
+                    for name, size, mtime_ns, file_id in conn.execute(
+                        "SELECT name, size, mtime_ns, file_id FROM tree_files WHERE root=? AND dir=?",
+                        (root, rel_dir))
+                }
+            for name, size, mtime_ns in files:
+                counts["scanned"] += 1
+                prev = known.get(name)
+                if prev and prev[0] == size and prev[1] == mtime_ns:
+                    record(rel_dir, name, size, mtime_ns, "unchanged", prev[2])
+                    continue
+                if packer and size < small_file_size:
+                    rel_path = os.path.join(rel_dir, name)
+                    # Full blocks are read and compressed on the pool
+                    submit_blocks(packer.queue(os.path.join(root, rel_path), os.path.join(prefix, rel_path),
+                                               (rel_dir, name, size, mtime_ns), size))
+                else:
+                    pool = large_pool if size >= large_file_size else small_pool
+                    fut = pool.submit(_ingest_one, root, prefix, rel_dir, name)
+                    in_flight[fut] = ("file", (rel_dir, name, size, mtime_ns))
+                while len(in_flight) >= max_in_flight:
+                    collect(block=True)
+            collect(block=False)
+
+        if packer:
+            submit_blocks(packer.drain())
+        while in_flight:
+            collect(block=True)
+        flush()
+
+    summary = {"run_id": run_id, "root": root, "manifest": manifest_path, **counts,
+               "seconds": round(time.time() - started, 3)}
+    with writer(db_file) as conn:
+        conn.execute("""
+            UPDATE ingest_runs SET finished_at=?, scanned=?, stored=?, unchanged=?, failed=?, manifest=?
+            WHERE id=?
+        """, (time.time(), counts["scanned"], counts["stored"], counts["unchanged"],
+              counts["failed"], manifest_path, run_id))
+    return summary
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python smartzip_ingest.py <directory>")
+    else:
+        result = store_tree(sys.argv[1])
+        print(f"✅ Ingest run {result['run_id']}: {result['stored']} stored, "
+              f"{result['unchanged']} unchanged, {result['failed']} failed "
+              f"({result['scanned']} scanned in {result['seconds']}s)")
+        print(f"📄 Manifest: {result['manifest']}")
@@ -0,0 +1,334 @@
+import atexit
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+import compressors
+from smartzip_adaptive import shannon_entropy, detect_file_type, adaptive_decision
+from smartzip_blob import compress_blob, decode_blob, is_blob, parse_header
+from smartzip_filters import is_x86_executable
+from smartzip_catalog import DB_FILE, COMPRESSED_DIR, encode_params, insert_entry
+from smartzip_pool import writer
+from smartzip_scan import block_blooms
+
+PACK_DIR = os.path.join(COMPRESSED_DIR, "packs")
+
+# Files below this size are packed instead of getting their own blob
+SMALL_FILE_SIZE = 4096
+# Uncompressed bytes per solid block (one decompression to read any member)
+BLOCK_SIZE = 256 * 1024
+# ... and members per block, so a group of tiny files is sealed sooner
+BLOCK_MEMBERS = 256
+# Start a new pack file once the current one reaches this size
+MAX_PACK_SIZE = 64 * 1024 * 1024
+
+
+def group_key(file_path, rel_name, group_by):
+    if group_by == "dir":
+        return os.path.dirname(rel_name)
+    return detect_file_type(file_path)
+
+
+# ----------------------------
+# Packer
+# ----------------------------
+class Packer:
+    """
+    Groups small files (by MIME type or directory) into solid compressed
+    blocks appended to shared pack files, and records each member's block
+    and offset in `pack_members`.
+
+    Packing runs in three steps so callers can parallelise the middle one:
+    `queue()` groups file paths and returns the member lists of any block
+    it filled, `encode_block()` reads and compresses one (thread-safe, no
+    catalog access) and `write_block()` appends it to the open pack and
+    inserts its rows on a write connection. `add()` and `flush()` do all
+    three for serial callers, each block in its own write transaction (or
+    the caller's, inside a `writer()` block).
+    """
+
+    def __init__(self, db_file=DB_FILE, group_by="mime", block_size=BLOCK_SIZE, max_members=BLOCK_MEMBERS,
+                 max_pack_size=MAX_PACK_SIZE, max_open_groups=64, pack_dir=PACK_DIR):
+        self.db_file = db_file
+        self.group_by = group_by
+        self.block_size = block_size
+        self.max_members = max_members
+        self.max_pack_size = max_pack_size
+        self.max_open_groups = max_open_groups
+        self.pack_dir = pack_dir
+        self._groups = OrderedDict()   # key -> [queued bytes, [members]]
+        self._pack = None              # (pack_id, path)
+        os.makedirs(pack_dir, exist_ok=True)
+
+    @property
+    def pack_path(self):
+        """The pack file blocks are appended to (None before the first block)."""
+        return self._pack[1] if self._pack else None
+
+    def queue(self, file_path, file_name=None, meta=None, size=None):
+        """Queue a file; returns the member lists of blocks that are now full."""
+        file_name = file_name or os.path.basename(file_path)
+        size = os.path.getsize(file_path) if size is None else size
+        key = group_key(file_path, file_name, self.group_by)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = [0, []]
+        self._groups.move_to_end(key)
+        group[0] += size
+        group[1].append((file_path, file_name, meta))
+
+        full = []
+        if group[0] >= self.block_size or len(group[1]) >= self.max_members:
+            full.append(self._groups.pop(key)[1])
+        # Bound open groups: close the least recently used one
+        while len(self._groups) > self.max_open_groups:
+            full.append(self._groups.popitem(last=False)[1][1])
+        return full
+
+    def drain(self):
+        """Member lists of every partially filled block."""
+        full = [group[1] for group in self._groups.values()]
+        self._groups.clear()
+        return full
+
+    def add(self, file_path, file_name=None, meta=None):
+        """Queue a file and write any block it completed; returns their (entry, meta) pairs."""
+        return self._write_all(self.queue(file_path, file_name, meta))
+
+    def flush(self):
+        return self._write_all(self.drain())
+
+    def _write_all(self, groups):
+        written = []
+        for members in groups:
+            block = encode_block(members)
+            with writer(self.db_file) as conn:
+                written += self.write_block(conn, block)
+        return written
+
+    def _open_pack(self, conn):
+        """The pack to append to: ours, else the newest one with room, else a new one."""
+        if self._pack is None:
+            # size 0: a pack smartzip_gc is still copying into
+            row = conn.execute("SELECT id, path FROM packs WHERE size > 0 AND size < ? ORDER BY id DESC LIMIT 1",
+                               (self.max_pack_size,)).fetchone()
+            if row and os.path.exists(row[1]):
+                self._pack = row
+        if self._pack and os.path.getsize(self._pack[1]) < self.max_pack_size:
+            return self._pack
+        pack_id = conn.execute(
+            "INSERT INTO packs (path, created_at) VALUES (?, ?)", ("", time.time())
+        ).lastrowid
+        path = os.path.join(self.pack_dir, f"pack-{pack_id}.szp")
+        conn.execute("UPDATE packs SET path=? WHERE id=?", (path, pack_id))
+        self._pack = (pack_id, path)
+        return self._pack
+
+    def write_block(self, conn, block):
+        """Append an encode_block() result to the open pack and insert its rows; returns (entry, meta) pairs."""
+        members, data, entries = block["members"], block["data"], block["entries"]
+        pack_id, path = self._open_pack(conn)
+        # Taking the write lock first serialises appends from every process
+        conn.execute("UPDATE packs SET blocks = blocks + 1 WHERE id=?", (pack_id,))
+        with open(path, "ab") as f:
+            offset = f.tell()
+            f.write(block["block"])
+        length = len(block["block"])
+        conn.execute("UPDATE packs SET size=? WHERE id=?", (offset + length, pack_id))
+
+        written = []
+        member_offset = 0
+        for (_, _, meta), member, entry in zip(members, data, entries):
+            entry["id"] = insert_entry(conn, entry)
+            conn.execute("""
+                INSERT OR REPLACE INTO pack_members
+                    (file_id, pack_id, block_offset, block_length, algo, member_offset, member_length)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (entry["id"], pack_id, offset, length, entry["algo"], member_offset, len(member)))
+            member_offset += len(member)
+            written.append((entry, meta))
+        return written
+
+
+def encode_block(members, contents=None):
+    """
+    Read and compress one block's members ([(file_path, file_name, meta)])
+    and build their catalog entries. Safe to call from worker threads.
+    `contents` are the members' bytes when the caller already read them.
+    """
+    data = contents
+    if data is None:
+        data = []
+        for file_path, _, _ in members:
+            with open(file_path, "rb") as f:
+                data.append(f.read())
+    raw = b"".join(data)
+    decision = adaptive_decision({"name": f"pack-block:{members[0][1]}",
+                                  "entropy": shannon_entropy(raw), "size": len(raw),
+                                  "mime_type": detect_file_type(members[0][0]),
+                                  "x86": is_x86_executable(raw), "lines": raw.count(b"\n")})
+    algo = decision["algo"]
+    # Each block is a framed blob, so pack files are self-describing too
+    header, payload = compress_blob(raw, algo, decision["params"])
+    block = header + payload
+    codec_params = encode_params(parse_header(header)["params"])
+
+    entries = []
+    now = time.time()
+    for (file_path, file_name, _), member in zip(members, data):
+        # Attribute the block's compressed size to members pro rata
+        share = round(len(block) * len(member) / len(raw)) if raw else 0
+        entropy = shannon_entropy(member)
+        entries.append({
+            "file_name": file_name,
+            "file_hash": hashlib.sha256(member).hexdigest(),
+            "mime_type": detect_file_type(file_path),
+            "algo": algo,
+            "original_size": len(member),
+            "compressed_size": share,
+            "compression_ratio": round(share / len(member), 4) if member else 0,
+            "entropy": entropy,
+            "created_at": now,
+            "codec_params": codec_params,
+            "blooms": block_blooms(member, entropy),
+        })
+    return {"members": members, "data": data, "entries": entries, "block": block}
+
+
+def store_small_files(paths, group_by="mime", db_file=DB_FILE, **packer_options):
+    """Pack a list of small files and return their catalog entries."""
+    packer = Packer(db_file, group_by=group_by, **packer_options)
+    entries = []
+    for path in paths:
+        entries += [entry for entry, _ in packer.add(path)]
+    entries += [entry for entry, _ in packer.flush()]
+    return entries
+
+
+# ----------------------------
+# Small-File Queue
+# ----------------------------
+class SmallFileQueue:
+    """
+    Small files stored one at a time (smartzip_catalog.store) wait here
+    until their group fills a block (`block_size` bytes or `max_members`
+    files), flush() or exit, and then share one solid block: a block per
+    file would cost a frame header and a codec stream each.
+
+    add() returns the file's entry dict at once; "id", "algo", the sizes
+    and "pack" are filled in when its block is written. The contents are
+    read by add(), so the file may change or go away afterwards.
+    """
+
+    def __init__(self, db_file=DB_FILE, **packer_options):
+        self.packer = Packer(db_file, **packer_options)
+        self._lock = threading.Lock()
+
+    def add(self, file_path, file_name=None, ttl=None):
+        file_name = file_name or os.path.basename(file_path)
+        with open(file_path, "rb") as f:
+            data = f.read()
+        entry = {"file_name": file_name, "original_size": len(data)}
+        with self._lock:
+            self._write(self.packer.queue(file_path, file_name, (entry, data, ttl), size=len(data)))
+        return entry
+
+    def flush(self):
+        with self._lock:
+            self._write(self.packer.drain())
+
+    def _write(self, groups):
+        for members in groups:
+            block = encode_block(members, contents=[meta[1] for _, _, meta in members])
+            for (_, _, (_, _, ttl)), entry in zip(members, block["entries"]):
+                if ttl is not None:
+                    entry["expires_at"] = entry["created_at"] + ttl
+            with writer(self.packer.db_file) as conn:
+                written = self.packer.write_block(conn, block)
+            for entry, (queued, _, _) in written:
+                queued.update(entry, pack=self.packer.pack_path)
+
+
+_small_files = {}   # abspath(db_file) -> SmallFileQueue
+_small_files_lock = threading.Lock()
+
+
+def small_file_queue(db_file=DB_FILE):
+    """The process-wide SmallFileQueue for a catalog."""
+    key = os.path.abspath(db_file)
+    with _small_files_lock:
+        queue = _small_files.get(key)
+        if queue is None:
+            queue = _small_files[key] = SmallFileQueue(db_file)
+        return queue
+
+
+def flush_small_files():
+    """Write every queued small file to its pack and catalog (also runs at exit)."""
+    with _small_files_lock:
+        queues = list(_small_files.values())
+    for queue in queues:
+        queue.flush()
+
+
+# Registered after smartzip_pool's close_pools, so it runs before it
+atexit.register(flush_small_files)
+
+
+def store_small_file(file_path, file_name=None, db_file=DB_FILE, ttl=None):
+    """
+    Queue one small file for a shared pack block (see SmallFileQueue) and
+    return (entry, pack path); the path is None while the block is open.
+    """
+    entry = small_file_queue(db_file).add(file_path, file_name, ttl)
+    return entry, entry.get("pack")
+
+
+# ----------------------------
+# Member Extraction
+# ----------------------------
+PACKED_LOCATION_SQL = """
+    SELECT p.path, m.block_offset, m.block_length, m.algo, m.member_offset, m.member_length
+    FROM pack_members m JOIN packs p ON p.id = m.pack_id
+    WHERE m.file_id = ?
+"""
+PACKED_LOCATIONS_SQL = """
+    SELECT m.file_id, p.path, m.block_offset, m.block_length, m.algo, m.member_offset, m.member_length
+    FROM pack_members m JOIN packs p ON p.id = m.pack_id
+    WHERE m.file_id IN ({marks})
+"""
+
+
+def packed_location(conn, file_id):
+    """(pack path, block offset, block length, algo, member offset, member length) or None."""
+    return conn.execute(PACKED_LOCATION_SQL, (file_id,)).fetchone()
+
+
+def packed_locations(conn, file_ids, batch=500):
+    """{file_id: packed_location()} for the packed ones among `file_ids`."""
+    file_ids = list(file_ids)
+    found = {}
+    for start in range(0, len(file_ids), batch):
+        ids = file_ids[start:start + batch]
+        for row in conn.execute(PACKED_LOCATIONS_SQL.format(marks=",".join("?" * len(ids))), ids):
+            found[row[0]] = row[1:]
+    return found
+
+
+def read_packed_block(path, block_offset, block_length, algo):
+    """Inflate one whole pack block."""
+    with open(path, "rb") as f:
+        f.seek(block_offset)
+        block = f.read(block_length)
+    if is_blob(block):
+        return decode_blob(block)[1]
+    # pack written before blocks were framed
+    return compressors.get_codec(algo).decompress(block)
+
+
+def read_packed_member(location):
+    """Inflate only the member's block and slice the member out."""
+    path, block_offset, block_length, algo, member_offset, member_length = location
+    raw = read_packed_block(path, block_offset, block_length, algo)
+    return raw[member_offset:member_offset + member_length]
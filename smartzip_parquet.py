@@ -0,0 +1,261 @@
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:  # optional: only needed for the Parquet mirror
+    pa = pc = ds = None
+
+from smartzip_pool import reader
+
+DB_FILE = "smartzip_catalog.db"
+PARQUET_DIR = "catalog_parquet"
+STATE_FILE = "_export_state.json"
+
+FILE_COLUMNS = ["id", "file_name", "file_hash", "mime_type", "algo",
+                "original_size", "compressed_size", "compression_ratio",
+                "entropy", "created_at"]
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for the Parquet mirror (pip install pyarrow)")
+
+
+def mirror_schema():
+    _require_pyarrow()
+    return pa.schema([
+        ("id", pa.int64()),
+        ("file_name", pa.string()),
+        ("file_hash", pa.string()),
+        ("mime_type", pa.string()),
+        ("algo", pa.string()),
+        ("original_size", pa.int64()),
+        ("compressed_size", pa.int64()),
+        ("compression_ratio", pa.float64()),
+        ("entropy", pa.float64()),
+        ("created_at", pa.float64()),
+        ("date", pa.string()),
+    ])
+
+
+def _partitioning():
+    return ds.partitioning(pa.schema([("date", pa.string()), ("algo", pa.string())]), flavor="hive")
+
+
+# ----------------------------
+# Export State
+# ----------------------------
+def load_export_state(out_dir=PARQUET_DIR):
+    path = os.path.join(out_dir, STATE_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"last_id": 0, "rows": 0}
+
+
+def save_export_state(state, out_dir=PARQUET_DIR):
+    path = os.path.join(out_dir, STATE_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# ----------------------------
+# Incremental Export
+# ----------------------------
+def _row_date(created_at):
+    if created_at is None:
+        return "unknown"
+    return datetime.fromtimestamp(created_at, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def export_catalog(db_file=DB_FILE, out_dir=PARQUET_DIR, batch_size=100_000):
+    """
+    Append catalog rows newer than the last export to a Parquet dataset
+    partitioned as date=YYYY-MM-DD/algo=<codec>/. Returns the number of rows
+    exported. Rows are immutable once mirrored; use rebuild_mirror() after
+    bulk rewrites such as a full entropy backfill.
+    """
+    _require_pyarrow()
+    os.makedirs(out_dir, exist_ok=True)
+    state = load_export_state(out_dir)
+    schema = mirror_schema()
+
+    exported = 0
+    with reader(db_file) as conn:
+        while True:
+            rows = conn.execute(f"""
+                SELECT {', '.join(FILE_COLUMNS)} FROM files
+                WHERE id > ? ORDER BY id LIMIT ?
+            """, (state["last_id"], batch_size)).fetchall()
+            if not rows:
+                break
+
+            columns = {name: [r[i] for r in rows] for i, name in enumerate(FILE_COLUMNS)}
+            columns["algo"] = [a if a is not None else "unknown" for a in columns["algo"]]
+            columns["date"] = [_row_date(t) for t in columns["created_at"]]
+            table = pa.Table.from_pydict(columns, schema=schema)
+
+            first_id, last_id = rows[0][0], rows[-1][0]
+            ds.write_dataset(
+                table, out_dir,
+                format="parquet",
+                partitioning=_partitioning(),
+                basename_template=f"part-{first_id}-{last_id}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+            )
+
+            state["last_id"] = last_id
+            state["rows"] = state.get("rows", 0) + len(rows)
+            save_export_state(state, out_dir)
+            exported += len(rows)
+    return exported
+
+
+def rebuild_mirror(db_file=DB_FILE, out_dir=PARQUET_DIR, batch_size=100_000):
+    """Drop the mirror and export every row again."""
+    import shutil
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    return export_catalog(db_file, out_dir, batch_size)
+
+
+# ----------------------------
+# Query Helpers
+# ----------------------------
+# Same filter style as smartzip_catalog.query(): {"algo": "zstd", "entropy<": 4.0}
+FILTER_COLUMNS = {"ratio": "compression_ratio", "size": "original_size"}
+FILTER_OPS = ("<=", ">=", "!=", "<", ">", "=")
+
+
+def filter_expression(filters):
+    """Turn a query()-style filter dict into a pyarrow expression (pushed down to Parquet)."""
+    _require_pyarrow()
+    expr = None
+    for key, val in (filters or {}).items():
+        column, op = key, "="
+        for candidate in FILTER_OPS:
+            if key.endswith(candidate):
+                column, op = key[:-len(candidate)], candidate
+                break
+        field = ds.field(FILTER_COLUMNS.get(column, column))
+        if op == "=":
+            part = field.isin(val) if isinstance(val, (list, tuple, set)) else field == val
+        elif op == "!=":
+            part = field != val
+        elif op == "<":
+            part = field < val
+        elif op == "<=":
+            part = field <= val
+        elif op == ">":
+            part = field > val
+        else:
+            part = field >= val
+        expr = part if expr is None else expr & part
+    return expr
+
+
+def open_mirror(out_dir=PARQUET_DIR):
+    _require_pyarrow()
+    return ds.dataset(out_dir, format="parquet", partitioning=_partitioning(),
+                      exclude_invalid_files=True, ignore_prefixes=["_", "."])
+
+
+def query_parquet(filters=None, columns=None, out_dir=PARQUET_DIR):
+    """
+    Filtered scan of the mirror as a pyarrow Table. Partition filters
+    (date, algo) skip whole directories and column filters use Parquet
+    row-group statistics, so only matching data is read.
+    """
+    return open_mirror(out_dir).to_table(columns=columns, filter=filter_expression(filters))
+
+
+AGGREGATES = [
+    ("id", "count"),
+    ("entropy", "mean"), ("entropy", "min"), ("entropy", "max"),
+    ("compression_ratio", "mean"), ("compression_ratio", "min"), ("compression_ratio", "max"),
+    ("original_size", "sum"), ("compressed_size", "sum"),
+]
+
+
+def aggregate_parquet(group_by=("algo",), filters=None, aggregates=AGGREGATES, out_dir=PARQUET_DIR):
+    """Grouped aggregates over the mirror, reading only the needed columns."""
+    group_by = list(group_by)
+    columns = sorted(set(group_by) | {col for col, _ in aggregates})
+    table = query_parquet(filters, columns=columns, out_dir=out_dir)
+    return table.group_by(group_by).aggregate(list(aggregates))
+
+
+def anomaly_summary(filters=None, out_dir=PARQUET_DIR):
+    """
+    The figures check_anomalies() tests, computed over the mirror with
+    pyarrow compute instead of a DataFrame of every row: ratio and entropy
+    statistics are folded batch by batch, and only the id, algo and size
+    columns are kept to put rows in id order for the flip and growth checks.
+
+    Returns {"rows", "min_ratio", "entropy_mean", "entropy_std",
+    "entropy_min", "entropy_max", "algo_flips", "max_size_step"}; a figure
+    with no data behind it is None.
+    """
+    scanner = open_mirror(out_dir).scanner(
+        columns=["id", "algo", "original_size", "compression_ratio", "entropy"],
+        filter=filter_expression(filters))
+    rows, min_ratio = 0, None
+    # Entropy count / mean / sum of squared deviations, merged per batch (Chan et al.)
+    count, mean, m2, low, high = 0, 0.0, 0.0, None, None
+    ids, algos, sizes = [], [], []
+    for batch in scanner.to_batches():
+        if not batch.num_rows:
+            continue
+        rows += batch.num_rows
+        min_ratio = _fold(min, min_ratio, pc.min(batch.column("compression_ratio")).as_py())
+        entropy = batch.column("entropy")
+        n = len(entropy) - entropy.null_count
+        if n:
+            batch_mean = pc.mean(entropy).as_py()
+            batch_m2 = pc.variance(entropy, ddof=0).as_py() * n
+            delta = batch_mean - mean
+            mean += delta * n / (count + n)
+            m2 += batch_m2 + delta * delta * count * n / (count + n)
+            count += n
+            low = _fold(min, low, pc.min(entropy).as_py())
+            high = _fold(max, high, pc.max(entropy).as_py())
+        ids.append(batch.column("id"))
+        algos.append(batch.column("algo"))
+        sizes.append(batch.column("original_size"))
+
+    summary = {"rows": rows, "min_ratio": min_ratio,
+               "entropy_mean": mean if count else None,
+               "entropy_std": (m2 / (count - 1)) ** 0.5 if count > 1 else None,
+               "entropy_min": low, "entropy_max": high,
+               "algo_flips": 0, "max_size_step": None}
+    if rows:
+        order = pc.sort_indices(pa.chunked_array(ids))
+        codes = pc.take(pc.dictionary_encode(pa.chunked_array(algos).combine_chunks()).indices, order)
+        in_order = pc.take(pa.chunked_array(sizes), order)
+        # The first row counts as a switch, like pandas' shift() comparison
+        summary["algo_flips"] = 1 + (pc.sum(pc.not_equal(codes[1:], codes[:-1])).as_py() or 0)
+        if rows > 1:
+            summary["max_size_step"] = pc.max(pc.subtract(in_order[1:], in_order[:-1])).as_py()
+    return summary
+
+
+def _fold(pick, current, value):
+    if value is None:
+        return current
+    return value if current is None else pick(current, value)
+
+
+if __name__ == "__main__":
+    if "--rebuild" in sys.argv:
+        n = rebuild_mirror()
+    else:
+        n = export_catalog()
+    state = load_export_state()
+    print(f"✅ Exported {n} new rows to {PARQUET_DIR}/ (mirror holds {state['rows']} rows, last id={state['last_id']})")
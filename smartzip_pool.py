@@ -0,0 +1,190 @@
+import atexit
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from smartzip_schema import DB_FILE, connect
+
+# Applied to every pooled connection. WAL lets readers run alongside the
+# writer; busy_timeout makes other processes wait instead of failing with
+# "database is locked".
+PRAGMAS = {
+    "busy_timeout": 5000,            # ms
+    "synchronous": "NORMAL",         # durable at checkpoints; safe with WAL
+    "mmap_size": 256 * 1024 * 1024,  # bytes of the DB read through mmap
+    "cache_size": -64 * 1024,        # negative = KiB of page cache
+    "temp_store": "MEMORY",
+}
+
+MAX_READERS = 8
+CHECKOUT_TIMEOUT = 30.0
+
+
+class ConnectionPool:
+    """
+    One writer and up to `max_readers` reader connections for a catalog DB.
+
+    `writer()` hands out the single write connection under a lock, so
+    threads in this process queue for it instead of racing into
+    SQLITE_BUSY. It commits when the outermost block exits and rolls back
+    on error; nested writer() blocks on the same thread join the open
+    transaction, and on_commit() callbacks run once it has committed. `reader()` checks out a query-only connection and returns
+    it to the pool afterwards. Connections are shared across threads, but
+    each is only used by one thread at a time.
+    """
+
+    def __init__(self, db_file=DB_FILE, max_readers=MAX_READERS, timeout=CHECKOUT_TIMEOUT, pragmas=None):
+        self.db_file = db_file
+        self.max_readers = max_readers
+        self.timeout = timeout
+        self.pragmas = {**PRAGMAS, **(pragmas or {})}
+        self._readers = queue.LifoQueue()
+        self._all_readers = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._write_depth = 0
+        self._on_commit = []
+        self._writer = None
+        self._closed = False
+        # First writer connection migrates the schema and switches to WAL
+        with self._write_lock:
+            self._writer = self._open(query_only=False)
+            self._writer.execute("PRAGMA journal_mode = WAL")
+
+    def _open(self, query_only):
+        conn = connect(self.db_file, check_same_thread=False, timeout=self.pragmas["busy_timeout"] / 1000)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        if query_only:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @contextmanager
+    def writer(self):
+        with self._write_lock:
+            if self._closed:
+                raise RuntimeError("ConnectionPool is closed")
+            conn = self._writer
+            self._write_depth += 1
+            try:
+                yield conn
+            except BaseException:
+                self._write_depth -= 1
+                if self._write_depth == 0:
+                    self._on_commit.clear()
+                    conn.rollback()
+                raise
+            self._write_depth -= 1
+            if self._write_depth:
+                return
+            conn.commit()
+            committed, self._on_commit = self._on_commit, []
+        for callback in committed:
+            try:
+                callback()
+            except Exception as e:
+                print("⚠️ Post-commit callback failed:", e)
+
+    def on_commit(self, callback):
+        """Run callback() after the open writer() transaction commits (never, if it rolls back)."""
+        with self._write_lock:
+            if not self._write_depth:
+                raise RuntimeError("on_commit() needs an open writer() transaction")
+            self._on_commit.append(callback)
+
+    @contextmanager
+    def reader(self):
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._closed:
+                conn.close()
+            else:
+                self._readers.put(conn)
+
+    def _checkout(self):
+        if self._closed:
+            raise RuntimeError("ConnectionPool is closed")
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all_readers) < self.max_readers:
+                conn = self._open(query_only=True)
+                self._all_readers.append(conn)
+                return conn
+        try:
+            return self._readers.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No catalog reader free after {self.timeout}s "
+                               f"({self.max_readers} in use)") from None
+
+    def close(self):
+        with self._write_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._writer.close()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# ----------------------------
+# Shared Pools
+# ----------------------------
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_file=DB_FILE, **options):
+    """The process-wide pool for `db_file` (created on first use)."""
+    key = os.path.abspath(db_file)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(db_file, **options)
+    return pool
+
+
+def reader(db_file=DB_FILE):
+    """`with reader() as conn:` checks out a read-only catalog connection."""
+    return get_pool(db_file).reader()
+
+
+def writer(db_file=DB_FILE):
+    """`with writer() as conn:` runs the block as one catalog write transaction."""
+    return get_pool(db_file).writer()
+
+
+def on_commit(conn, callback):
+    """
+    Run callback() once the transaction open on `conn` commits. `conn` is
+    a pooled writer connection; any other connection is the caller's to
+    commit, so the callback runs at once.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        if pool._writer is conn:
+            pool.on_commit(callback)
+            return
+    callback()
+
+
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+atexit.register(close_pools)
@@ -0,0 +1,333 @@
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+import compressors
+from smartzip_adaptive import (RECALIBRATION_WEIGHT, adaptive_decision, get_thresholds,
+                               shannon_entropy, smooth_thresholds)
+from smartzip_blob import (DELTA_CODEC, blob_path, compress_blob, compress_delta, decode_blob,
+                           read_blob, read_range)
+from smartzip_filters import EXECUTABLE_HEAD_SIZE, is_x86_executable
+from smartzip_pool import reader
+from smartzip_verify import iter_catalog_blobs
+
+DB_FILE = "smartzip_catalog.db"
+# (content hash, codec, params) → measured size and times, reused across runs
+CACHE_FILE = "smartzip_replay_cache.db"
+SAMPLE_SIZE = 200
+
+# ----------------------------
+# Policies
+# ----------------------------
+# A policy is {"name", "start": "current" | "historical", "thresholds":
+# overrides (entropy_threshold, size_threshold, codec_params, ...),
+# "recalibrate": {"every": rows, "window": rows, "weight": share}} or
+# {"name", "recorded": true} for the codecs the catalog actually used.
+# "start" picks the thresholds replay begins from: the thresholds file as
+# it is now (default) or as of the first logged decision.
+DEFAULT_POLICIES = [
+    {"name": "recorded", "recorded": True},
+    {"name": "current"},
+    {"name": "historical", "start": "historical"},
+    {"name": "recalibrated", "start": "historical",
+     "recalibrate": {"every": 500, "window": 500, "weight": RECALIBRATION_WEIGHT}},
+]
+STARTS = ("current", "historical")
+
+HISTORY_SQL = """
+    SELECT id, file_name, file_hash, mime_type, tier, entropy, original_size, algo, codec_params
+    FROM files ORDER BY created_at, id
+"""
+
+
+def load_policies(file):
+    with open(file) as f:
+        policies = json.load(f)
+    names = [p["name"] for p in policies]
+    if len(set(names)) != len(names):
+        raise ValueError("Policy names must be unique")
+    for p in policies:
+        if p.get("start", "current") not in STARTS:
+            raise ValueError(f"Policy {p['name']}: unknown start {p['start']!r}")
+    return policies
+
+
+def historical_thresholds(conn):
+    """The thresholds file, with the entropy / size thresholds of the first logged decision."""
+    thresholds = dict(get_thresholds())
+    try:
+        first = conn.execute("""
+            SELECT entropy_threshold, size_threshold FROM decisions
+            WHERE entropy_threshold IS NOT NULL ORDER BY timestamp LIMIT 1
+        """).fetchone()
+    except sqlite3.OperationalError:  # catalog older than the decisions table
+        first = None
+    if first:
+        thresholds["entropy_threshold"], thresholds["size_threshold"] = first
+    return thresholds
+
+
+def replay_thresholds(history, policy, base, wanted):
+    """
+    Walk the history in store order, recalibrating as the policy says, and
+    return {row id: thresholds in force when it was stored} for `wanted`.
+    """
+    thresholds = {**base, **policy.get("thresholds", {})}
+    recalibrate = policy.get("recalibrate")
+    seen = deque(maxlen=recalibrate["window"] if recalibrate else 1)
+    snapshots = {}
+    for n, row in enumerate(history, 1):
+        if row[0] in wanted:
+            snapshots[row[0]] = thresholds
+        if recalibrate and row[5] is not None and row[6] is not None:
+            seen.append((row[5], row[6]))
+        if recalibrate and n % recalibrate["every"] == 0 and seen:
+            thresholds = smooth_thresholds(thresholds, [e for e, _ in seen], [s for _, s in seen],
+                                           recalibrate.get("weight", RECALIBRATION_WEIGHT))
+    return snapshots
+
+
+def recorded_choice(row):
+    """(algo, params) the catalog stored a row with."""
+    params = json.loads(row[8]) if row[8] else {}
+    if isinstance(params.get("filters"), dict):
+        params["filters"] = "auto"  # the recorded chains were picked by the auto search
+    return row[7], params
+
+
+# ----------------------------
+# Measurements
+# ----------------------------
+def params_key(params):
+    # Measured single-threaded so CPU time is comparable across codecs
+    return json.dumps({k: v for k, v in params.items() if k != "threads"}, sort_keys=True)
+
+
+def measure(data, algo, params):
+    """
+    Stored size plus compress / decompress CPU seconds and wall milliseconds.
+    A recorded version delta is measured against its base blob, as stored.
+    """
+    params = json.loads(params_key(params))
+    base = read_blob(blob_path(params["base"])) if algo == DELTA_CODEC else None
+    wall, cpu = time.perf_counter(), time.thread_time()
+    if base is None:
+        header, payload = compress_blob(data, algo, params)
+    else:
+        header, payload = compress_delta(data, base, params["base"], params["depth"], params["level"])
+    compress_cpu, compress_ms = time.thread_time() - cpu, (time.perf_counter() - wall) * 1000
+    wall, cpu = time.perf_counter(), time.thread_time()
+    decode_blob(header + payload)
+    return {"size": len(header) + len(payload), "compress_cpu": compress_cpu,
+            "decompress_cpu": time.thread_time() - cpu, "compress_ms": compress_ms,
+            "decompress_ms": (time.perf_counter() - wall) * 1000}
+
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    file_hash TEXT NOT NULL,
+    algo TEXT NOT NULL,
+    params TEXT NOT NULL,
+    size INTEGER,
+    compress_cpu REAL,
+    decompress_cpu REAL,
+    compress_ms REAL,
+    decompress_ms REAL,
+    measured_at REAL,
+    PRIMARY KEY (file_hash, algo, params)
+) WITHOUT ROWID;
+"""
+MEASUREMENT_FIELDS = ("size", "compress_cpu", "decompress_cpu", "compress_ms", "decompress_ms")
+# One cache connection is shared by the worker threads
+_cache_lock = threading.Lock()
+
+
+def open_cache(file=CACHE_FILE):
+    conn = sqlite3.connect(file, check_same_thread=False)
+    conn.executescript(CACHE_SCHEMA)
+    return conn
+
+
+def cached(cache, file_hash, algo, params):
+    with _cache_lock:
+        row = cache.execute(f"SELECT {', '.join(MEASUREMENT_FIELDS)} FROM measurements "
+                            "WHERE file_hash=? AND algo=? AND params=?", (file_hash, algo, params)).fetchone()
+    return dict(zip(MEASUREMENT_FIELDS, row)) if row else None
+
+
+def save_measurements(cache, rows):
+    with _cache_lock, cache:
+        cache.executemany(f"""
+            INSERT OR REPLACE INTO measurements (file_hash, algo, params, {', '.join(MEASUREMENT_FIELDS)}, measured_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(h, a, p, *(m[f] for f in MEASUREMENT_FIELDS), time.time()) for h, a, p, m in rows])
+
+
+# ----------------------------
+# Sample Objects
+# ----------------------------
+class _SampleObject:
+    """One sampled row's bytes, read from the store only when first needed."""
+
+    def __init__(self, row, kind, path, db_file):
+        self.row, self.kind, self.path, self.db_file = row, kind, path, db_file
+        self._data = None
+        self._info = None
+
+    def data(self):
+        if self._data is None:
+            if self.kind == "blob":
+                self._data = read_blob(self.path)
+            elif self.kind == "pack":
+                from smartzip_pack import packed_location, read_packed_member
+                with reader(self.db_file) as conn:
+                    self._data = read_packed_member(packed_location(conn, self.row[0]))
+            else:
+                with open(self.path, "rb") as f:
+                    self._data = compressors.get_codec(self.row[7]).decompress(f.read())
+        return self._data
+
+    def head(self):
+        # Executable detection needs a few bytes only: skip decoding a whole blob
+        if self._data is None and self.kind == "blob":
+            return read_range(self.path, 0, EXECUTABLE_HEAD_SIZE)
+        return self.data()[:EXECUTABLE_HEAD_SIZE]
+
+    def file_hash(self):
+        return self.row[2] or hashlib.sha256(self.data()).hexdigest()
+
+    def file_info(self):
+        if self._info is None:
+            _, file_name, _, mime_type, tier, entropy, size, _, _ = self.row
+            if entropy is None or size is None:  # legacy rows stored before these were logged
+                entropy, size = shannon_entropy(self.data()), len(self.data())
+            self._info = {"name": file_name, "entropy": entropy, "size": size, "mime_type": mime_type,
+                          "tier": tier, "x86": is_x86_executable(self.head()),
+                          "lines": self.data().count(b"\n")}
+        return self._info
+
+
+def _evaluate(obj, policies, snapshots, cache):
+    """Measure one object under every policy; returns ({policy: result}, new cache rows)."""
+    results, fresh, measured = {}, [], {}
+    for policy in policies:
+        try:
+            if policy.get("recorded"):
+                algo, params = recorded_choice(obj.row)
+            else:
+                decision = adaptive_decision(obj.file_info(), snapshots[policy["name"]][obj.row[0]], log=False)
+                algo, params = decision["algo"], decision["params"]
+            key = (obj.file_hash(), algo, params_key(params))
+            if key not in measured:
+                measured[key] = cached(cache, *key)
+                if measured[key] is None:
+                    measured[key] = measure(obj.data(), algo, params)
+                    fresh.append((*key, measured[key]))
+            results[policy["name"]] = {"algo": algo, "original": obj.file_info()["size"], **measured[key]}
+        except Exception as e:
+            results[policy["name"]] = {"error": f"{type(e).__name__}: {e}"}
+    obj._data = None  # only objects in flight stay in memory
+    return results, fresh
+
+
+def _p99(values):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(0.99 * len(values)))]
+
+
+def summarize(results, history_bytes, common):
+    """
+    Per-policy totals over the sample objects every policy could measure
+    (`common`, one flag per result), with stored bytes scaled up to the
+    whole history. `errors` counts this policy's own failures.
+    """
+    ok = [r for r, keep in zip(results, common) if keep]
+    original = sum(r["original"] for r in ok)
+    stored = sum(r["size"] for r in ok)
+    return {
+        "objects": len(ok),
+        "errors": sum("error" in r for r in results),
+        "original_bytes": original,
+        "stored_bytes": stored,
+        "ratio": round(stored / original, 4) if original else 0,
+        "est_history_stored_bytes": int(stored * history_bytes / original) if original else 0,
+        "compress_cpu_s": round(sum(r["compress_cpu"] for r in ok), 3),
+        "decompress_cpu_s": round(sum(r["decompress_cpu"] for r in ok), 3),
+        "p99_compress_ms": round(_p99([r["compress_ms"] for r in ok]), 2),
+        "p99_decompress_ms": round(_p99([r["decompress_ms"] for r in ok]), 2),
+        "codecs": dict(Counter(r["algo"] for r in ok)),
+    }
+
+
+def replay(policies=None, db_file=DB_FILE, sample_size=SAMPLE_SIZE, seed=0, workers=None,
+           cache_file=CACHE_FILE):
+    """
+    Replay the catalog's store history under each policy and measure what
+    it would have cost on a random sample of stored objects: stored bytes,
+    CPU seconds and p99 latency, per policy. Nothing in the catalog or the
+    thresholds file changes. Measurements are cached in `cache_file` per
+    (content hash, codec, params), so re-runs only measure new choices;
+    times in the cache come from the machine that first measured them.
+    """
+    policies = policies or DEFAULT_POLICIES
+    with reader(db_file) as conn:
+        history = conn.execute(HISTORY_SQL).fetchall()
+        stored = [(file_id, kind, path) for file_id, _, _, kind, path in iter_catalog_blobs(conn)
+                  if kind != "missing"]
+        bases = {"current": dict(get_thresholds()), "historical": historical_thresholds(conn)}
+    rows = {row[0]: row for row in history}
+    sample = random.Random(seed).sample(stored, min(sample_size, len(stored)))
+    wanted = {file_id for file_id, _, _ in sample}
+    snapshots = {p["name"]: replay_thresholds(history, p, bases[p.get("start", "current")], wanted)
+                 for p in policies if not p.get("recorded")}
+
+    cache = open_cache(cache_file)
+    per_policy = {p["name"]: [] for p in policies}
+    objects = [_SampleObject(rows[file_id], kind, path, db_file) for file_id, kind, path in sample]
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        for results, fresh in pool.map(lambda obj: _evaluate(obj, policies, snapshots, cache), objects):
+            for name, result in results.items():
+                per_policy[name].append(result)
+            if fresh:
+                save_measurements(cache, fresh)
+    cache.close()
+
+    # Policies are compared on the same objects: one failing drops it for all
+    common = [all("error" not in r for r in results) for results in zip(*per_policy.values())]
+    history_bytes = sum(row[6] or 0 for row in history)
+    return {name: summarize(results, history_bytes, common) for name, results in per_policy.items()}
+
+
+def _arg_value(flag, default, cast=int):
+    if flag in sys.argv:
+        return cast(sys.argv[sys.argv.index(flag) + 1])
+    return default
+
+
+if __name__ == "__main__":
+    # python smartzip_replay.py [policies.json] [--sample N] [--seed N] [--workers N] [--json]
+    value_flags = ("--sample", "--seed", "--workers")
+    args = [a for i, a in enumerate(sys.argv[1:], 1)
+            if not a.startswith("--") and sys.argv[i - 1] not in value_flags]
+    report = replay(load_policies(args[0]) if args else None,
+                    sample_size=_arg_value("--sample", SAMPLE_SIZE),
+                    seed=_arg_value("--seed", 0),
+                    workers=_arg_value("--workers", None))
+    if "--json" in sys.argv:
+        print(json.dumps(report, indent=2))
+        sys.exit(0)
+    print(f"{'policy':<16}{'objects':>8}{'ratio':>8}{'stored MB':>11}{'est. MB':>10}"
+          f"{'comp CPU s':>12}{'dec CPU s':>11}{'p99 comp ms':>13}{'p99 dec ms':>12}")
+    for name, s in report.items():
+        print(f"{name:<16}{s['objects']:>8}{s['ratio']:>8.3f}{s['stored_bytes'] / 1e6:>11.2f}"
+              f"{s['est_history_stored_bytes'] / 1e6:>10.2f}{s['compress_cpu_s']:>12.3f}"
+              f"{s['decompress_cpu_s']:>11.3f}{s['p99_compress_ms']:>13.2f}{s['p99_decompress_ms']:>12.2f}")
+        print(f"{'':<16}codecs: {s['codecs']}" + (f", {s['errors']} errors" if s["errors"] else ""))
@@ -0,0 +1,298 @@
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import compressors
+from smartzip_backend import _where
+from smartzip_blob import BLOCK_SIZE, blob_path, is_encrypted, iter_blob, read_header, read_range
+from smartzip_pool import reader
+
+try:
+    import numpy as np
+except ImportError:  # optional: vectorized trigram extraction
+    np = None
+
+try:
+    import re._parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+DB_FILE = "smartzip_catalog.db"
+COMPRESSED_DIR = "compressed"
+
+# ----------------------------
+# Per-block Trigram Bloom Filters
+# ----------------------------
+# Built at store time for every BLOCK_SIZE block of a blob's data (plus the
+# two bytes after it, so trigrams crossing into the next block count too)
+# and kept in block_blooms by content hash. A block whose filter lacks one
+# of a pattern's required trigrams cannot hold a match and is not scanned.
+BLOOM_BLOCK_SIZE = BLOCK_SIZE
+BITS_PER_TRIGRAM = 10      # ~1% false positives with BLOOM_HASHES probes
+BLOOM_HASHES = 7
+MIN_BLOOM_BITS = 1 << 10
+MAX_BLOOM_BITS = 1 << 20   # 128 KB; blocks needing more get no filter
+# Near-random data has nearly every trigram: a filter would never prune
+BLOOM_MAX_ENTROPY = 7.0
+# A match is found when it starts in a block and ends within this many
+# bytes of the next one
+OVERLAP = 64 * 1024
+
+
+def _trigrams(buf):
+    """Distinct trigrams of `buf` as 24-bit ints."""
+    if len(buf) < 3:
+        return []
+    if np is not None:
+        a = np.frombuffer(buf, np.uint8).astype(np.uint32)
+        present = np.zeros(1 << 24, np.bool_)
+        present[(a[:-2] << 16) | (a[1:-1] << 8) | a[2:]] = True
+        return np.flatnonzero(present)
+    return list({int.from_bytes(buf[i:i + 3], "big") for i in range(len(buf) - 2)})
+
+
+def _probes(trigrams, bits, hashes):
+    """Bit positions of each trigram (double hashing), shape (len, hashes)."""
+    if np is not None:
+        t = np.asarray(trigrams, np.uint64)
+        h1 = (t * np.uint64(0x9E3779B1)) & np.uint64(0xFFFFFFFF)
+        h2 = ((t * np.uint64(0x85EBCA77)) & np.uint64(0xFFFFFFFF)) | np.uint64(1)
+        return (h1[:, None] + np.arange(hashes, dtype=np.uint64) * h2[:, None]) % np.uint64(bits)
+    out = []
+    for t in trigrams:
+        h1 = (t * 0x9E3779B1) & 0xFFFFFFFF
+        h2 = ((t * 0x85EBCA77) & 0xFFFFFFFF) | 1
+        out.append([(h1 + i * h2) % bits for i in range(hashes)])
+    return out
+
+
+def build_bloom(buf):
+    """Bloom filter bytes over the trigrams of `buf`, or None when it would be too large."""
+    trigrams = _trigrams(buf)
+    bits = MIN_BLOOM_BITS
+    while bits < len(trigrams) * BITS_PER_TRIGRAM:
+        bits <<= 1
+    if bits > MAX_BLOOM_BITS:
+        return None
+    if np is not None:
+        field = np.zeros(bits, np.uint8)
+        field[_probes(trigrams, bits, BLOOM_HASHES).ravel().astype(np.int64)] = 1
+        return np.packbits(field, bitorder="little").tobytes()
+    field = bytearray(bits // 8)
+    for positions in _probes(trigrams, bits, BLOOM_HASHES):
+        for p in positions:
+            field[p >> 3] |= 1 << (p & 7)
+    return bytes(field)
+
+
+def block_blooms(data, entropy=None, block_size=BLOOM_BLOCK_SIZE):
+    """
+    [(block index, bloom bytes)] for a catalog entry's "blooms". Encrypted
+    content gets none: the filters would expose its trigrams in plaintext.
+    """
+    if entropy is not None and entropy > BLOOM_MAX_ENTROPY:
+        return []
+    out = []
+    for i, start in enumerate(range(0, len(data), block_size)):
+        bloom = build_bloom(data[start:start + block_size + 2])
+        if bloom is not None:
+            out.append((i, bloom))
+    return out
+
+
+def bloom_has(bloom, trigrams):
+    """False when any of `trigrams` is certainly absent from the filter."""
+    bits = len(bloom) * 8
+    for positions in _probes(trigrams, bits, BLOOM_HASHES):
+        for p in positions:
+            if not bloom[int(p) >> 3] >> (int(p) & 7) & 1:
+                return False
+    return True
+
+
+# ----------------------------
+# Pattern → Required Trigrams
+# ----------------------------
+def _literal_runs(parsed):
+    """Literal byte runs every match must contain (top-level concatenation only)."""
+    runs, run = [], bytearray()
+    for op, arg in parsed:
+        if op is sre_parse.LITERAL:
+            run.append(arg)
+            continue
+        if op is sre_parse.AT:  # ^ $ \b: zero-width
+            continue
+        if op is sre_parse.SUBPATTERN:
+            # A group's own runs are required too, but do not join ours
+            runs += _literal_runs(arg[-1])
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and arg[0] >= 1:
+            body = list(arg[2])
+            if len(body) == 1 and body[0][0] is sre_parse.LITERAL:
+                # x{n} is n more literals; x{n,} / x+ end the run after n of them
+                run.extend([body[0][1]] * arg[0])
+                if arg[0] == arg[1]:
+                    continue
+            else:
+                runs += _literal_runs(body)
+        runs.append(bytes(run))
+        run = bytearray()
+    runs.append(bytes(run))
+    return [r for r in runs if len(r) >= 3]
+
+
+def required_trigrams(pattern, flags=0):
+    """Trigram ints every match of a bytes regex contains ([] = no pruning possible)."""
+    if flags & re.IGNORECASE:
+        return []
+    parsed = sre_parse.parse(pattern, flags)
+    if parsed.state.flags & re.IGNORECASE:
+        return []
+    trigrams = set()
+    for run in _literal_runs(parsed):
+        trigrams.update(int.from_bytes(run[i:i + 3], "big") for i in range(len(run) - 2))
+    return sorted(trigrams)
+
+
+# ----------------------------
+# Scan
+# ----------------------------
+def candidate_blocks(blooms, count, trigrams):
+    """
+    Indices of blocks that may hold a match start: every required trigram
+    is in the block's filter or the next block's (a match may run into it).
+    Blocks without a filter are always candidates.
+    """
+    if not trigrams:
+        return list(range(count))
+    out = []
+    for i in range(count):
+        if i not in blooms or (i + 1 < count and i + 1 not in blooms):
+            out.append(i)
+            continue
+        both = [blooms[i]] + ([blooms[i + 1]] if i + 1 < count else [])
+        if all(any(bloom_has(b, [t]) for b in both) for t in trigrams):
+            out.append(i)
+    return out
+
+
+def _search(regex, window, limit, base):
+    """Offsets (base + start) of matches that start in the first `limit` bytes of window."""
+    out = []
+    for m in regex.finditer(window):
+        if m.start() >= limit:
+            break
+        out.append(base + m.start())
+    return out
+
+
+def scan_blob(path, regex, blooms, trigrams):
+    """Match offsets in a framed blob, decoding as little as its block filters allow."""
+    with open(path, "rb") as f:
+        header = read_header(f)
+        block_size = header["data_block"]
+        count = len(header["data_digests"])
+        if block_size != BLOOM_BLOCK_SIZE:  # filters (if any) are on other boundaries
+            blooms = {}
+        wanted = candidate_blocks(blooms, count, trigrams)
+        if not wanted:
+            return []
+        if is_encrypted(header):
+            # Sealed blocks open independently: read only the ones needed
+            return [offset for i in wanted for offset in _search(
+                regex, read_range(path, i * block_size, block_size + OVERLAP), block_size, i * block_size)]
+        f.seek(0)
+        wanted, out, previous = set(wanted), [], None
+        # Stream-decode; the regex only runs over candidate blocks and
+        # decoding stops after the last one
+        for i, block in enumerate(iter_blob(f)):
+            if i - 1 in wanted:
+                out += _search(regex, previous + block[:OVERLAP], len(previous), (i - 1) * block_size)
+            if i > max(wanted):
+                break
+            previous = block
+        else:
+            if previous is not None and count - 1 in wanted:
+                out += _search(regex, previous, len(previous), (count - 1) * block_size)
+        return out
+
+
+def _blooms(conn, content_hash):
+    return dict(conn.execute("SELECT block, bits FROM block_blooms WHERE file_hash=?",
+                             (content_hash,)).fetchall())
+
+
+# No join: the query() filters name bare columns (pack_members has an algo too)
+SCAN_ROWS_SQL = """
+    SELECT id, file_name, algo, file_hash,
+           EXISTS (SELECT 1 FROM pack_members m WHERE m.file_id = files.id)
+    FROM files
+    {where}
+"""
+
+
+def _scan_target(target, regex, trigrams, db_file):
+    """(file ids, offsets) for one blob (shared by every row with its hash) or one packed / legacy row."""
+    from smartzip_pack import packed_location, read_packed_member
+    ids, (file_id, file_name, algo, content_hash, packed) = target
+    with reader(db_file) as conn:
+        blooms = _blooms(conn, content_hash) if content_hash else {}
+        location = packed_location(conn, file_id) if packed else None
+    if not packed and content_hash and os.path.exists(blob_path(content_hash)):
+        return ids, scan_blob(blob_path(content_hash), regex, blooms, trigrams)
+
+    # Packed members and legacy files are small: one filter, decoded whole
+    if not candidate_blocks(blooms, 1, trigrams):
+        return ids, []
+    if location is not None:
+        data = read_packed_member(location)
+    else:
+        legacy = os.path.join(COMPRESSED_DIR, f"{file_name}.{algo}")
+        if not os.path.exists(legacy):
+            return ids, []
+        with open(legacy, "rb") as f:
+            data = compressors.get_codec(algo).decompress(f.read())
+    return ids, _search(regex, data, len(data), 0)
+
+
+def scan(pattern, filters=None, db_file=DB_FILE, flags=0, workers=None):
+    """
+    Regex-scan stored files without restoring them to disk; returns sorted
+    [(file_id, offset)] of match starts.
+
+    `filters` takes the query() keys ("algo", "mime_type", "entropy<",
+    "ratio<", "key_id") to prune files by catalog metadata. Blocks whose
+    trigram Bloom filters rule out the pattern's literal parts are skipped;
+    the rest are stream-decoded and searched on a thread pool. Matches must
+    start in a block and end within OVERLAP bytes of the next one.
+    """
+    if isinstance(pattern, str):
+        pattern = pattern.encode()
+    regex = re.compile(pattern, flags)
+    trigrams = required_trigrams(pattern, flags)
+    where, params = _where(filters)
+
+    targets = {}
+    with reader(db_file) as conn:
+        for row in conn.execute(SCAN_ROWS_SQL.format(where=where), params):
+            file_id, _, _, content_hash, packed = row
+            # Rows sharing a standalone blob are scanned once
+            key = content_hash if content_hash and not packed else ("row", file_id)
+            targets.setdefault(key, [[], row])[0].append(file_id)
+
+    matches = []
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 2)) as pool:
+        for ids, offsets in pool.map(lambda t: _scan_target(t, regex, trigrams, db_file),
+                                     map(tuple, targets.values())):
+            matches += [(file_id, offset) for file_id in ids for offset in offsets]
+    return sorted(matches)
+
+
+if __name__ == "__main__":
+    # python smartzip_scan.py <regex> [--mime-type T] [--algo A]
+    if len(sys.argv) < 2:
+        print("Usage: python smartzip_scan.py <regex> [--mime-type T] [--algo A]")
+        sys.exit(1)
+    filters = {key: sys.argv[sys.argv.index(flag) + 1]
+               for flag, key in (("--mime-type", "mime_type"), ("--algo", "algo")) if flag in sys.argv}
+    for file_id, offset in scan(sys.argv[1], filters):
+        print(f"{file_id}\t{offset}")
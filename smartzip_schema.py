@@ -0,0 +1,397 @@
+import os
+import sqlite3
+import sys
+import threading
+
+DB_FILE = "smartzip_catalog.db"
+
+# Prepared statements kept per connection (sqlite3's LRU statement cache)
+STATEMENT_CACHE_SIZE = 256
+
+
+# ----------------------------
+# Schema
+# ----------------------------
+# One table set for the whole catalog. Every connection comes from
+# connect() (usually via smartzip_pool), which brings the DB to
+# SCHEMA_VERSION (stored in PRAGMA user_version) once per process instead
+# of re-running CREATE statements on every call.
+BASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_name TEXT,
+    file_hash TEXT,
+    mime_type TEXT,
+    algo TEXT,
+    original_size INTEGER,
+    compressed_size INTEGER,
+    compression_ratio REAL,
+    entropy REAL,
+    created_at REAL,
+    codec_params TEXT
+);
+
+CREATE TABLE IF NOT EXISTS decisions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_name TEXT,
+    algo TEXT,
+    entropy REAL,
+    size INTEGER,
+    entropy_threshold REAL,
+    size_threshold INTEGER,
+    timestamp REAL
+);
+
+CREATE TABLE IF NOT EXISTS packs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT,
+    size INTEGER DEFAULT 0,
+    blocks INTEGER DEFAULT 0,
+    created_at REAL
+);
+
+CREATE TABLE IF NOT EXISTS pack_members (
+    file_id INTEGER PRIMARY KEY REFERENCES files(id) ON DELETE CASCADE,
+    pack_id INTEGER NOT NULL REFERENCES packs(id),
+    block_offset INTEGER,
+    block_length INTEGER,
+    algo TEXT,
+    member_offset INTEGER,
+    member_length INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS ingest_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    root TEXT,
+    started_at REAL,
+    finished_at REAL,
+    scanned INTEGER,
+    stored INTEGER,
+    unchanged INTEGER,
+    failed INTEGER,
+    manifest TEXT
+);
+
+CREATE TABLE IF NOT EXISTS tree_files (
+    root TEXT NOT NULL,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    file_id INTEGER REFERENCES files(id) ON DELETE CASCADE,
+    run_id INTEGER REFERENCES ingest_runs(id),
+    PRIMARY KEY (root, dir, name)
+);
+
+CREATE TABLE IF NOT EXISTS anomaly_state (
+    name TEXT PRIMARY KEY,
+    state TEXT,
+    updated_at REAL
+);
+
+CREATE TABLE IF NOT EXISTS anomaly_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL,
+    kind TEXT,
+    message TEXT,
+    file_id INTEGER REFERENCES files(id) ON DELETE SET NULL,
+    value REAL
+);
+
+CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+    job TEXT PRIMARY KEY,
+    last_id INTEGER,
+    updated INTEGER,
+    skipped INTEGER,
+    updated_at REAL
+);
+
+CREATE TABLE IF NOT EXISTS health_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp DATETIME,
+    requirements_status TEXT,
+    database_status TEXT,
+    dashboard_status TEXT,
+    compression_status TEXT
+);
+"""
+
+
+def _run_script(conn, script):
+    # Not executescript(): that would commit the migration's open transaction
+    for statement in script.split(";"):
+        if statement.strip():
+            conn.execute(statement)
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _is_table(conn, name):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)
+    ).fetchone() is not None
+
+
+# ----------------------------
+# Migrations
+# ----------------------------
+def _migrate_base(conn):
+    """Create the table set; catalogs from before codec params gain the column."""
+    _run_script(conn, BASE_SCHEMA)
+    if "codec_params" not in _columns(conn, "files"):
+        conn.execute("ALTER TABLE files ADD COLUMN codec_params TEXT")
+
+
+# Legacy column name -> files column, for the old file-catalog `catalog`
+LEGACY_CATALOG_COLUMNS = {
+    "filename": "file_name",
+    "filehash": "file_hash",
+    "filetype": "mime_type",
+    "algorithm": "algo",
+    "algo": "algo",
+    "original_size": "original_size",
+    "compressed_size": "compressed_size",
+    "compression_ratio": "compression_ratio",
+    "entropy": "entropy",
+}
+
+# ... and -> decisions column, for the old decision-log `catalog` (it has
+# the thresholds a decision was made under, but no hash and no blob)
+LEGACY_DECISION_COLUMNS = {
+    "filename": "file_name",
+    "algorithm": "algo",
+    "algo": "algo",
+    "entropy": "entropy",
+    "original_size": "size",
+    "entropy_threshold": "entropy_threshold",
+    "size_threshold": "size_threshold",
+}
+
+# Legacy timestamps are DATETIME text (CURRENT_TIMESTAMP) or already epoch seconds
+LEGACY_EPOCH = ("CASE WHEN typeof(timestamp) IN ('integer', 'real') THEN timestamp "
+                "ELSE CAST(strftime('%s', timestamp) AS REAL) END")
+
+
+def _migrate_legacy_catalog(conn):
+    """
+    Fold the old `catalog` table (filename/algorithm naming) into `files`,
+    or into `decisions` for the decision-log variant, and replace it with a
+    read-only view of the same name.
+    """
+    if _is_table(conn, "catalog"):
+        legacy = _columns(conn, "catalog")
+        if "filehash" not in legacy and "entropy_threshold" in legacy:
+            table, time_column, mapping = "decisions", "timestamp", LEGACY_DECISION_COLUMNS
+        else:
+            table, time_column, mapping = "files", "created_at", LEGACY_CATALOG_COLUMNS
+        pairs = [(old, new) for old, new in mapping.items() if old in legacy]
+        if pairs:
+            created = LEGACY_EPOCH if "timestamp" in legacy else "NULL"
+            conn.execute(f"""
+                INSERT INTO {table} ({', '.join(new for _, new in pairs)}, {time_column})
+                SELECT {', '.join(old for old, _ in pairs)}, {created} FROM catalog
+            """)
+        conn.execute("DROP TABLE catalog")
+    conn.execute("DROP VIEW IF EXISTS catalog")
+    conn.execute("""
+        CREATE VIEW catalog AS
+        SELECT id, file_name AS filename, file_hash AS filehash, mime_type AS filetype,
+               algo, algo AS algorithm, entropy, original_size, compressed_size,
+               compression_ratio, created_at AS timestamp
+        FROM files
+    """)
+
+
+# Tables that gained foreign keys, with the select that copies their old rows
+# (orphaned references are dropped or nulled so the copy satisfies the keys)
+FOREIGN_KEY_TABLES = {
+    "pack_members": """
+        SELECT file_id, pack_id, block_offset, block_length, algo, member_offset, member_length
+        FROM _old WHERE file_id IN (SELECT id FROM files) AND pack_id IN (SELECT id FROM packs)
+    """,
+    "tree_files": """
+        SELECT root, dir, name, size, mtime_ns,
+               CASE WHEN file_id IN (SELECT id FROM files) THEN file_id END,
+               CASE WHEN run_id IN (SELECT id FROM ingest_runs) THEN run_id END
+        FROM _old
+    """,
+    "anomaly_events": """
+        SELECT id, timestamp, kind, message,
+               CASE WHEN file_id IN (SELECT id FROM files) THEN file_id END, value
+        FROM _old
+    """,
+}
+
+
+def _migrate_foreign_keys(conn):
+    """Rebuild tables created before the schema was versioned so they carry foreign keys."""
+    for table, copy_sql in FOREIGN_KEY_TABLES.items():
+        if conn.execute(f"PRAGMA foreign_key_list({table})").fetchone():
+            continue
+        conn.execute(f"ALTER TABLE {table} RENAME TO _old")
+        _run_script(conn, BASE_SCHEMA)
+        conn.execute(f"INSERT INTO {table} {copy_sql}")
+        conn.execute("DROP TABLE _old")
+
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_files_hash ON files(file_hash);
+CREATE INDEX IF NOT EXISTS idx_files_name ON files(file_name);
+CREATE INDEX IF NOT EXISTS idx_files_created ON files(created_at);
+CREATE INDEX IF NOT EXISTS idx_decisions_file ON decisions(file_name);
+CREATE INDEX IF NOT EXISTS idx_pack_members_block ON pack_members(pack_id, block_offset);
+CREATE INDEX IF NOT EXISTS idx_tree_files_file ON tree_files(file_id);
+CREATE INDEX IF NOT EXISTS idx_anomaly_events_file ON anomaly_events(file_id);
+"""
+
+
+def _migrate_indexes(conn):
+    _run_script(conn, INDEXES)
+
+
+# Version chains for versioned stores (smartzip_versions); base_id is the
+# row a delta was compressed against. Deleting a base row (smartzip_gc)
+# clears it; the base blob itself stays while any delta blob needs it
+FILE_VERSIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_versions (
+    file_id INTEGER PRIMARY KEY REFERENCES files(id) ON DELETE CASCADE,
+    file_name TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    base_id INTEGER REFERENCES files(id),
+    depth INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_file_versions_name ON file_versions(file_name, version);
+CREATE INDEX IF NOT EXISTS idx_file_versions_base ON file_versions(base_id);
+"""
+
+
+def _migrate_file_versions(conn):
+    _run_script(conn, FILE_VERSIONS_SCHEMA)
+
+
+def _migrate_tiering(conn):
+    """Storage tier and last get() time per row, for the background recompactor."""
+    columns = _columns(conn, "files")
+    if "tier" not in columns:
+        conn.execute("ALTER TABLE files ADD COLUMN tier TEXT")
+    if "accessed_at" not in columns:
+        conn.execute("ALTER TABLE files ADD COLUMN accessed_at REAL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_files_tier_access ON files(tier, accessed_at)")
+
+
+def _migrate_key_ids(conn):
+    """Envelope master-key id per row (NULL = stored unencrypted)."""
+    if "key_id" not in _columns(conn, "files"):
+        conn.execute("ALTER TABLE files ADD COLUMN key_id TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_files_key_id ON files(key_id)")
+
+
+def _migrate_expiry(conn):
+    """Per-row expiry time for TTL deletes (NULL = kept until deleted)."""
+    if "expires_at" not in _columns(conn, "files"):
+        conn.execute("ALTER TABLE files ADD COLUMN expires_at REAL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_files_expires ON files(expires_at) WHERE expires_at IS NOT NULL")
+
+
+BLOCK_BLOOMS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS block_blooms (
+    file_hash TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    bits BLOB NOT NULL,
+    PRIMARY KEY (file_hash, block)
+) WITHOUT ROWID;
+"""
+
+
+def _migrate_block_blooms(conn):
+    """Per-block trigram Bloom filters by content hash, for smartzip_scan."""
+    _run_script(conn, BLOCK_BLOOMS_SCHEMA)
+
+
+# (version, description, function); append only, never edit a shipped step
+MIGRATIONS = [
+    (1, "base table set", _migrate_base),
+    (2, "fold legacy catalog table into files or decisions", _migrate_legacy_catalog),
+    (3, "foreign keys on pack_members, tree_files, anomaly_events", _migrate_foreign_keys),
+    (4, "lookup indexes", _migrate_indexes),
+    (5, "file version chains", _migrate_file_versions),
+    (6, "storage tier and access time", _migrate_tiering),
+    (7, "encryption key ids", _migrate_key_ids),
+    (8, "row expiry", _migrate_expiry),
+    (9, "block Bloom filters", _migrate_block_blooms),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, verbose=False):
+    """
+    Apply every pending migration, each in its own transaction, and
+    return the resulting schema version.
+    """
+    current = schema_version(conn)
+    if current >= SCHEMA_VERSION:
+        return current
+    # Table rebuilds must not trip foreign keys halfway through
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        for version, description, step in MIGRATIONS:
+            if version <= current:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have migrated while we waited for the lock
+                if schema_version(conn) >= version:
+                    conn.rollback()
+                    continue
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if verbose:
+                print(f"🛠️ Migrated catalog schema to v{version}: {description}")
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON")
+    return SCHEMA_VERSION
+
+
+# ----------------------------
+# Connections
+# ----------------------------
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+
+def connect(db_file=DB_FILE, **kwargs):
+    """
+    Open a catalog connection with foreign keys on and a large prepared
+    statement cache. Migrations run on the first connect per DB per process.
+    """
+    kwargs.setdefault("cached_statements", STATEMENT_CACHE_SIZE)
+    # Autocommit for the migration runner's explicit BEGIN/COMMIT
+    conn = sqlite3.connect(db_file, isolation_level=None, **kwargs)
+    key = os.path.abspath(db_file)
+    if key not in _migrated:
+        with _migrate_lock:
+            if key not in _migrated:
+                migrate(conn)
+                _migrated.add(key)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.isolation_level = ""
+    return conn
+
+
+if __name__ == "__main__":
+    db_file = sys.argv[1] if len(sys.argv) > 1 else DB_FILE
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    before = schema_version(conn)
+    after = migrate(conn, verbose=True)
+    conn.close()
+    print(f"✅ {db_file}: schema v{before} → v{after}")
@@ -0,0 +1,212 @@
+import os
+import sys
+import threading
+import time
+from smartzip_adaptive import adaptive_decision
+from smartzip_blob import (blob_path, compress_blob, decode_blob, encryption_key_id, is_delta,
+                           parse_header, write_blob)
+from smartzip_filters import is_x86_executable
+from smartzip_catalog import DB_FILE, encode_params
+from smartzip_pool import reader, writer
+
+# Rows not read (or written) for this long are rewritten with a dense codec
+COLD_AFTER = 7 * 24 * 3600
+# Share of one core the recompactor may use (CPU seconds per wall second)
+CPU_BUDGET = 0.25
+# Keep the old encoding unless the dense one saves at least this share
+MIN_SAVING = 0.02
+BATCH_SIZE = 100
+
+
+# ----------------------------
+# Cold Candidates
+# ----------------------------
+# Standalone blobs not yet in the cold tier whose every referencing row has
+# gone unread since the cutoff (rows sharing a blob share its encoding).
+# Packed members are skipped: their solid blocks are already dense.
+COLD_CANDIDATES_SQL = """
+    SELECT f.id, f.file_name, f.file_hash, f.mime_type, f.entropy, f.original_size
+    FROM files f
+    WHERE (f.tier IS NULL OR f.tier != 'cold')
+      AND COALESCE(f.accessed_at, f.created_at) < :cutoff
+      AND f.id > :after AND f.file_hash IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM pack_members m WHERE m.file_id = f.id)
+      AND NOT EXISTS (SELECT 1 FROM files g WHERE g.file_hash = f.file_hash
+                      AND COALESCE(g.accessed_at, g.created_at) >= :cutoff)
+    ORDER BY f.id LIMIT :limit
+"""
+
+MARK_COLD_SQL = """
+    UPDATE files SET algo=?, codec_params=?, compressed_size=?,
+           compression_ratio=CASE WHEN original_size > 0 THEN ROUND(? * 1.0 / original_size, 4) ELSE 0 END,
+           tier='cold'
+    WHERE file_hash=? AND id NOT IN (SELECT file_id FROM pack_members)
+"""
+
+
+def cold_candidates(conn, cutoff, after=0, limit=BATCH_SIZE):
+    return conn.execute(COLD_CANDIDATES_SQL, {"cutoff": cutoff, "after": after, "limit": limit}).fetchall()
+
+
+# ----------------------------
+# Recompaction
+# ----------------------------
+def recompact_blob(row, db_file=DB_FILE):
+    """
+    Rewrite one cold blob with the dense-tier codec and mark its rows cold.
+
+    The new frame is decoded and checked before it atomically replaces the
+    old file (same content hash, same path), and the catalog rows are
+    updated in one transaction afterwards. A get() at any point reads either
+    the old or the new self-describing blob, never a partial one. Returns
+    (old size, new size), equal when the blob was kept as it was, or None
+    when there is no framed blob to rewrite.
+    """
+    file_id, file_name, content_hash, mime_type, entropy, original_size = row
+    path = blob_path(content_hash)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        buf = f.read()
+    header, data = decode_blob(buf)
+    old_size = len(buf)
+
+    # Deltas stay deltas: a full rewrite would undo their savings
+    if is_delta(header):
+        new_size, algo, params = old_size, header["codec"], header["params"]
+    else:
+        decision = adaptive_decision({"name": file_name, "entropy": entropy or 0.0,
+                                      "size": len(data), "mime_type": mime_type, "tier": "cold",
+                                      "x86": is_x86_executable(data), "lines": data.count(b"\n")})
+        algo = decision["algo"]
+        # Background work: no codec worker threads on top of the CPU budget
+        params = {k: v for k, v in decision["params"].items() if k != "threads"}
+        # Encrypted blobs are resealed under the same master key
+        new_header, payload = compress_blob(data, algo, params, key_id=encryption_key_id(header))
+        params = parse_header(new_header)["params"]
+        params.pop("encryption", None)
+        new_size = len(new_header) + len(payload)
+        if new_size <= old_size * (1 - MIN_SAVING):
+            if decode_blob(new_header + payload)[1] != data:
+                raise ValueError(f"{algo} round trip failed for {content_hash}")
+            write_blob(path, new_header, payload, replace=True)
+        else:
+            new_size, algo = old_size, header["codec"]
+            params = {k: v for k, v in header["params"].items() if k != "encryption"}
+
+    with writer(db_file) as conn:
+        conn.execute(MARK_COLD_SQL, (algo, encode_params(params), new_size, new_size, content_hash))
+    return old_size, new_size
+
+
+class Recompactor:
+    """
+    Background thread that moves cold entries to the dense tier.
+
+    Every `interval` seconds it pages through cold_candidates() and calls
+    recompact_blob() on each, sleeping after every blob so its CPU time
+    stays within `cpu_budget` of wall time. Codecs release the GIL, so ingest
+    and get() on other threads keep running while it works. CPU time is the
+    whole process's (encryption seals blocks on a thread pool), so a busy
+    process also slows the recompactor down.
+    """
+
+    def __init__(self, db_file=DB_FILE, cold_after=COLD_AFTER, cpu_budget=CPU_BUDGET,
+                 interval=60.0, batch_size=BATCH_SIZE, verbose=False):
+        self.db_file = db_file
+        self.cold_after = cold_after
+        self.cpu_budget = cpu_budget
+        self.interval = interval
+        self.batch_size = batch_size
+        self.verbose = verbose
+        self.stats = {"blobs": 0, "rewritten": 0, "bytes_before": 0, "bytes_after": 0, "errors": 0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _throttle(self, cpu_started, wall_started):
+        cpu = time.process_time() - cpu_started
+        wall = time.monotonic() - wall_started
+        pause = cpu / self.cpu_budget - wall
+        if pause > 0:
+            self._stop.wait(pause)
+
+    def run_once(self, limit=None):
+        """One pass over the current cold candidates; returns the number of blobs handled."""
+        cutoff = time.time() - self.cold_after
+        after, handled, seen = 0, 0, set()
+        while not self._stop.is_set() and (limit is None or handled < limit):
+            with reader(self.db_file) as conn:
+                rows = cold_candidates(conn, cutoff, after, self.batch_size)
+            if not rows:
+                break
+            for row in rows:
+                after = row[0]
+                if row[2] in seen or self._stop.is_set() or (limit is not None and handled >= limit):
+                    continue
+                seen.add(row[2])
+                cpu_started, wall_started = time.process_time(), time.monotonic()
+                try:
+                    sizes = recompact_blob(row, self.db_file)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    print(f"⚠️ Recompaction of id={row[0]} {row[1]} failed:", e)
+                    continue
+                handled += 1
+                if sizes is None:
+                    continue
+                before, now = sizes
+                self.stats["blobs"] += 1
+                self.stats["rewritten"] += now < before
+                self.stats["bytes_before"] += before
+                self.stats["bytes_after"] += now
+                if self.verbose:
+                    print(f"🧊 id={row[0]} {row[1]}: {before} → {now} bytes")
+                self._throttle(cpu_started, wall_started)
+        return handled
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print("⚠️ Recompactor pass failed:", e)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="smartzip-recompactor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def _arg_value(flag, default, cast=float):
+    if flag in sys.argv:
+        return cast(sys.argv[sys.argv.index(flag) + 1])
+    return default
+
+
+if __name__ == "__main__":
+    # python smartzip_tiering.py [--cold-after-days D] [--cpu-budget F] [--limit N] [--daemon]
+    recompactor = Recompactor(
+        cold_after=_arg_value("--cold-after-days", COLD_AFTER / 86400) * 86400,
+        cpu_budget=_arg_value("--cpu-budget", CPU_BUDGET),
+        verbose=True,
+    )
+    if "--daemon" in sys.argv:
+        recompactor.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            recompactor.stop()
+    else:
+        recompactor.run_once(limit=_arg_value("--limit", None, int))
+    s = recompactor.stats
+    print(f"✅ {s['blobs']} cold blobs, {s['rewritten']} rewritten: "
+          f"{s['bytes_before'] / 1e6:.2f} MB → {s['bytes_after'] / 1e6:.2f} MB, {s['errors']} errors")
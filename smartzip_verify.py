@@ -0,0 +1,137 @@
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import compressors
+from smartzip_blob import blob_path, iter_blob, verify_paths
+from smartzip_pool import reader
+
+DB_FILE = "smartzip_catalog.db"
+COMPRESSED_DIR = "compressed"
+
+
+# ----------------------------
+# Catalog → Blob Files
+# ----------------------------
+def iter_catalog_blobs(conn, batch_size=10_000):
+    """
+    Yield (file_id, file_name, file_hash, kind, path) for every catalog row,
+    keyset-paginated by id. kind is "blob", "pack", "legacy" or "missing".
+    """
+    sql = """
+        SELECT f.id, f.file_name, f.algo, f.file_hash, p.path
+        FROM files f
+        LEFT JOIN pack_members m ON m.file_id = f.id
+        LEFT JOIN packs p ON p.id = m.pack_id
+        WHERE f.id > ? ORDER BY f.id LIMIT ?
+    """
+    last_id = 0
+    while True:
+        rows = conn.execute(sql, (last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        for file_id, file_name, algo, content_hash, pack_path in rows:
+            if pack_path:
+                kind = "pack" if os.path.exists(pack_path) else "missing"
+                yield file_id, file_name, content_hash, kind, pack_path
+            elif content_hash and os.path.exists(blob_path(content_hash)):
+                yield file_id, file_name, content_hash, "blob", blob_path(content_hash)
+            elif os.path.exists(os.path.join(COMPRESSED_DIR, f"{file_name}.{algo}")):
+                yield file_id, file_name, content_hash, "legacy", os.path.join(COMPRESSED_DIR, f"{file_name}.{algo}")
+            else:
+                yield file_id, file_name, content_hash, "missing", None
+        last_id = rows[-1][0]
+
+
+# ----------------------------
+# Content Identity (SHA-256)
+# ----------------------------
+def _identity_error(row):
+    """Decompress a blob and compare its SHA-256 with the catalog's file_hash."""
+    file_id, file_name, content_hash, kind, path = row
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            if kind == "legacy":
+                chunks = compressors.iter_decompress(path.rsplit(".", 1)[-1], f)
+            else:
+                chunks = iter_blob(f)
+            for chunk in chunks:
+                h.update(chunk)
+    except Exception as e:
+        return f"id={file_id} {file_name}: {e}"
+    if h.hexdigest() != content_hash:
+        return f"id={file_id} {file_name}: SHA-256 does not match catalog file_hash"
+    return None
+
+
+# ----------------------------
+# Bulk Verify
+# ----------------------------
+def verify(db_file=DB_FILE, deep=False, identity=False, workers=None, verbose=False):
+    """
+    Scrub every blob the catalog references, in parallel.
+
+    Framed blobs and pack files are checked against their per-block
+    checksums (xxh3/BLAKE3/crc32) at read speed; each file is read once even
+    if several rows share it. `deep` also decompresses and checks the
+    original-data blocks. `identity` additionally recomputes SHA-256 of
+    every standalone blob and compares it with files.file_hash; it is the
+    only way to check legacy unframed blobs. Returns a report dict.
+    """
+    started = time.time()
+    rows, paths, missing, legacy = 0, {}, [], []
+    with reader(db_file) as conn:
+        for row in iter_catalog_blobs(conn):
+            rows += 1
+            file_id, file_name, _, kind, path = row
+            if kind == "missing":
+                missing.append(f"id={file_id} {file_name}: no blob on disk")
+            elif kind == "legacy":
+                legacy.append(row)
+            else:
+                paths.setdefault(path, row)
+
+    result = verify_paths(list(paths), deep=deep, workers=workers, verbose=verbose)
+    errors = missing + result["errors"]
+
+    identity_rows = legacy if not identity else legacy + [r for r in paths.values() if r[3] == "blob"]
+    if identity or deep:
+        with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 2)) as pool:
+            errors += [e for e in pool.map(_identity_error, identity_rows) if e]
+
+    checked_bytes = sum(os.path.getsize(p) for p in paths)
+    seconds = time.time() - started
+    return {
+        "rows": rows,
+        "files_checked": result["checked"],
+        "legacy": len(legacy),
+        "missing": len(missing),
+        "errors": errors,
+        "bytes": checked_bytes,
+        "seconds": round(seconds, 3),
+        "mb_per_s": round(checked_bytes / max(seconds, 1e-9) / 1e6, 1),
+    }
+
+
+def _arg_value(flag, default):
+    if flag in sys.argv:
+        return int(sys.argv[sys.argv.index(flag) + 1])
+    return default
+
+
+if __name__ == "__main__":
+    report = verify(
+        deep="--deep" in sys.argv,
+        identity="--identity" in sys.argv,
+        workers=_arg_value("--workers", None),
+        verbose="--verbose" in sys.argv,
+    )
+    for error in report["errors"]:
+        print("❌", error)
+    if report["legacy"] and not ("--deep" in sys.argv or "--identity" in sys.argv):
+        print(f"ℹ️ {report['legacy']} legacy unframed blobs only checked for existence (use --deep or --identity)")
+    status = "✅" if not report["errors"] else "⚠️"
+    print(f"{status} {report['rows']} catalog rows, {report['files_checked']} blob/pack files checked "
+          f"({report['bytes'] / 1e6:.1f} MB at {report['mb_per_s']} MB/s), {len(report['errors'])} errors")
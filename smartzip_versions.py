@@ -0,0 +1,206 @@
+import hashlib
+import os
+import sys
+import time
+import compressors
+from smartzip_adaptive import shannon_entropy
+from smartzip_blob import (blob_path, chain_depth, compress_delta, read_blob, read_header,
+                           restore_blob, write_blob)
+from smartzip_catalog import DB_FILE, compress_file, detect_file_type, encode_params, insert_entry
+from smartzip_pool import reader, writer
+from smartzip_scan import block_blooms
+
+# Deltas get() may have to apply before a full keyframe is written instead
+MAX_CHAIN_DEPTH = 8
+# Write a keyframe when the delta is no smaller than this share of the file
+MAX_DELTA_RATIO = 0.5
+
+
+# ----------------------------
+# Version Lookup
+# ----------------------------
+LATEST_VERSION_SQL = """
+    SELECT v.file_id, v.version, f.file_hash
+    FROM file_versions v JOIN files f ON f.id = v.file_id
+    WHERE v.file_name = ? ORDER BY v.version DESC LIMIT 1
+"""
+LATEST_UNVERSIONED_SQL = "SELECT id, NULL, file_hash FROM files WHERE file_name=? ORDER BY id DESC LIMIT 1"
+
+
+def latest_version(conn, file_name):
+    """
+    (file_id, version, file_hash) of the newest version of `file_name`.
+    A file only ever stored by plain store() comes back with version None.
+    """
+    return (conn.execute(LATEST_VERSION_SQL, (file_name,)).fetchone()
+            or conn.execute(LATEST_UNVERSIONED_SQL, (file_name,)).fetchone())
+
+
+def versions(file_name, db_file=DB_FILE):
+    """Version history, oldest first, as dicts."""
+    with reader(db_file) as conn:
+        rows = conn.execute("""
+            SELECT v.version, v.file_id, v.base_id, v.depth,
+                   f.file_hash, f.algo, f.original_size, f.compressed_size, f.created_at
+            FROM file_versions v JOIN files f ON f.id = v.file_id
+            WHERE v.file_name = ? ORDER BY v.version
+        """, (file_name,)).fetchall()
+    keys = ["version", "file_id", "base_id", "depth", "file_hash", "algo",
+            "original_size", "compressed_size", "created_at"]
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def _blob_depth(content_hash):
+    path = blob_path(content_hash) if content_hash else None
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, "rb") as f:
+        return chain_depth(read_header(f))
+
+
+# ----------------------------
+# Versioned Store
+# ----------------------------
+def _delta(data, prior, max_depth, level):
+    """Framed delta against the prior version, or None when a keyframe is due."""
+    _, _, prior_hash = prior
+    base_path = blob_path(prior_hash) if prior_hash else None
+    # Packed and legacy blobs cannot serve as a base
+    if not base_path or not os.path.exists(base_path):
+        return None
+    depth = _blob_depth(prior_hash) + 1
+    if depth > max_depth:
+        return None
+    header, payload = compress_delta(data, read_blob(base_path), prior_hash, depth, level)
+    if len(payload) >= len(data) * MAX_DELTA_RATIO:
+        return None
+    return header, payload
+
+
+def _blob_entry(file_path, file_name, data, content_hash, path):
+    """Catalog entry for data whose blob (delta or full) is already on disk."""
+    with open(path, "rb") as f:
+        header = read_header(f)
+    compressed_size = header["header_size"] + header["payload_size"]
+    entropy = shannon_entropy(data)
+    return {
+        "file_name": file_name,
+        "file_hash": content_hash,
+        "mime_type": detect_file_type(file_path),
+        "algo": header["codec"],
+        "original_size": len(data),
+        "compressed_size": compressed_size,
+        "compression_ratio": round(compressed_size / len(data), 4) if len(data) else 0,
+        "entropy": entropy,
+        "created_at": time.time(),
+        "codec_params": encode_params(header["params"]),
+        "blooms": block_blooms(data, entropy),
+    }
+
+
+def _record_version(conn, file_name, file_id, base_id, depth, prior):
+    last = conn.execute("SELECT MAX(version) FROM file_versions WHERE file_name=?",
+                        (file_name,)).fetchone()[0]
+    if last is None and prior and prior[1] is None:
+        # First versioned store of a file stored before: it becomes version 1
+        conn.execute("INSERT OR IGNORE INTO file_versions (file_id, file_name, version, depth) VALUES (?, ?, 1, ?)",
+                     (prior[0], file_name, _blob_depth(prior[2])))
+        last = 1
+    version = (last or 0) + 1
+    conn.execute("""
+        INSERT INTO file_versions (file_id, file_name, version, base_id, depth)
+        VALUES (?, ?, ?, ?, ?)
+    """, (file_id, file_name, version, base_id, depth))
+    return version
+
+
+def store_version(file_path, file_name=None, db_file=DB_FILE,
+                  max_depth=MAX_CHAIN_DEPTH, level=compressors.ZSTD_DELTA_LEVEL, ttl=None):
+    """
+    Store `file_path` as the next version of `file_name`.
+
+    The new data is compressed as a zstd delta against the previous
+    version's blob (patch-from), so a snapshot that changed by 1% costs
+    about 1% of a full blob. After `max_depth` chained deltas, or when the
+    delta is not worth it, a full keyframe is written instead, which keeps
+    get() to at most `max_depth + 1` decodes. Unchanged content reuses the
+    existing blob. `ttl` (seconds) sets the row's expiry. Returns (entry,
+    blob path); the entry carries "version", "depth" and "base_id".
+    """
+    file_name = file_name or os.path.basename(file_path)
+    with reader(db_file) as conn:
+        prior = latest_version(conn, file_name)
+
+    with open(file_path, "rb") as f:
+        data = f.read()
+    content_hash = hashlib.sha256(data).hexdigest()
+    path = blob_path(content_hash)
+
+    base_id = None
+    if prior and not os.path.exists(path):
+        framed = _delta(data, prior, max_depth, level)
+        if framed:
+            write_blob(path, *framed)
+            base_id = prior[0]
+
+    if os.path.exists(path):
+        entry = _blob_entry(file_path, file_name, data, content_hash, path)
+    else:  # keyframe: a regular adaptive-codec blob
+        entry, path = compress_file(file_path, file_name)
+    depth = _blob_depth(content_hash)
+    if ttl is not None:
+        entry["expires_at"] = entry["created_at"] + ttl
+
+    with writer(db_file) as conn:
+        entry["id"] = insert_entry(conn, entry)
+        entry["version"] = _record_version(conn, file_name, entry["id"], base_id, depth, prior)
+    entry["depth"] = depth
+    entry["base_id"] = base_id
+    return entry, path
+
+
+def get_version(file_name, out_path, version=None, db_file=DB_FILE, verify_hash=False):
+    """Restore one version of `file_name` (the latest by default)."""
+    with reader(db_file) as conn:
+        if version is None:
+            row = latest_version(conn, file_name)
+        else:
+            row = conn.execute("""
+                SELECT v.file_id, v.version, f.file_hash
+                FROM file_versions v JOIN files f ON f.id = v.file_id
+                WHERE v.file_name = ? AND v.version = ?
+            """, (file_name, int(version))).fetchone()
+    if not row:
+        raise ValueError(f"No version {version or 'latest'} of {file_name}")
+    file_id, _, content_hash = row
+    if content_hash and os.path.exists(blob_path(content_hash)):
+        restore_blob(blob_path(content_hash), out_path)
+    else:  # unversioned original kept in a pack or a legacy blob
+        from smartzip_catalog import get
+        get(file_id, out_path)
+    if verify_hash:
+        from smartzip_catalog import file_hash
+        if file_hash(out_path) != content_hash:
+            raise ValueError(f"Restored file {out_path} does not match its catalog SHA-256")
+    return out_path
+
+
+if __name__ == "__main__":
+    # python smartzip_versions.py store <path> [name]
+    # python smartzip_versions.py history <name>
+    # python smartzip_versions.py get <name> <out_path> [version]
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else ("", [])
+    if command == "store" and args:
+        entry, path = store_version(args[0], *args[1:2])
+        kind = f"delta depth {entry['depth']}" if entry["depth"] else "keyframe"
+        print(f"✅ {entry['file_name']} v{entry['version']} → {path} "
+              f"({kind}, {entry['compressed_size']} / {entry['original_size']} bytes)")
+    elif command == "history" and args:
+        for v in versions(args[0]):
+            kind = f"delta of id={v['base_id']} (depth {v['depth']})" if v["base_id"] else f"depth {v['depth']}"
+            print(f"v{v['version']}: id={v['file_id']} {v['algo']} "
+                  f"{v['compressed_size']} / {v['original_size']} bytes, {kind}")
+    elif command == "get" and len(args) >= 2:
+        print("✅ Restored:", get_version(args[0], args[1], *args[2:3], verify_hash=True))
+    else:
+        print("Usage: python smartzip_versions.py store <path> [name] | history <name> | get <name> <out> [version]")
@@ -0,0 +1,60 @@
+import os
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+
+@pytest.fixture(autouse=True, scope="session")
+def _outside_repo(tmp_path_factory):
+    # The catalog modules open smartzip_catalog.db and compressed/ relative
+    # to the working directory, some at import time: keep them off the
+    # repo's own (tests import them inside test functions for this reason)
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("session"))
+    yield
+    os.chdir(cwd)
+
+
+def _reset():
+    import smartzip_backend
+    import smartzip_pack
+    from smartzip_decisions import flush_decisions
+    from smartzip_pool import close_pools
+    smartzip_pack.flush_small_files()
+    smartzip_pack._small_files.clear()
+    flush_decisions()
+    close_pools()
+    smartzip_backend._backend = None
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run the test in an empty directory with a fresh catalog."""
+    _reset()
+    monkeypatch.chdir(tmp_path)
+    import smartzip_catalog
+    smartzip_catalog.init_db()
+    yield tmp_path
+    _reset()
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def text(size, seed=0):
+    """Compressible, word-like bytes."""
+    import random
+    rng = random.Random(seed)
+    words = [bytes(rng.choice(b"abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 9)))
+             for _ in range(500)]
+    out = bytearray()
+    while len(out) < size:
+        out += rng.choice(words) + b" "
+    return bytes(out[:size])
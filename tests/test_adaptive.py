@@ -0,0 +1,30 @@
+def _decide(file_info, thresholds):
+    from smartzip_adaptive import adaptive_decision
+    return adaptive_decision(dict(file_info), thresholds, log=False)["algo"]
+
+
+def test_min_compress_mbps_comes_from_thresholds_or_tier(monkeypatch):
+    import compressors
+    import smartzip_adaptive
+    small = {"entropy": 4.0, "size": 500, "mime": "text/plain"}
+    thresholds = {"entropy_threshold": 3.5, "size_threshold": 5_000_000}
+    assert _decide(small, thresholds) == "brotli"
+
+    # The thresholds file floor swaps the slow pick for a registered fast codec
+    fast = _decide(small, {**thresholds, "min_compress_mbps": 100})
+    assert compressors.get_codec(fast).speed["compress_mbps"] >= 100
+
+    # A tier floor applies without any per-file or thresholds setting
+    monkeypatch.setitem(smartzip_adaptive.TIER_MIN_COMPRESS_MBPS, "cold", 100)
+    cold = _decide({**small, "tier": "cold"}, thresholds)
+    assert compressors.get_codec(cold).speed["compress_mbps"] >= 100
+
+
+def test_codec_constraints_see_plugin_codecs(monkeypatch):
+    import compressors
+    from smartzip_adaptive import apply_codec_constraints
+    plugin = compressors.CodecPlugin("quick", lambda d, **kw: d, lambda d, **kw: d,
+                                     speed={"compress_mbps": 5000, "decompress_mbps": 5000, "ratio": 0.01})
+    monkeypatch.setitem(compressors.CODECS, "quick", plugin)
+    assert apply_codec_constraints("quick", {}) == "quick"
+    assert apply_codec_constraints("lzma", {"min_compress_mbps": 1000}) == "quick"
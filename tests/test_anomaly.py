@@ -0,0 +1,55 @@
+import pytest
+
+
+def _entry(ratio=0.5, entropy=4.0, size=1000, algo="zstd"):
+    return {"compression_ratio": ratio, "entropy": entropy, "original_size": size, "algo": algo}
+
+
+def test_detectors_share_the_stored_state(workdir):
+    from smartzip_anomaly import OnlineAnomalyDetector, load_state
+    from smartzip_pool import reader, writer
+    # Two detectors stand in for two processes writing the same catalog
+    first, second = OnlineAnomalyDetector(), OnlineAnomalyDetector()
+    for i in range(10):
+        with writer("smartzip_catalog.db") as conn:
+            (first if i % 2 else second).observe(conn, _entry())
+    with reader("smartzip_catalog.db") as conn:
+        assert load_state(conn)["count"] == 10
+    assert second.state["count"] == 9 and first.state["count"] == 10
+
+
+def test_rolled_back_insert_leaves_state_and_listeners_alone(workdir):
+    from smartzip_anomaly import OnlineAnomalyDetector, load_state
+    from smartzip_pool import reader, writer
+    detector = OnlineAnomalyDetector()
+    heard = []
+    detector.subscribe(heard.append)
+    with writer("smartzip_catalog.db") as conn:
+        detector.observe(conn, _entry())
+
+    with pytest.raises(RuntimeError):
+        with writer("smartzip_catalog.db") as conn:
+            assert detector.observe(conn, _entry(ratio=0.01))
+            raise RuntimeError("insert failed")
+    assert heard == [] and detector.state["count"] == 1
+    with reader("smartzip_catalog.db") as conn:
+        assert load_state(conn)["count"] == 1
+        assert conn.execute("SELECT COUNT(*) FROM anomaly_events").fetchone() == (0,)
+
+    with writer("smartzip_catalog.db") as conn:
+        detector.observe(conn, _entry(ratio=0.01))
+        assert heard == []   # not before the commit
+    assert [e["kind"] for e in heard] == ["low_ratio"]
+
+
+def test_warnings_clear_after_the_window(workdir):
+    from smartzip_anomaly import OnlineAnomalyDetector, current_warnings, new_state
+    detector, state = OnlineAnomalyDetector(), new_state()
+    detector.update(state, _entry())
+    detector.update(state, _entry(ratio=0.01))
+    assert current_warnings(state, window=5) == ["⚠️ Very low compression ratios detected (<0.1)."]
+    for _ in range(4):
+        detector.update(state, _entry())
+    assert current_warnings(state, window=5) == ["⚠️ Very low compression ratios detected (<0.1)."]
+    detector.update(state, _entry())
+    assert current_warnings(state, window=5) == [] and state["low_ratio"] == 1
@@ -0,0 +1,72 @@
+import hashlib
+import sqlite3
+
+import pytest
+
+SHARDS = 4
+
+
+def _entry(i):
+    return {
+        "file_name": f"f{i}", "file_hash": hashlib.sha256(str(i).encode()).hexdigest(),
+        "mime_type": "text/plain", "algo": "zstd" if i % 2 else "lz4",
+        "original_size": 1000 + (i * 37) % 11, "compressed_size": 500,
+        "compression_ratio": 0.5, "entropy": None if i % 5 == 0 else float((i * 7) % 4),
+        "created_at": float(i),
+    }
+
+
+@pytest.fixture
+def sharded(workdir):
+    from smartzip_backend import ShardedSQLiteBackend
+    backend = ShardedSQLiteBackend(str(workdir / "shards"), shards=SHARDS)
+    yield backend
+    backend.close()
+
+
+def test_rows_route_by_hash_prefix_and_ids_encode_the_shard(sharded):
+    entries = [_entry(i) for i in range(40)]
+    ids = [sharded.insert(dict(e)) for e in entries[:20]] + sharded.insert_many([dict(e) for e in entries[20:]])
+    assert len(set(ids)) == len(ids)
+
+    for entry, file_id in zip(entries, ids):
+        shard = int(entry["file_hash"][:8], 16) % SHARDS
+        assert sharded.shard_for(entry["file_hash"]) == shard
+        assert sharded.split_id(file_id) == (shard, file_id // SHARDS)
+        assert sharded.global_id(shard, file_id // SHARDS) == file_id
+        # The row is in that shard's database under the local id, and nowhere else
+        for i, path in enumerate(sharded.paths):
+            conn = sqlite3.connect(path)
+            row = conn.execute("SELECT id FROM files WHERE file_hash=?", (entry["file_hash"],)).fetchone()
+            conn.close()
+            assert row == ((file_id // SHARDS,) if i == shard else None)
+        assert sharded.lookup(file_id)[1] == entry["file_name"]
+        assert sharded.lookup(entry["file_name"])[0] == file_id
+    assert len({sharded.split_id(i)[0] for i in ids}) > 1
+
+    found = sharded.lookup_many(ids[::3] + ["f7", "missing"])
+    assert {key: row[0] for key, row in found.items()} == {**{i: i for i in ids[::3]}, "f7": ids[7]}
+
+
+def test_shard_count_is_fixed_once_recorded(sharded):
+    from smartzip_backend import ShardedSQLiteBackend
+    with pytest.raises(ValueError):
+        ShardedSQLiteBackend(sharded.shard_dir, shards=SHARDS * 2)
+    again = ShardedSQLiteBackend(sharded.shard_dir)
+    assert again.shards == SHARDS
+    again.close()
+
+
+@pytest.mark.parametrize("order_by", ["entropy", "original_size", "file_name", "id"])
+@pytest.mark.parametrize("limit", [None, 7])
+def test_query_merges_shards_in_sqlite_order(sharded, order_by, limit):
+    from smartzip_backend import QUERY_COLUMNS
+    sharded.insert_many([_entry(i) for i in range(40)])
+    everything = sharded.query()
+    assert len(everything) == 40
+
+    k = QUERY_COLUMNS.index(order_by)
+    # SQLite's order: NULLs first, then by value, ties by id
+    expected = sorted(everything, key=lambda row: (row[k] is not None, row[k] or 0, row[0]))
+    expected = [row for row in expected if row[3] == "zstd"][:limit]
+    assert sharded.query({"algo": "zstd"}, order_by=order_by, limit=limit) == expected
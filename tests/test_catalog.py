@@ -0,0 +1,84 @@
+import json
+import os
+
+from conftest import text, write_file
+
+
+def _header(path):
+    from smartzip_blob import read_header
+    with open(path, "rb") as f:
+        return read_header(f)
+
+
+def test_dedup_row_describes_the_stored_blob(workdir, monkeypatch):
+    import smartzip_catalog
+    from smartzip_catalog import get, store
+    path = write_file(workdir / "a.txt", text(50_000))
+    first, blob = smartzip_catalog.compress_file(path, tier="hot")
+    smartzip_catalog.log_to_catalog(first)
+    stored = open(blob, "rb").read()
+
+    # Same content under a tier that would pick another codec: no new compression
+    def no_compress(*args, **kwargs):
+        raise AssertionError("dedup hit compressed the data again")
+    with monkeypatch.context() as patch:
+        patch.setattr(smartzip_catalog, "compress_blob", no_compress)
+        second, same_blob = store(path)
+
+    header = _header(blob)
+    assert same_blob == blob and open(blob, "rb").read() == stored
+    for entry in (first, second):
+        assert entry["algo"] == header["codec"]
+        assert json.loads(entry["codec_params"]) == header["params"]
+        assert entry["compressed_size"] == os.path.getsize(blob)
+    assert open(get(second["id"], str(workdir / "out")), "rb").read() == open(path, "rb").read()
+
+
+def test_recorded_choice_matches_the_blob(workdir):
+    import smartzip_catalog
+    from smartzip_pool import reader
+    from smartzip_replay import HISTORY_SQL, recorded_choice
+    path = write_file(workdir / "b.txt", text(20_000, seed=1))
+    for tier in ("hot", "cold"):
+        entry, blob = smartzip_catalog.compress_file(path, tier=tier)
+        smartzip_catalog.log_to_catalog(entry)
+
+    header = _header(blob)
+    with reader() as conn:
+        rows = conn.execute(HISTORY_SQL).fetchall()
+    assert [recorded_choice(row) for row in rows] == [(header["codec"], header["params"])] * 2
+
+
+def test_get_many_charges_whole_decodes(workdir, monkeypatch):
+    import smartzip_catalog
+    from smartzip_blob import BLOCK_SIZE, blob_path
+    from smartzip_catalog import STREAM_RESIDENT, get_many, store
+    from smartzip_versions import store_version
+    records = b"".join(b'{"id": %d, "level": "info", "ms": %d}\n' % (i, i % 97) for i in range(5000))
+    columnar, _ = store(write_file(workdir / "log.jsonl", records))
+    assert columnar["algo"] == "columnar"
+    plain, _ = store(write_file(workdir / "plain.txt", text(3 * BLOCK_SIZE)))
+    data = text(300_000, seed=1)
+    base, _ = store_version(write_file(workdir / "doc.txt", data))
+    delta, _ = store_version(write_file(workdir / "doc.txt", data + b"more"))
+    assert delta["algo"] == "zstd-delta"
+
+    resident = {}
+    real_restore_jobs = smartzip_catalog._restore_jobs
+
+    def spy(*args):
+        key_out, jobs = real_restore_jobs(*args)
+        for job in jobs:
+            resident[os.path.basename(job[2][0])[:64]] = job[1]
+        return key_out, jobs
+    with monkeypatch.context() as patch:
+        patch.setattr(smartzip_catalog, "_restore_jobs", spy)
+        ids = [columnar["id"], plain["id"], delta["id"]]
+        key_out = get_many(ids, str(workdir / "out"), memory_cap=STREAM_RESIDENT)
+
+    assert resident[plain["file_hash"]] == STREAM_RESIDENT
+    assert resident[columnar["file_hash"]] >= len(records)
+    base_blob = os.path.getsize(blob_path(base["file_hash"]))
+    assert resident[delta["file_hash"]] == STREAM_RESIDENT + base_blob + len(data)
+    assert open(key_out[columnar["id"]], "rb").read() == records
+    assert open(key_out[delta["id"]], "rb").read() == data + b"more"
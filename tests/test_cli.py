@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+from conftest import REPO, text
+
+CLI = os.path.join(REPO, "smartzip_cli.py")
+
+
+def _run(args, data, cwd):
+    return subprocess.run([sys.executable, CLI, *args], input=data, cwd=cwd,
+                          capture_output=True, check=True)
+
+
+def test_compress_decompress_round_trip_through_pipes(tmp_path):
+    data = text(300_000) + os.urandom(50_000) + text(100_000, seed=1)
+    for args in ([], ["-a", "zstd", "-l", "3"], ["-T", "2"]):
+        packed = _run(["compress", "-B", "65536", *args], data, tmp_path)
+        assert packed.stderr == b"" and 0 < len(packed.stdout) < len(data)
+        restored = _run(["decompress", "-T", "2", "-v"], packed.stdout, tmp_path)
+        assert restored.stdout == data
+        assert b"Error" not in restored.stderr
+        assert f"{len(packed.stdout) / 1e6:.2f} MB".encode() in restored.stderr
+
+    # Pipelines leave no catalog (or decision rows) behind
+    assert os.listdir(tmp_path) == []
+
+
+def test_file_arguments(tmp_path):
+    src = tmp_path / "in.bin"
+    src.write_bytes(text(100_000))
+    _run(["compress", str(src), "-o", str(tmp_path / "in.szs")], b"", tmp_path)
+    _run(["decompress", str(tmp_path / "in.szs"), "-o", str(tmp_path / "out.bin")], b"", tmp_path)
+    assert (tmp_path / "out.bin").read_bytes() == src.read_bytes()
@@ -0,0 +1,73 @@
+import json
+import time
+
+import pytest
+
+from conftest import write_file
+
+
+def _records(n, newline="\n"):
+    return newline.join(json.dumps({"id": 1000 + i, "level": ["info", "warn", "error"][i % 3],
+                                    "msg": f"request {i * 7919 % 104729} served", "ms": i % 97})
+                        for i in range(n)).encode() + newline.encode()
+
+
+def _csv_with_quoted_newlines(n):
+    rows = ["id,name,note"]
+    for i in range(n):
+        note = f'"line one\nline ""two"" of {i}"' if i % 5 == 0 else f"plain {i % 13}"
+        rows.append(f"{i},user{i % 50},{note}")
+    return "\r\n".join(rows).encode()
+
+
+def _mode(blob):
+    from smartzip_blob import parse_header
+    from smartzip_columnar import MAGIC
+    buf = open(blob, "rb").read()
+    header = parse_header(buf)
+    assert header["codec"] == "columnar"
+    return buf[header["header_size"] + len(MAGIC)]
+
+
+@pytest.mark.parametrize("name, data, shredded", [
+    ("crlf.jsonl", _records(3000, "\r\n"), True),
+    ("quoted.csv", _csv_with_quoted_newlines(4000), True),
+    ("latin1.csv", _csv_with_quoted_newlines(4000).replace(b"user", b"\xe9l\xe8ve"), False),
+], ids=["crlf", "quoted-newlines", "non-utf8"])
+def test_columnar_rebuilds_exact_bytes(workdir, name, data, shredded):
+    from smartzip_catalog import get, store
+    from smartzip_columnar import MODE_LINES, MODE_RAW
+    path = write_file(workdir / name, data)
+    entry, blob = store(path)
+    assert entry["algo"] == "columnar"
+    assert _mode(blob) == (MODE_LINES if shredded else MODE_RAW)
+    assert open(get(entry["id"], str(workdir / ("out-" + name))), "rb").read() == data
+
+
+def test_empty_input_round_trips(workdir):
+    from smartzip_catalog import get, store
+    from smartzip_columnar import compress_columnar, decompress_columnar
+    from smartzip_pack import flush_small_files
+    for fmt in ("ndjson", "csv"):
+        assert decompress_columnar(compress_columnar(b"", fmt)) == b""
+    entry, _ = store(write_file(workdir / "empty.jsonl", b""))
+    flush_small_files()
+    assert open(get(entry["id"], str(workdir / "out.jsonl")), "rb").read() == b""
+
+
+def test_single_line_array_is_not_shredded(workdir):
+    from smartzip_adaptive import columnar_format
+    from smartzip_catalog import get, store
+    from smartzip_columnar import MAGIC, MODE_RAW, compress_columnar
+    data = json.dumps([{"id": i, "v": i * 3 % 17} for i in range(20_000)]).encode()
+    assert columnar_format({"name": "array.json", "size": len(data), "lines": data.count(b"\n")}) is None
+
+    # Called directly, the codec falls back to a raw container without the stream trials
+    started = time.monotonic()
+    packed = compress_columnar(data)
+    assert packed[len(MAGIC)] == MODE_RAW
+    assert time.monotonic() - started < 10
+
+    entry, _ = store(write_file(workdir / "array.json", data))
+    assert entry["algo"] != "columnar"
+    assert open(get(entry["id"], str(workdir / "out.json")), "rb").read() == data
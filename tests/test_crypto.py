@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from conftest import text, write_file
+
+pytest.importorskip("cryptography")
+
+
+@pytest.fixture
+def keyring(workdir, monkeypatch):
+    from smartzip_crypto import KEYRING_ENV, create_key
+    monkeypatch.setenv(KEYRING_ENV, str(workdir / "keys.json"))
+    return create_key("k1")
+
+
+def test_encrypted_get_range(workdir, keyring):
+    from smartzip_blob import BLOCK_SIZE, blob_path, read_header
+    from smartzip_catalog import get_range, store
+    from smartzip_crypto import clear_data_keys
+    data = text(3 * BLOCK_SIZE + 12345) + os.urandom(4000)
+    entry, blob = store(write_file(workdir / "secret.txt", data), key_id=keyring)
+    assert entry["key_id"] == keyring and blob == blob_path(entry["file_hash"])
+    clear_data_keys()  # unwrap from the keyring, not the cache
+
+    for offset, length in [(0, 10), (BLOCK_SIZE - 5, 10), (2 * BLOCK_SIZE + 7, BLOCK_SIZE + 100),
+                           (len(data) - 50, 500), (len(data) + 1, 10)]:
+        assert get_range(entry["id"], offset, length) == data[offset:offset + length]
+    assert get_range(entry["file_hash"], 100, 50) == data[100:150]
+
+    # No plain digest of the data in the header
+    from smartzip_blob import checksum_func
+    with open(blob, "rb") as f:
+        header = read_header(f)
+    plain = checksum_func(header["checksum"])(data[:BLOCK_SIZE])
+    assert plain not in header["data_digests"]
+
+
+def test_data_key_cache_is_bounded(workdir, keyring, monkeypatch):
+    import smartzip_crypto
+    monkeypatch.setattr(smartzip_crypto, "DATA_KEY_CACHE_SIZE", 4)
+    envelopes = [smartzip_crypto.new_envelope(keyring) for _ in range(10)]
+    assert len(smartzip_crypto._data_keys) == 4
+    # Evicted keys are unwrapped again from the keyring
+    assert len(smartzip_crypto.open_envelope(envelopes[0])) == smartzip_crypto.KEY_SIZE
+
+
+def test_encrypting_a_stored_blob_updates_its_rows(workdir, keyring):
+    from smartzip_blob import read_header
+    from smartzip_catalog import get, store
+    from smartzip_pool import reader
+    data = text(200_000)
+    path = write_file(workdir / "doc.txt", data)
+    plain, blob = store(path)
+    with reader("smartzip_catalog.db") as conn:
+        assert conn.execute("SELECT COUNT(*) FROM block_blooms WHERE file_hash=?", (plain["file_hash"],)).fetchone()[0]
+
+    secret, same_blob = store(path, key_id=keyring)
+    assert same_blob == blob
+    with open(blob, "rb") as f:
+        header = read_header(f)
+    size = os.path.getsize(blob)
+    with reader("smartzip_catalog.db") as conn:
+        rows = conn.execute("SELECT id, algo, compressed_size, key_id FROM files ORDER BY id").fetchall()
+        blooms = conn.execute("SELECT COUNT(*) FROM block_blooms WHERE file_hash=?", (plain["file_hash"],)).fetchone()
+    # Both rows describe the encrypted blob, and no plaintext filters remain
+    assert rows == [(plain["id"], header["codec"], size, keyring), (secret["id"], header["codec"], size, keyring)]
+    assert blooms == (0,)
+    for entry in (plain, secret):
+        assert open(get(entry["id"], str(workdir / f"out{entry['id']}")), "rb").read() == data
+
+
+def test_get_many_charges_an_encrypted_window(workdir, keyring):
+    from smartzip_blob import BLOCK_SIZE, blob_path
+    from smartzip_catalog import STREAM_RESIDENT, _blob_resident, get_many, store
+    data = text(6 * BLOCK_SIZE)
+    entry, blob = store(write_file(workdir / "secret.txt", data), key_id=keyring)
+    window = min(len(data), (os.cpu_count() or 1) * BLOCK_SIZE)
+    assert _blob_resident(blob) == 2 * window + STREAM_RESIDENT
+    out = get_many([entry["id"]], str(workdir / "out"), memory_cap=1)[entry["id"]]
+    assert open(out, "rb").read() == data
@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+
+def test_blocked_producer_is_rejected_after_close(workdir):
+    from smartzip_decisions import DecisionLogger
+    logger = DecisionLogger(max_queue=2, overflow="block", batch_size=100, flush_interval=60,
+                            flush_on_exit=False)
+    # No writer thread, so the queue stays full
+    logger._start = lambda: None
+    written = []
+    logger._write = written.extend
+    logger.log("a", {})
+    logger.log("b", {})
+    errors = []
+
+    def producer():
+        try:
+            logger.log("c", {})
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=producer)
+    thread.start()
+    thread.join(0.2)
+    assert thread.is_alive()  # blocked on the full queue
+    logger.close()
+    thread.join(5)
+    assert errors and logger.pending() == 0
+    assert len(written) == 2  # the queued rows, not the rejected one
+    with pytest.raises(RuntimeError):
+        logger.log("d", {})
+
+
+def test_replaced_logger_is_released(workdir):
+    import gc
+    import weakref
+    import smartzip_decisions
+    old = weakref.ref(smartzip_decisions.DECISION_LOGGER)
+    smartzip_decisions.configure_decision_logger()
+    gc.collect()
+    assert old() is None
+
+
+def test_flush_waits_for_the_writer_batch(workdir):
+    import time
+    from smartzip_decisions import DecisionLogger
+    logger = DecisionLogger(batch_size=5, flush_interval=60, flush_on_exit=False)
+    written, writers = [], set()
+
+    def slow_write(batch):
+        writers.add(threading.current_thread().name)
+        time.sleep(0.2)
+        written.extend(batch)
+    logger._write = slow_write
+    for i in range(12):
+        logger.log(f"f{i}", {})
+    assert logger.flush(timeout=10)
+    assert len(written) == 12 and logger.pending() == 0
+    # Only the writer thread took batches while it was alive
+    assert writers == {"smartzip-decision-writer"}
+    logger.close()
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+import smartzip_filters
+
+TYPESIZES = sorted(smartzip_filters.ARRAY_CODES)
+# Empty, shorter than one element, whole groups, and ragged tails
+SIZES = [0, 1, 7, 64, 64 * 8 + 3, 4093]
+
+
+@pytest.fixture(params=["numpy", "pure"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        if smartzip_filters.np is None:
+            pytest.skip("numpy not installed")
+    else:
+        monkeypatch.setattr(smartzip_filters, "np", None)
+    return request.param
+
+
+@pytest.mark.parametrize("name", sorted(smartzip_filters.FILTERS))
+@pytest.mark.parametrize("typesize", TYPESIZES)
+def test_filters_round_trip(backend, name, typesize):
+    forward, inverse = smartzip_filters.FILTERS[name]
+    for size in SIZES:
+        data = os.urandom(size)
+        if name == "bitshuffle" and backend == "pure":
+            with pytest.raises(RuntimeError):
+                forward(data, typesize)
+            continue
+        out = forward(data, typesize)
+        assert len(out) == size
+        assert inverse(out, typesize) == data, (name, typesize, size)
+
+
+@pytest.mark.parametrize("name", ["shuffle", "delta", "xor"])
+def test_numpy_and_pure_python_filters_agree(monkeypatch, name):
+    if smartzip_filters.np is None:
+        pytest.skip("numpy not installed")
+    forward, _ = smartzip_filters.FILTERS[name]
+    data = os.urandom(4093)
+    expected = {ts: forward(data, ts) for ts in TYPESIZES}
+    monkeypatch.setattr(smartzip_filters, "np", None)
+    assert {ts: forward(data, ts) for ts in TYPESIZES} == expected
+
+
+def test_chain_round_trip_over_blocks(backend):
+    data = os.urandom(10_001)
+    for chain in smartzip_filters.candidate_chains():
+        filtered, spec = smartzip_filters.apply_filters(data, chain, block_size=4096)
+        assert smartzip_filters.undo_filters(filtered, spec) == data
+        chunks = [filtered[i:i + 1000] for i in range(0, len(filtered), 1000)]
+        assert b"".join(smartzip_filters.unfilter_stream(chunks, spec)) == data
+
+
+def _pe(machine, e_lfanew=0x80):
+    head = bytearray(b"MZ" + bytes(e_lfanew - 2))
+    head[60:64] = e_lfanew.to_bytes(4, "little")
+    return bytes(head) + b"PE\0\0" + machine.to_bytes(2, "little") + bytes(64)
+
+
+def test_pe_machine_field_decides_x86():
+    assert smartzip_filters.is_x86_executable(_pe(0x14C))
+    assert smartzip_filters.is_x86_executable(_pe(0x8664))
+    assert not smartzip_filters.is_x86_executable(_pe(0xAA64))   # arm64
+    assert not smartzip_filters.is_x86_executable(b"MZ" + os.urandom(200))
+    assert not smartzip_filters.is_x86_executable(b"MZ")
@@ -0,0 +1,35 @@
+import json
+import os
+
+from conftest import text, write_file
+
+
+def _counts(summary):
+    return {k: summary[k] for k in ("scanned", "stored", "unchanged", "failed")}
+
+
+def test_store_tree_skips_unchanged_files_on_rerun(workdir):
+    from smartzip_catalog import get
+    from smartzip_ingest import store_tree
+    root = workdir / "tree"
+    files = {f"d{i % 3}/f{i}.txt": text(300 + 1500 * i, seed=i) for i in range(8)}
+    for rel, data in files.items():
+        write_file(root / rel, data)
+
+    first = store_tree(str(root), workers=2)
+    assert _counts(first) == {"scanned": 8, "stored": 8, "unchanged": 0, "failed": 0}
+    assert _counts(store_tree(str(root), workers=2)) == {"scanned": 8, "stored": 0, "unchanged": 8, "failed": 0}
+
+    # A rewritten file (new size and mtime) is stored again, the rest are not
+    changed = root / "d1" / "f1.txt"
+    write_file(changed, b"changed " * 100)
+    os.utime(changed, ns=(10**18, 10**18))
+    third = store_tree(str(root), workers=2)
+    assert _counts(third) == {"scanned": 8, "stored": 1, "unchanged": 7, "failed": 0}
+
+    with open(third["manifest"]) as f:
+        stored = [line for line in map(json.loads, f) if line["status"] == "stored"]
+    assert [line["path"] for line in stored] == [os.path.join("d1", "f1.txt")]
+    out = get(stored[0]["file_id"], str(workdir / "restored"))
+    with open(out, "rb") as f:
+        assert f.read() == b"changed " * 100
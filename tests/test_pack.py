@@ -0,0 +1,65 @@
+import os
+
+from conftest import text, write_file
+
+
+def test_small_files_round_trip_through_packs(workdir):
+    from smartzip_catalog import get
+    from smartzip_pack import SMALL_FILE_SIZE, store_small_files
+    paths = [write_file(workdir / "in" / f"f{i}.txt", text(100 + 97 * i, seed=i)) for i in range(30)]
+    entries = store_small_files(paths, block_size=1024)
+    os.makedirs(workdir / "out")
+
+    assert len(entries) == len(paths)
+    assert all(e["original_size"] < SMALL_FILE_SIZE for e in entries)
+    assert len(os.listdir(workdir / "compressed" / "packs")) == 1
+    for path in paths:
+        entry = next(e for e in entries if e["file_name"] == os.path.basename(path))
+        out = get(entry["id"], str(workdir / "out" / entry["file_name"]))
+        with open(out, "rb") as f, open(path, "rb") as g:
+            assert f.read() == g.read()
+
+
+def test_store_queues_small_files_into_shared_blocks(workdir):
+    from smartzip_blob import BLOB_DIR
+    from smartzip_catalog import get, store
+    from smartzip_pack import encode_block, flush_small_files
+    from smartzip_pool import reader
+    tiny = write_file(workdir / "tiny.txt", b"tiny\n")
+    other = write_file(workdir / "other.txt", text(2000))
+    first, pack = store(tiny)
+    second, same_pack = store(other)
+    # Nothing is written until the block is sealed
+    assert pack is None and same_pack is None and "id" not in first
+    os.remove(tiny)   # queued contents were read by store()
+    flush_small_files()
+
+    assert first["pack"] == second["pack"] and first["pack"].endswith(".szp")
+    assert not os.path.exists(BLOB_DIR)
+    with reader("smartzip_catalog.db") as conn:
+        blocks = conn.execute("SELECT DISTINCT pack_id, block_offset, block_length FROM pack_members").fetchall()
+    assert len(blocks) == 1
+    # One shared block is smaller than a block per file
+    members = [(tiny, "tiny.txt", None), (other, "other.txt", None)]
+    contents = [b"tiny\n", open(other, "rb").read()]
+    alone = sum(len(encode_block([m], [c])["block"]) for m, c in zip(members, contents))
+    assert blocks[0][2] < alone
+    assert open(get(first["id"], str(workdir / "r1")), "rb").read() == b"tiny\n"
+    assert open(get(second["id"], str(workdir / "r2")), "rb").read() == open(other, "rb").read()
+
+
+def test_small_file_queue_seals_at_the_member_limit(workdir):
+    from smartzip_pack import SmallFileQueue
+    from smartzip_pool import reader
+    queue = SmallFileQueue(max_members=3)
+    entries = [queue.add(write_file(workdir / f"f{i}.txt", text(50, seed=i)), ttl=60) for i in range(4)]
+
+    assert [("id" in e) for e in entries] == [True, True, True, False]
+    assert entries[0]["pack"] == queue.packer.pack_path
+    queue.flush()
+    with reader("smartzip_catalog.db") as conn:
+        rows = conn.execute("SELECT f.id, f.expires_at - f.created_at, m.block_offset FROM files f "
+                            "JOIN pack_members m ON m.file_id = f.id ORDER BY f.id").fetchall()
+    assert [r[0] for r in rows] == [e["id"] for e in entries]
+    assert all(r[1] == 60 for r in rows)
+    assert rows[0][2] == rows[2][2] != rows[3][2]
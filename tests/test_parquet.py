@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+
+
+def test_anomaly_summary_matches_the_dataframe_check(workdir):
+    import pandas as pd
+    from smartzip_dashboard import check_anomalies, check_anomaly_summary
+    from smartzip_parquet import anomaly_summary, export_catalog
+    from smartzip_pool import reader, writer
+    rows = []
+    for i in range(60):
+        rows.append((f"f{i}", ["zstd", "lz4", "zstd", "brotli"][i % 4 if i < 30 else 0],
+                     1000 + i * 10 + (8_000_000 if i == 45 else 0),
+                     0.05 if i == 12 else 0.4 + (i % 5) / 100,
+                     7.9 if i == 50 else 4.0 + (i % 3) / 10,
+                     1_700_000_000 + i * 86400 / 7))
+    with writer("smartzip_catalog.db") as conn:
+        conn.executemany("""
+            INSERT INTO files (file_name, algo, original_size, compression_ratio, entropy, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+    export_catalog(out_dir=str(workdir / "mirror"), batch_size=17)
+
+    def frame(sql_filter="1"):
+        with reader("smartzip_catalog.db") as conn:
+            df = pd.read_sql_query("SELECT id, algo AS algorithm, original_size, compression_ratio, entropy "
+                                   f"FROM files WHERE {sql_filter} ORDER BY id", conn)
+        return df
+
+    summary = anomaly_summary(out_dir=str(workdir / "mirror"))
+    assert summary["rows"] == 60
+    assert check_anomaly_summary(summary) == check_anomalies(frame())
+    assert len(check_anomalies(frame())) == 4
+
+    # Filters are pushed down to the scan
+    cases = [({"algo": "zstd"}, "algo = 'zstd'"),
+             ({"ratio>": 0.1, "size<": 2000}, "compression_ratio > 0.1 AND original_size < 2000")]
+    for filters, sql in cases:
+        expected = check_anomalies(frame(sql))
+        assert expected and expected != ["Not enough data for anomaly detection."]
+        assert check_anomaly_summary(anomaly_summary(filters, out_dir=str(workdir / "mirror"))) == expected
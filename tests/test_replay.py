@@ -0,0 +1,51 @@
+from conftest import text, write_file
+
+
+def test_policies_start_from_current_or_historical_thresholds(workdir, monkeypatch):
+    import smartzip_replay
+    from smartzip_adaptive import get_thresholds
+    from smartzip_catalog import store
+    from smartzip_pool import writer
+    with writer() as conn:
+        conn.execute("""
+            INSERT INTO decisions (file_name, algo, entropy, size, entropy_threshold, size_threshold, timestamp)
+            VALUES ('old', 'zstd', 4.0, 100, 1.25, 123, 1.0)
+        """)
+    store(write_file(workdir / "a.txt", text(20_000)))
+
+    bases = {}
+    replay_thresholds = smartzip_replay.replay_thresholds
+
+    def spy(history, policy, base, wanted):
+        bases[policy["name"]] = base
+        return replay_thresholds(history, policy, base, wanted)
+    monkeypatch.setattr(smartzip_replay, "replay_thresholds", spy)
+    report = smartzip_replay.replay(cache_file=str(workdir / "cache.db"))
+
+    assert set(report) == {"recorded", "current", "historical", "recalibrated"}
+    assert all(r["objects"] == 1 for r in report.values())
+    assert bases["current"] == get_thresholds()
+    for name in ("historical", "recalibrated"):
+        assert (bases[name]["entropy_threshold"], bases[name]["size_threshold"]) == (1.25, 123)
+
+
+def test_recorded_deltas_are_measured_against_their_base(workdir):
+    import os
+    from smartzip_blob import blob_path
+    from smartzip_replay import replay
+    from smartzip_versions import store_version
+    data = text(60_000)
+    path = write_file(workdir / "doc.txt", data)
+    first, _ = store_version(path)
+    write_file(path, data[:30_000] + b"an edit" + data[30_000:])
+    delta, _ = store_version(path)
+    assert delta["algo"] == "zstd-delta"
+
+    report = replay(cache_file=str(workdir / "cache.db"))
+    # Every policy is summarized over the same two objects
+    assert {name: (r["objects"], r["errors"]) for name, r in report.items()} == {
+        name: (2, 0) for name in ("recorded", "current", "historical", "recalibrated")}
+    assert report["recorded"]["codecs"]["zstd-delta"] == 1
+    # ... and the recorded sizes are the stored blobs' sizes
+    blobs = {entry["file_hash"] for entry in (first, delta)}
+    assert report["recorded"]["stored_bytes"] == sum(os.path.getsize(blob_path(h)) for h in blobs)
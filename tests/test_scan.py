@@ -0,0 +1,56 @@
+import re
+
+import pytest
+
+from conftest import text, write_file
+
+
+@pytest.fixture
+def stored(workdir):
+    """{file id: original data} for blobs spanning several blocks, a packed file and a duplicate."""
+    from smartzip_blob import BLOCK_SIZE
+    from smartzip_catalog import store
+    from smartzip_pack import flush_small_files
+    big = bytearray(text(2 * BLOCK_SIZE + 300_000))
+    # Needles inside blocks and straddling both block boundaries
+    for pos in (10, 5000, BLOCK_SIZE - 4, 2 * BLOCK_SIZE - 9, len(big) - 20):
+        big[pos:pos + 11] = b"needle-4242"
+    files = {
+        "big.txt": bytes(big),
+        "copy.txt": bytes(big),            # shares big.txt's blob
+        "plain.txt": text(200_000, seed=3),
+        "small.txt": b"a small needle-7 file\n",   # packed
+    }
+    entries = [(store(write_file(workdir / name, data))[0], data) for name, data in files.items()]
+    flush_small_files()
+    return {entry["id"]: data for entry, data in entries}
+
+
+def _brute_force(stored, pattern, flags=0):
+    regex = re.compile(pattern, flags)
+    return sorted((file_id, m.start()) for file_id, data in stored.items() for m in regex.finditer(data))
+
+
+@pytest.mark.parametrize("pattern, flags", [
+    (rb"needle-\d+", 0),
+    (rb"le-42", 0),
+    (rb"(?:zzqq|needle)-7", 0),
+    (rb"NEEDLE-4", re.IGNORECASE),
+    (rb"\bab\w", 0),
+    (rb"no such text anywhere", 0),
+])
+def test_scan_matches_brute_force(stored, pattern, flags):
+    from smartzip_scan import scan
+    expected = _brute_force(stored, pattern, flags)
+    assert scan(pattern, flags=flags) == expected
+    assert scan(pattern, flags=flags, workers=1) == expected
+
+
+def test_scan_filters_by_catalog_metadata(stored):
+    from smartzip_catalog import query
+    from smartzip_scan import scan
+    algos = {row[0]: row[3] for row in query()}
+    small_id = next(i for i, data in stored.items() if data.startswith(b"a small"))
+    same_algo = {i: data for i, data in stored.items() if algos[i] == algos[small_id]}
+    assert scan(rb"needle-\d+", {"algo": algos[small_id]}) == _brute_force(same_algo, rb"needle-\d+")
+    assert scan(rb"needle-\d+", {"mime_type": "application/json"}) == []
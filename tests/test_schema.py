@@ -0,0 +1,85 @@
+import os
+import shutil
+import sqlite3
+
+from conftest import REPO
+
+BASELINE_DB = os.path.join(REPO, "smartzip_catalog.db")
+
+
+def _snapshot(conn):
+    return conn.execute("SELECT id, file_name, file_hash, algo, original_size, compressed_size, entropy "
+                        "FROM files ORDER BY id").fetchall()
+
+
+def test_baseline_catalog_migrates_to_current_version(workdir):
+    from smartzip_schema import SCHEMA_VERSION, connect, schema_version
+    db_file = str(workdir / "baseline.db")
+    shutil.copy(BASELINE_DB, db_file)
+    with sqlite3.connect(db_file) as conn:
+        assert schema_version(conn) == 0
+        before = _snapshot(conn)
+    assert before
+
+    conn = connect(db_file)
+    try:
+        assert schema_version(conn) == SCHEMA_VERSION == 9
+        assert _snapshot(conn) == before
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(files)")}
+        assert {"codec_params", "tier", "accessed_at", "key_id", "expires_at"} <= columns
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        assert {"decisions", "packs", "pack_members", "tree_files", "file_versions", "block_blooms"} <= tables
+        # The legacy table became a view over files
+        assert conn.execute("SELECT type FROM sqlite_master WHERE name='catalog'").fetchone() == ("view",)
+        assert conn.execute("SELECT COUNT(*) FROM catalog").fetchone() == (len(before),)
+    finally:
+        conn.close()
+
+    # Reopening is a no-op
+    conn = connect(db_file)
+    assert schema_version(conn) == SCHEMA_VERSION and _snapshot(conn) == before
+    conn.close()
+
+
+def test_legacy_catalog_variants_keep_their_rows(workdir):
+    from smartzip_schema import connect
+    files_db, decisions_db = str(workdir / "files.db"), str(workdir / "decisions.db")
+    with sqlite3.connect(files_db) as conn:
+        conn.execute("CREATE TABLE catalog (id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT, filehash TEXT, "
+                     "algo TEXT, original_size INTEGER, compressed_size INTEGER, "
+                     "timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+        conn.executemany("INSERT INTO catalog (filename, filehash, algo, original_size, compressed_size, timestamp) "
+                         "VALUES (?, ?, ?, ?, ?, ?)",
+                         [("a.txt", "aa", "zstd", 100, 40, "2024-01-02 03:04:05"),
+                          ("b.bin", "bb", "lz4", 200, 150, 1700000000.5)])
+    with sqlite3.connect(decisions_db) as conn:
+        conn.execute("CREATE TABLE catalog (id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT, filetype TEXT, "
+                     "algorithm TEXT, entropy REAL, original_size INTEGER, compressed_size INTEGER, "
+                     "compression_ratio REAL, entropy_threshold REAL, size_threshold REAL, "
+                     "timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+        conn.executemany("INSERT INTO catalog (filename, filetype, algorithm, entropy, original_size, "
+                         "compressed_size, compression_ratio, entropy_threshold, size_threshold, timestamp) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         [("c.log", "text/plain", "brotli", 4.2, 300, 90, 0.3, 3.5, 5e6, "2024-01-02 03:04:05"),
+                          ("d.log", "text/plain", "gzip", 2.0, 400, 80, 0.2, 3.5, 5e6, 1700000000)])
+
+    conn = connect(files_db)
+    try:
+        assert conn.execute("SELECT file_name, file_hash, algo, original_size, compressed_size, created_at "
+                            "FROM files ORDER BY file_name").fetchall() == [
+            ("a.txt", "aa", "zstd", 100, 40, 1704164645.0),
+            ("b.bin", "bb", "lz4", 200, 150, 1700000000.5)]
+        assert conn.execute("SELECT COUNT(*) FROM decisions").fetchone() == (0,)
+    finally:
+        conn.close()
+
+    conn = connect(decisions_db)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM files").fetchone() == (0,)
+        assert conn.execute("SELECT file_name, algo, entropy, size, entropy_threshold, size_threshold, timestamp "
+                            "FROM decisions ORDER BY file_name").fetchall() == [
+            ("c.log", "brotli", 4.2, 300, 3.5, 5e6, 1704164645.0),
+            ("d.log", "gzip", 2.0, 400, 3.5, 5e6, 1700000000)]
+        assert conn.execute("SELECT type FROM sqlite_master WHERE name='catalog'").fetchone() == ("view",)
+    finally:
+        conn.close()
@@ -0,0 +1,19 @@
+def test_files_page_walks_every_row_once(workdir):
+    from catalog_stats import files_page
+    from smartzip_pool import reader, writer
+    with writer("smartzip_catalog.db") as conn:
+        conn.executemany("INSERT INTO files (file_name, algo) VALUES (?, ?)",
+                         [(f"f{i}", "zstd" if i % 3 else "lz4") for i in range(25)])
+    with reader("smartzip_catalog.db") as conn:
+        for algo in (None, "zstd", "lz4"):
+            expected = [r[0] for r in conn.execute(
+                "SELECT id FROM files WHERE ? IS NULL OR algo = ? ORDER BY id DESC", (algo, algo))]
+            seen, before_id = [], None
+            while True:
+                rows = files_page(conn, before_id=before_id, page_size=4, algo=algo)
+                if not rows:
+                    break
+                assert len(rows) <= 4
+                seen += [r[0] for r in rows]
+                before_id = rows[-1][0]
+            assert seen == expected
@@ -0,0 +1,54 @@
+import threading
+import time
+
+from conftest import text, write_file
+
+
+def test_recompactor_never_asks_for_codec_threads(workdir, monkeypatch):
+    import smartzip_adaptive
+    import smartzip_tiering
+    from smartzip_catalog import get, store
+    from smartzip_tiering import Recompactor
+    # Past brotli's size limit, so the cold tier picks zstd
+    data = text(1_500_000)
+    entry, _ = store(write_file(workdir / "a.txt", data))
+    # Every size counts as large enough for multithreaded compression
+    monkeypatch.setattr(smartzip_adaptive, "PARALLEL_MIN_SIZE", 0)
+    calls = []
+    compress_blob = smartzip_tiering.compress_blob
+
+    def spy(data, algo, params=None, **kwargs):
+        calls.append(dict(params or {}))
+        return compress_blob(data, algo, params, **kwargs)
+    monkeypatch.setattr(smartzip_tiering, "compress_blob", spy)
+
+    assert Recompactor(cold_after=-1, cpu_budget=100).run_once() == 1
+    assert calls and all("threads" not in params for params in calls)
+    assert smartzip_adaptive.choose_params("zstd", {"size": len(data), "tier": "cold"})["threads"] == -1
+    assert open(get(entry["id"], str(workdir / "out")), "rb").read() == data
+
+
+def test_throttle_counts_cpu_of_worker_threads(workdir, monkeypatch):
+    import smartzip_tiering
+    from smartzip_catalog import store
+    from smartzip_tiering import Recompactor
+    store(write_file(workdir / "a.txt", text(10_000)))
+
+    def burn(seconds):
+        started = time.thread_time()
+        while time.thread_time() - started < seconds:
+            pass
+
+    def recompact_on_a_worker(row, db_file):
+        worker = threading.Thread(target=burn, args=(0.3,))
+        worker.start()
+        worker.join()
+        return 100, 50
+    monkeypatch.setattr(smartzip_tiering, "recompact_blob", recompact_on_a_worker)
+
+    recompactor = Recompactor(cold_after=-1, cpu_budget=0.5)
+    pauses = []
+    monkeypatch.setattr(recompactor._stop, "wait", pauses.append)
+    assert recompactor.run_once() == 1
+    # 0.3 CPU seconds at half a core: about 0.3 s more of wall time
+    assert len(pauses) == 1 and pauses[0] > 0.15
@@ -0,0 +1,69 @@
+import os
+
+from conftest import text, write_file
+
+
+def _edits(data, count):
+    """`count` successive small edits of data."""
+    for i in range(count):
+        data = data[:1000 * i] + b"edit %d " % i + data[1000 * i:]
+        yield data
+
+
+def test_keyframe_after_max_chain_depth(workdir):
+    from smartzip_versions import MAX_CHAIN_DEPTH, get_version, store_version, versions
+    path = str(workdir / "doc.txt")
+    snapshots = [text(50_000)] + list(_edits(text(50_000), MAX_CHAIN_DEPTH + 2))
+    entries = []
+    for data in snapshots:
+        write_file(path, data)
+        entries.append(store_version(path)[0])
+
+    depths = [e["depth"] for e in entries]
+    assert depths == list(range(MAX_CHAIN_DEPTH + 1)) + [0, 1]
+    assert entries[MAX_CHAIN_DEPTH + 1]["base_id"] is None
+    assert entries[MAX_CHAIN_DEPTH + 2]["base_id"] == entries[MAX_CHAIN_DEPTH + 1]["id"]
+    assert [v["depth"] for v in versions("doc.txt")] == depths
+
+    # The deepest delta and the versions around the keyframe all restore
+    for i in (MAX_CHAIN_DEPTH, MAX_CHAIN_DEPTH + 1, MAX_CHAIN_DEPTH + 2):
+        out = get_version("doc.txt", str(workdir / f"out{i}"), version=i + 1, verify_hash=True)
+        assert open(out, "rb").read() == snapshots[i]
+
+
+def test_large_delta_falls_back_to_keyframe(workdir):
+    from smartzip_versions import store_version
+    path = str(workdir / "doc.txt")
+    base = text(50_000, seed=1)
+    write_file(path, base)
+    store_version(path)
+
+    # Half the file replaced: the delta would exceed MAX_DELTA_RATIO
+    rewritten = base[:20_000] + os.urandom(30_000)
+    write_file(path, rewritten)
+    keyframe, _ = store_version(path)
+    assert (keyframe["version"], keyframe["depth"], keyframe["base_id"]) == (2, 0, None)
+
+    # A small edit on top of the keyframe is a delta again
+    write_file(path, rewritten + b" appended")
+    entry, _ = store_version(path)
+    assert (entry["version"], entry["depth"], entry["base_id"]) == (3, 1, keyframe["id"])
+
+
+def test_unversioned_row_becomes_version_one(workdir):
+    from smartzip_catalog import store
+    from smartzip_versions import get_version, store_version, versions
+    path = str(workdir / "doc.txt")
+    original = text(50_000, seed=2)
+    write_file(path, original)
+    first, _ = store(path)
+
+    edited = original + b" appended"
+    write_file(path, edited)
+    entry, _ = store_version(path)
+    history = versions("doc.txt")
+    assert [(v["version"], v["file_id"]) for v in history] == [(1, first["id"]), (2, entry["id"])]
+    assert entry["base_id"] == first["id"] and entry["depth"] == 1
+
+    assert open(get_version("doc.txt", str(workdir / "v1"), version=1, verify_hash=True), "rb").read() == original
+    assert open(get_version("doc.txt", str(workdir / "v2"), verify_hash=True), "rb").read() == edited